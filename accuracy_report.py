@@ -0,0 +1,78 @@
+import os
+import math
+import argparse
+import numpy as np
+import landmark_cache as lc
+import fixtures as fx
+import batch_decoder as bd
+from alphabet import ALPHABETS
+
+
+def subsample(recording, step):
+    meta = dict(recording.meta, fps=recording.fps / step)
+    return lc.LandmarkRecording(recording.landmarks[::step], meta)
+
+
+def evaluate(recording, step, smoothing, language, buffer_size, output_threshold, stable_duration, angle_gap):
+    recording = subsample(recording, step)
+    buffer_size, output_threshold = bd.scale_window(buffer_size, output_threshold, step)
+    stabiliser, _ = bd.decode_recording(recording, language, buffer_size, output_threshold, stable_duration,
+                                        angle_gap, smoothing)
+    reference = recording.meta.get("text", "")
+    return fx.character_error_rate(reference, stabiliser.text), fx.commit_latency(stabiliser.letters,
+                                                                                  recording.meta.get("segments", []))
+
+
+def accuracy_report(recordings, steps=(1, 2, 3, 4, 6), language="en", buffer_size=10, output_threshold=5,
+                    stable_duration=2.0, angle_gap=22.5):
+    rows = []
+    for step in steps:
+        for smoothing in (False, True):
+            results = [evaluate(recording, step, smoothing, language, buffer_size, output_threshold,
+                                stable_duration, angle_gap) for recording in recordings]
+            errors, latencies = zip(*results)
+            rows.append({
+                "fps": round(recordings[0].fps / step, 2),
+                "smoothing": smoothing,
+                "cer": round(sum(errors) / len(errors), 4),
+                "latency": round(float(np.nanmean(latencies)), 3) if not all(map(math.isnan, latencies)) else None,
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare decoding accuracy with and without angle smoothing "
+                                                 "as the inference frame rate drops.")
+    parser.add_argument("--fixture", action="append", default=[], help="recorded landmark fixture (.npy) with text")
+    parser.add_argument("--text", default="SEMAPHORE DECODER TEST", help="text of the synthetic fixtures")
+    parser.add_argument("--jitter", type=float, nargs="+", default=[6.0, 10.0, 14.0],
+                        help="arm angle noise of the synthetic fixtures in degrees")
+    parser.add_argument("--seeds", type=int, default=3, help="synthetic fixtures per jitter level")
+    parser.add_argument("--steps", type=int, nargs="+", default=[1, 2, 3, 4, 6],
+                        help="run inference on every Nth frame")
+    parser.add_argument("-l", "--language", choices=sorted(ALPHABETS), default="en")
+    parser.add_argument("--buffer-size", type=int, default=10)
+    parser.add_argument("--output-threshold", type=int, default=5)
+    args = parser.parse_args()
+
+    groups = {}
+    for fixture_file in args.fixture:
+        recording = lc.load_recording(fixture_file)
+        if recording is None:
+            raise IOError(f"Cannot load fixture: {fixture_file}")
+        groups[os.path.basename(fixture_file)] = [recording]
+    for jitter in args.jitter:
+        groups[f"synthetic, jitter {jitter:g}"] = [
+            fx.synthesize_landmarks(args.text, args.language, jitter=jitter, dropout=0.03, seed=seed)
+            for seed in range(args.seeds)]
+
+    for name, recordings in groups.items():
+        print(name)
+        print(f"  {'FPS':>6} {'smoothing':>10} {'CER':>8} {'commit s':>9}")
+        for row in accuracy_report(recordings, args.steps, args.language, args.buffer_size, args.output_threshold):
+            latency = "-" if row["latency"] is None else f"{row['latency']:.2f}"
+            print(f"  {row['fps']:6.1f} {'on' if row['smoothing'] else 'off':>10} {row['cer']:8.3f} {latency:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+from collections import deque
+
+
+def angles_close(angles, reference, tolerance):
+    for angle, reference_angle in zip(angles, reference):
+        if angle is None or reference_angle is None:
+            if angle is not reference_angle:
+                return False
+        elif abs((angle - reference_angle + 180) % 360 - 180) > tolerance:
+            return False
+    return True
+
+
+class AdaptiveScheduler:
+    def __init__(self, infer, max_skip=4, angle_tolerance=5.0, static_frames=5):
+        self.infer = infer
+        self.max_skip = max_skip
+        self.angle_tolerance = angle_tolerance
+        self.recent = deque(maxlen=static_frames)
+        self.reset()
+
+    def reset(self):
+        self.pending = []
+        self.recent.clear()
+        self.reference = None
+        self.low_rate = False
+        self.frames = 0
+        self.inferred = 0
+
+    def run(self, img):
+        self.inferred += 1
+        return self.infer(img)
+
+    def push(self, frame_index, img, stable):
+        self.frames += 1
+        if self.low_rate and len(self.pending) < self.max_skip - 1:
+            self.pending.append((frame_index, img))
+            return []
+
+        angles = self.run(img)
+        if self.low_rate:
+            if angles_close(angles, self.reference, self.angle_tolerance):
+                ready = [(pending_index, *self.reference) for pending_index, _ in self.pending]
+            else:
+                # The arms moved somewhere in the skipped frames, so decode them too and the transition
+                # lands on the same frame as at full rate.
+                ready = [(pending_index, *self.run(pending_img)) for pending_index, pending_img in self.pending]
+                self.low_rate = False
+                self.recent.clear()
+            self.pending = []
+            return ready + [(frame_index, *angles)]
+
+        self.recent.append(angles)
+        if stable and len(self.recent) == self.recent.maxlen and \
+                all(angles_close(recent, angles, self.angle_tolerance) for recent in self.recent):
+            self.low_rate = True
+            self.reference = angles
+        return [(frame_index, *angles)]
+
+    def flush(self):
+        ready = [(pending_index, *self.run(pending_img)) for pending_index, pending_img in self.pending]
+        self.pending = []
+        return ready
+
+    @property
+    def inference_ratio(self):
+        return self.inferred / self.frames if self.frames else 1.0
@@ -0,0 +1,213 @@
+import os
+import sys
+import json
+import bisect
+import argparse
+import warnings
+from functools import lru_cache
+import numpy as np
+
+SECTOR_ANGLES = (0, 45, 90, 135, 180, -135, -90, -45)
+NO_SECTOR = len(SECTOR_ANGLES)
+ALPHABET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alphabets")
+
+
+class AlphabetError(ValueError):
+    pass
+
+
+def angle_ranges(angle_gap):
+    return {
+        0: (-angle_gap, angle_gap),
+        -45: (-45 - angle_gap, -45 + angle_gap),
+        -90: (-90 - angle_gap, -90 + angle_gap),
+        -135: (-135 - angle_gap, -135 + angle_gap),
+        -180: (-180, -180 + angle_gap),
+        45: (45 - angle_gap, 45 + angle_gap),
+        90: (90 - angle_gap, 90 + angle_gap),
+        135: (135 - angle_gap, 135 + angle_gap),
+        180: (180 - angle_gap, 180),
+    }
+
+
+@lru_cache(maxsize=None)
+def sector_bounds(angle_gap):
+    # Splits the circle at every range bound so an angle's sector is found by one bisect. Each piece (a, b]
+    # takes the sector of its upper end, where the first matching range wins as in the ranges' order.
+    ranges = angle_ranges(angle_gap)
+    bounds = sorted({bound for bounds in ranges.values() for bound in bounds})
+    sectors = [NO_SECTOR]
+    for bound in bounds[1:]:
+        sector = NO_SECTOR
+        for matching_angle, (lower_bound, upper_bound) in ranges.items():
+            if lower_bound < bound <= upper_bound:
+                sector = SECTOR_ANGLES.index(180 if matching_angle == -180 else matching_angle)
+                break
+        sectors.append(sector)
+    sectors.append(NO_SECTOR)
+    return tuple(bounds), tuple(sectors)
+
+
+def angle_sector(angle, angle_gap):
+    bounds, sectors = sector_bounds(angle_gap)
+    return sectors[bisect.bisect_left(bounds, angle)]
+
+
+def angle_sectors(angles, angle_gap):
+    bounds, sectors = sector_bounds(angle_gap)
+    return np.asarray(sectors, dtype=np.intp)[np.searchsorted(bounds, np.asarray(angles, dtype=float))]
+
+
+def reject_duplicates(pairs):
+    keys = [key for key, _ in pairs]
+    duplicates = sorted({key for key in keys if keys.count(key) > 1})
+    if duplicates:
+        raise AlphabetError(f"Duplicate keys: {', '.join(duplicates)}")
+    return dict(pairs)
+
+
+class Alphabet:
+    def __init__(self, language, name, letters, cancel=None, modes=None, space=None, stop=None):
+        self.language = language
+        self.name = name
+        self.letters = {letter: (180 if right == -180 else right, 180 if left == -180 else left)
+                        for letter, (right, left) in letters.items()}
+        self.cancel = cancel
+        self.space = space
+        self.stop = stop
+        self.modes = modes or {}
+        self.validate()
+
+        self.positions = {position: letter for letter, position in self.letters.items()}
+        self.names = tuple(self.letters)
+        # Flat (right sector, left sector) table; the extra row and column are angles outside every sector.
+        self.codes = np.full((NO_SECTOR + 1) * (NO_SECTOR + 1), -1, dtype=np.int16)
+        for code, (right_angle, left_angle) in enumerate(self.letters.values()):
+            self.codes[SECTOR_ANGLES.index(right_angle) * (NO_SECTOR + 1) + SECTOR_ANGLES.index(left_angle)] = code
+        self.table = tuple(self.names[code] if code >= 0 else None for code in self.codes.tolist())
+        self.mode_entries = {mode["enter"]: name for name, mode in self.modes.items()}
+
+    def validate(self):
+        errors = []
+        for letter, position in self.letters.items():
+            for angle in position:
+                if angle not in SECTOR_ANGLES:
+                    errors.append(f"{letter}: {angle} is not one of {SECTOR_ANGLES}")
+
+        seen = {}
+        for letter, position in self.letters.items():
+            if position in seen:
+                errors.append(f"{letter} and {seen[position]} share position {list(position)}")
+            seen.setdefault(position, letter)
+
+        for key in ("cancel", "space", "stop"):
+            letter = getattr(self, key)
+            if letter is not None and letter not in self.letters:
+                errors.append(f"{key} letter {letter} is not in the alphabet")
+        for name, mode in self.modes.items():
+            for key in ("enter", "exit"):
+                if mode.get(key) not in self.letters:
+                    errors.append(f"mode {name}: {key} letter {mode.get(key)} is not in the alphabet")
+            for letter in mode.get("letters", {}):
+                if letter not in self.letters:
+                    errors.append(f"mode {name}: {letter} is not in the alphabet")
+
+        if errors:
+            raise AlphabetError(f"Invalid alphabet {self.language!r}:\n  " + "\n  ".join(errors))
+
+    def letter_at(self, right_sector, left_sector):
+        return self.table[right_sector * (NO_SECTOR + 1) + left_sector]
+
+    def apply(self, text, mode, letter):
+        # Folds a committed letter into the text: cancel removes the last character, mode signs switch
+        # how the following letters are written.
+        if letter == self.cancel:
+            return text[:-1], mode
+        if letter in self.mode_entries:
+            return text, self.mode_entries[letter]
+        if mode is not None:
+            if letter == self.modes[mode]["exit"]:
+                return text, None
+            letter = self.modes[mode]["letters"].get(letter, letter)
+        return text + letter, mode
+
+
+def read_alphabet(path):
+    with open(path, encoding="utf-8") as f:
+        try:
+            return json.load(f, object_pairs_hook=reject_duplicates)
+        except AlphabetError as error:
+            raise AlphabetError(f"{path}: {error}") from None
+
+
+def load_alphabets(*directories):
+    # Later directories override or extend earlier ones, so a site can ship its own variants.
+    specs = {}
+    for directory in (ALPHABET_DIR, *directories):
+        for file_name in sorted(os.listdir(directory)):
+            if file_name.endswith(".json"):
+                specs[os.path.splitext(file_name)[0]] = read_alphabet(os.path.join(directory, file_name))
+
+    def resolve(language, chain=()):
+        if language in chain:
+            raise AlphabetError(f"Alphabet {language!r} extends itself")
+        if language not in specs:
+            raise AlphabetError(f"Alphabet {chain[-1]!r} extends unknown alphabet {language!r}")
+        spec = specs[language]
+        if "extends" not in spec:
+            if "letters" not in spec:
+                raise AlphabetError(f"Alphabet {language!r} has no letters")
+            return spec
+        base = resolve(spec["extends"], chain + (language,))
+        letters = {**base["letters"], **spec.get("letters", {})}
+        # Everything else is inherited, but the name is the variant's own so it can be told from its base.
+        return {**base, **spec, "name": spec.get("name", language),
+                "letters": {letter: key for letter, key in letters.items() if key is not None}}
+
+    alphabets = {}
+    for language in specs:
+        spec = resolve(language)
+        alphabets[language] = Alphabet(language, spec.get("name", language), spec["letters"], spec.get("cancel"),
+                                       spec.get("modes"), spec.get("space"), spec.get("stop"))
+    return alphabets
+
+
+def installed_alphabets():
+    directories = list(filter(None, os.environ.get("SEMAPHORE_ALPHABETS", "").split(os.pathsep)))
+    try:
+        return load_alphabets(*directories)
+    except (OSError, ValueError) as error:
+        if not directories:
+            raise
+        # A broken site directory should not stop every tool from starting; the built-in alphabets still work.
+        warnings.warn(f"Ignoring SEMAPHORE_ALPHABETS={os.pathsep.join(directories)}: {error}")
+        return load_alphabets()
+
+
+def alphabet_labels(alphabets):
+    # Names shown to operators, mapped back to languages; names shared by several alphabets get their language.
+    names = [alphabet.name for alphabet in alphabets.values()]
+    return {(alphabet.name if names.count(alphabet.name) == 1 else f"{alphabet.name} ({language})"): language
+            for language, alphabet in alphabets.items()}
+
+
+ALPHABETS = installed_alphabets()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate alphabet files and print their letter tables.")
+    parser.add_argument("directories", nargs="*", help="extra directories with alphabet files")
+    args = parser.parse_args()
+
+    try:
+        alphabets = load_alphabets(*args.directories)
+    except (OSError, ValueError) as error:
+        print(error)
+        sys.exit(1)
+
+    for language, alphabet in alphabets.items():
+        print(f"{language}: {alphabet.name}, {len(alphabet.letters)} letters, modes: {list(alphabet.modes) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
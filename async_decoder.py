@@ -0,0 +1,189 @@
+import json
+import time
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import semaphore_decoder as sd
+import metrics
+from metrics import METRICS
+from resources import POOL
+from alphabet import ALPHABETS
+from stabiliser import LetterStabiliser, CANDIDATE
+
+END = object()
+
+
+class FrameReader:
+    # The lock keeps release from running while a read cancelled on the event loop is still in its thread.
+    def __init__(self, source):
+        self.lock = threading.Lock()
+        self.cap = cv2.VideoCapture(source)
+
+    def read(self):
+        with self.lock:
+            if self.cap is None:
+                return False, None
+            with METRICS.time("capture"):
+                return self.cap.read()
+
+    def release(self):
+        with self.lock:
+            if self.cap is not None:
+                self.cap.release()
+                self.cap = None
+
+
+def is_live(source):
+    return isinstance(source, int) or "://" in source
+
+
+async def video_frames(source, executor=None):
+    loop = asyncio.get_running_loop()
+    reader = await loop.run_in_executor(executor, FrameReader, source)
+    live = is_live(source)
+    video_fps = reader.cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_index = 0
+    try:
+        while True:
+            success, img = await loop.run_in_executor(executor, reader.read)
+            if not success:
+                break
+            yield frame_index, time.time() if live else frame_index / video_fps, img
+            frame_index += 1
+    finally:
+        # Awaited, so the capture is released before the caller can shut the executor down.
+        await loop.run_in_executor(executor, reader.release)
+
+
+class DecodeSession:
+    def __init__(self, frames, language="en", buffer_size=10, output_threshold=5, stable_duration=2.0,
+                 angle_gap=22.5, executor=None, queue_size=4, drop_frames=False, **detector_options):
+        self.frames = frames
+        self.language = language
+        self.executor = executor
+        self.queue_size = queue_size
+        self.drop_frames = drop_frames
+        self.detector_options = detector_options
+        self.decoder = sd.SemaphoreDecoder(angle_gap=angle_gap)
+        self.stabiliser = LetterStabiliser(buffer_size, output_threshold, stable_duration,
+                                           self.decoder.alphabets.get(language))
+        self.queue = None
+        self.processed = 0
+        self.dropped = 0
+
+    async def read_frames(self):
+        try:
+            async for frame in self.frames:
+                # Live sources keep the newest frames; files wait for the decoder so nothing is skipped.
+                if self.drop_frames and self.queue.full():
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                await self.queue.put(frame)
+        except Exception as error:
+            await self.queue.put(error)
+        else:
+            await self.queue.put(END)
+        finally:
+            if hasattr(self.frames, "aclose"):
+                await self.frames.aclose()
+
+    async def events(self):
+        loop = asyncio.get_running_loop()
+        detector = await loop.run_in_executor(self.executor, lambda: POOL.acquire(**self.detector_options))
+        self.queue = asyncio.Queue(self.queue_size)
+        reader = asyncio.create_task(self.read_frames())
+        try:
+            while not self.stabiliser.stopped:
+                item = await self.queue.get()
+                if item is END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+
+                frame_index, timestamp, img = item
+                right_angle, left_angle = await loop.run_in_executor(self.executor, detector.find_arm_angles, img)
+                with METRICS.time("find_letter"):
+                    letter = self.decoder.find_letter(right_angle, left_angle, self.language)
+                with METRICS.time("stabiliser"):
+                    event = self.stabiliser.update(letter, timestamp, frame_index)
+                self.processed += 1
+
+                # Events are produced only as fast as the caller consumes them, which in turn stalls the reader.
+                if event is not None and not (event == CANDIDATE and self.stabiliser.output_letter is None):
+                    yield self.make_event(event, frame_index, timestamp)
+        finally:
+            reader.cancel()
+            try:
+                await reader
+            except asyncio.CancelledError:
+                pass
+            await loop.run_in_executor(self.executor, POOL.release, detector)
+
+    def make_event(self, event, frame_index, timestamp):
+        letter = self.stabiliser.output_letter
+        window = self.stabiliser.window
+        return {
+            "type": event,
+            "letter": letter,
+            "text": self.stabiliser.text,
+            "frame": frame_index,
+            "time": round(timestamp, 3),
+            "confidence": round(window.count(letter) / len(window), 3),
+        }
+
+
+def decode_events(source, language="en", buffer_size=10, output_threshold=5, stable_duration=2.0, angle_gap=22.5,
+                  executor=None, queue_size=4, **detector_options):
+    frames = video_frames(source, executor)
+    session = DecodeSession(frames, language, buffer_size, output_threshold, stable_duration, angle_gap, executor,
+                            queue_size, drop_frames=is_live(source), **detector_options)
+    return session.events()
+
+
+async def print_events(name, events):
+    try:
+        async for event in events:
+            print(json.dumps({"source": name, **event}, ensure_ascii=False), flush=True)
+    finally:
+        await events.aclose()
+
+
+async def decode_sources(sources, workers, language, buffer_size, output_threshold, stable_duration, timeout):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        streams = [decode_events(source, language, buffer_size, output_threshold, stable_duration, executor=executor)
+                   for source in sources]
+        tasks = [asyncio.create_task(print_events(str(source), events)) for source, events in zip(sources, streams)]
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        # Every cancelled task is waited for, not just the first as gather would, and generators that never
+        # started are closed, so detectors and captures are released while the executor still runs.
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for events in streams:
+            await events.aclose()
+        for task in done:
+            task.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode semaphore streams concurrently in one asyncio event loop.")
+    parser.add_argument("sources", nargs="+", help="camera indices, video files or stream URLs")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="threads running pose detection")
+    parser.add_argument("-l", "--language", choices=sorted(ALPHABETS), default="en")
+    parser.add_argument("--buffer-size", type=int, default=10)
+    parser.add_argument("--output-threshold", type=int, default=5)
+    parser.add_argument("--stable-duration", type=float, default=2.0)
+    parser.add_argument("--timeout", type=float, default=None, help="cancel decoding after this many seconds")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.start_from_args(args)
+
+    sources = [int(source) if source.isdigit() else source for source in args.sources]
+    asyncio.run(decode_sources(sources, args.workers, args.language, args.buffer_size, args.output_threshold,
+                               args.stable_duration, args.timeout))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+import os
+import csv
+import json
+import math
+import time
+import argparse
+import cv2
+import semaphore_decoder as sd
+import landmark_cache as lc
+from resources import DETECTOR_DEFAULTS, POOL
+from alphabet import ALPHABETS
+from stabiliser import LetterStabiliser
+from adaptive import AdaptiveScheduler
+from smoothing import ArmSmoother, smooth_angles
+from video_reader import VideoReader
+
+
+def read_angles(video_file, start_frame=0, end_frame=None, warmup_frames=0, step=1, max_width=None,
+                **detector_options):
+    # With a step, only frames on the video's own every-Nth grid are decoded, whatever the start frame.
+    first_frame = max(0, start_frame - warmup_frames) // step * step
+    reader = VideoReader(video_file, first_frame, step, max_width)
+    detector = POOL.acquire(**detector_options)
+    try:
+        for frame_index, img in reader:
+            if end_frame is not None and frame_index >= end_frame:
+                break
+            right_angle, left_angle = detector.find_arm_angles(img)
+            if frame_index >= start_frame:
+                yield frame_index, right_angle, left_angle
+    finally:
+        reader.close()
+        POOL.release(detector)
+
+
+def video_info(video_file):
+    cap = cv2.VideoCapture(video_file)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video file: {video_file}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return fps, frame_count
+
+
+def scale_window(buffer_size, output_threshold, step):
+    # The vote window covers the same time span when only every Nth frame is decoded.
+    scaled_buffer_size = max(2, round(buffer_size / step))
+    return scaled_buffer_size, max(1, math.ceil(output_threshold * scaled_buffer_size / buffer_size))
+
+
+def decode_angles(angles, video_fps, language="en", buffer_size=10, output_threshold=5, stable_duration=2.0,
+                  angle_gap=22.5, smoothing=False):
+    decoder = sd.SemaphoreDecoder(angle_gap=angle_gap)
+    stabiliser = LetterStabiliser(buffer_size, output_threshold, stable_duration, decoder.alphabets.get(language))
+    smoother = ArmSmoother(decoder) if smoothing else None
+    frames = 0
+    for frame_index, right_angle, left_angle in angles:
+        if smoother is not None:
+            right_angle, left_angle = smoother.update(right_angle, left_angle, frame_index / video_fps)
+        letter = decoder.find_letter(right_angle, left_angle, language)
+        stabiliser.update(letter, frame_index / video_fps, frame_index)
+        frames += 1
+        if stabiliser.stopped:
+            break
+    return stabiliser, frames
+
+
+def detector_settings(**kwargs):
+    settings = dict(DETECTOR_DEFAULTS)
+    settings.update(kwargs)
+    return settings
+
+
+def record_landmarks(video_file, cache, key, settings):
+    cap = cv2.VideoCapture(video_file)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video file: {video_file}")
+
+    detector = POOL.acquire(**settings)
+    writer = cache.writer(key, video_file, settings, cap.get(cv2.CAP_PROP_FPS) or 30.0,
+                          int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    try:
+        while True:
+            success, img = cap.read()
+            if not success:
+                break
+            detector.find_pose(img, draw=False)
+            writer.append(detector.results.pose_landmarks)
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        cap.release()
+        POOL.release(detector)
+
+    writer.close()
+    return cache.load(key)
+
+
+def decode_recording(recording, language="en", buffer_size=10, output_threshold=5, stable_duration=2.0,
+                     angle_gap=22.5, smoothing=False):
+    left_elbow, right_elbow, left_wrist, right_wrist = 13, 14, 15, 16
+    decoder = sd.SemaphoreDecoder(angle_gap=angle_gap)
+    stabiliser = LetterStabiliser(buffer_size, output_threshold, stable_duration, decoder.alphabets.get(language))
+
+    right_angles = recording.angles(right_elbow, right_wrist)
+    left_angles = recording.angles(left_elbow, left_wrist)
+    if smoothing:
+        right_angles, left_angles = smooth_angles(right_angles, left_angles, recording.fps, ArmSmoother(decoder))
+    codes = decoder.find_letters(right_angles, left_angles, language)
+    letters = decoder.letters_from_codes(codes, language)
+
+    frames = 0
+    for frame_index, letter in enumerate(letters):
+        stabiliser.update(letter, frame_index / recording.fps, frame_index)
+        frames += 1
+        if stabiliser.stopped:
+            break
+    return stabiliser, frames
+
+
+def decode_video(video_file, language="en", buffer_size=10, output_threshold=5, stable_duration=2.0,
+                 angle_gap=22.5, cache_dir=None, smoothing=False, step=1, max_width=None, **detector_options):
+    if cache_dir is not None:
+        if step != 1 or max_width is not None:
+            # Cached landmarks hold every frame at full size, so neither setting would take effect.
+            raise ValueError("Frame step and max width cannot be used with a landmark cache")
+        start_time = time.perf_counter()
+        cache = lc.LandmarkCache(cache_dir)
+        settings = detector_settings(**detector_options)
+        key = cache.key(video_file, settings)
+        recording = cache.load(key)
+        if recording is None:
+            recording = record_landmarks(video_file, cache, key, settings)
+        stabiliser, frames = decode_recording(recording, language, buffer_size, output_threshold,
+                                              stable_duration, angle_gap, smoothing)
+        elapsed = time.perf_counter() - start_time
+        return make_result(video_file, language, stabiliser, frames, recording.fps, elapsed)
+
+    video_fps, _ = video_info(video_file)
+    if step > 1:
+        buffer_size, output_threshold = scale_window(buffer_size, output_threshold, step)
+    start_time = time.perf_counter()
+    angles = read_angles(video_file, step=step, max_width=max_width, **detector_options)
+    try:
+        stabiliser, frames = decode_angles(angles, video_fps, language, buffer_size, output_threshold,
+                                           stable_duration, angle_gap, smoothing)
+    finally:
+        angles.close()
+    elapsed = time.perf_counter() - start_time
+    return make_result(video_file, language, stabiliser, frames, video_fps, elapsed)
+
+
+def decode_video_adaptive(video_file, language="en", buffer_size=10, output_threshold=5, stable_duration=2.0,
+                          angle_gap=22.5, max_skip=4, angle_tolerance=5.0, smoothing=False, **detector_options):
+    video_fps, _ = video_info(video_file)
+    cap = cv2.VideoCapture(video_file)
+    detector = POOL.acquire(**detector_options)
+    decoder = sd.SemaphoreDecoder(angle_gap=angle_gap)
+    stabiliser = LetterStabiliser(buffer_size, output_threshold, stable_duration, decoder.alphabets.get(language))
+    scheduler = AdaptiveScheduler(detector.find_arm_angles, max_skip, angle_tolerance)
+    smoother = ArmSmoother(decoder) if smoothing else None
+
+    start_time = time.perf_counter()
+    frame_index = 0
+    frames = 0
+    try:
+        while not stabiliser.stopped:
+            success, img = cap.read()
+            ready = scheduler.push(frame_index, img, stabiliser.committed) if success else scheduler.flush()
+            for ready_index, right_angle, left_angle in ready:
+                if smoother is not None:
+                    right_angle, left_angle = smoother.update(right_angle, left_angle, ready_index / video_fps)
+                letter = decoder.find_letter(right_angle, left_angle, language)
+                stabiliser.update(letter, ready_index / video_fps, ready_index)
+                frames += 1
+                if stabiliser.stopped:
+                    break
+            if not success:
+                break
+            frame_index += 1
+    finally:
+        cap.release()
+        POOL.release(detector)
+    elapsed = time.perf_counter() - start_time
+
+    result = make_result(video_file, language, stabiliser, frames, video_fps, elapsed)
+    result["inference_ratio"] = round(scheduler.inference_ratio, 3)
+    return result
+
+
+def make_result(video_file, language, stabiliser, frames, video_fps, elapsed):
+    return {
+        "video": video_file,
+        "language": language,
+        "text": stabiliser.text,
+        "letters": stabiliser.letters,
+        "frames": frames,
+        "video_fps": video_fps,
+        "elapsed": round(elapsed, 3),
+        "decode_fps": round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+def write_json(result, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+def write_csv(result, path):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["frame", "time", "letter"])
+        writer.writeheader()
+        for letter in result["letters"]:
+            writer.writerow({key: letter[key] for key in writer.fieldnames})
+
+
+def output_names(video_files):
+    # Results are named after their video; videos sharing a file name keep their directories in the name.
+    paths = [os.path.abspath(video_file) for video_file in video_files]
+    for video_file, path in zip(video_files, paths):
+        if paths.count(path) > 1:
+            raise ValueError(f"Video given more than once: {video_file}")
+    names = [os.path.splitext(os.path.basename(video_file))[0] for video_file in video_files]
+    shared = {name for name in names if names.count(name) > 1}
+    if shared:
+        root = os.path.commonpath(paths)
+        names = [os.path.splitext(os.path.relpath(path, root))[0].replace(os.sep, "_") if name in shared else name
+                 for path, name in zip(paths, names)]
+    for name in names:
+        if names.count(name) > 1:
+            raise ValueError(f"More than one video would write results named {name!r}")
+    return names
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Decode semaphore videos without a display.")
+    parser.add_argument("videos", nargs="+", help="video files to decode")
+    parser.add_argument("-o", "--output-dir", default="output", help="directory for decoded results")
+    parser.add_argument("-f", "--format", nargs="+", choices=["json", "csv"], default=["json"])
+    parser.add_argument("-l", "--language", choices=sorted(ALPHABETS), default="en")
+    parser.add_argument("--buffer-size", type=int, default=10)
+    parser.add_argument("--output-threshold", type=int, default=5)
+    parser.add_argument("--stable-duration", type=float, default=2.0)
+    parser.add_argument("--angle-gap", type=float, default=22.5)
+    parser.add_argument("--model-complexity", type=int, choices=[0, 1, 2], default=1)
+    parser.add_argument("--static-image-mode", action="store_true",
+                        help="run pose detection on every frame independently, without tracking")
+    parser.add_argument("--roi", action="store_true",
+                        help="run pose detection on a crop around the signaller tracked from the previous frame")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="skip pose detection on frames while a committed letter is held still")
+    parser.add_argument("--max-skip", type=int, default=4, help="run detection at least every N frames")
+    parser.add_argument("--smooth", action="store_true",
+                        help="filter arm angles over time and hold sectors with hysteresis before decoding")
+    parser.add_argument("--frame-step", type=positive_int, default=1,
+                        help="run detection on every Nth frame; the frames between are demuxed but not decoded")
+    parser.add_argument("--max-width", type=positive_int, default=None,
+                        help="downscale frames wider than this before detection, on the reader thread")
+    parser.add_argument("--cache-dir", default=None,
+                        help="store detected landmarks here and replay them on later runs of the same video")
+    return parser
+
+
+def detector_options(args):
+    return {
+        "model_complexity": args.model_complexity,
+        "static_image_mode": args.static_image_mode,
+        "roi": args.roi,
+    }
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if (args.adaptive or args.cache_dir) and (args.frame_step != 1 or args.max_width is not None):
+        parser.error("--frame-step and --max-width cannot be combined with --adaptive or --cache-dir")
+    try:
+        names = output_names(args.videos)
+    except ValueError as error:
+        parser.error(str(error))
+    os.makedirs(args.output_dir, exist_ok=True)
+    writers = {"json": write_json, "csv": write_csv}
+
+    total_frames = 0
+    total_elapsed = 0.0
+    for video_file, name in zip(args.videos, names):
+        if args.adaptive:
+            result = decode_video_adaptive(video_file, args.language, args.buffer_size, args.output_threshold,
+                                           args.stable_duration, args.angle_gap, args.max_skip,
+                                           smoothing=args.smooth, **detector_options(args))
+        else:
+            result = decode_video(video_file, args.language, args.buffer_size, args.output_threshold,
+                                  args.stable_duration, args.angle_gap, args.cache_dir, args.smooth,
+                                  args.frame_step, args.max_width, **detector_options(args))
+        for output_format in args.format:
+            writers[output_format](result, os.path.join(args.output_dir, f"{name}.{output_format}"))
+
+        total_frames += result["frames"]
+        total_elapsed += result["elapsed"]
+        print(f"{video_file}: {result['frames']} frames in {result['elapsed']:.2f} s "
+              f"({result['decode_fps']:.1f} FPS) -> {result['text']!r}")
+        if "inference_ratio" in result:
+            print(f"  pose detection ran on {result['inference_ratio'] * 100:.1f}% of frames")
+
+    if total_elapsed > 0:
+        print(f"Total: {total_frames} frames in {total_elapsed:.2f} s ({total_frames / total_elapsed:.1f} FPS)")
+
+
+if __name__ == "__main__":
+    main()
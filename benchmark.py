@@ -0,0 +1,229 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import numpy as np
+import cv2
+import pose_detector as pd
+import semaphore_decoder as sd
+import batch_decoder as bd
+import landmark_cache as lc
+import fixtures as fx
+from alphabet import ALPHABETS
+from stabiliser import LetterStabiliser
+
+BENCHMARK_TEXT = "THE QUICK BROWN FOX JUMPS OVER THE LAZY DOG"
+
+
+def summarise(latencies):
+    latencies = np.asarray(latencies, dtype=float)
+    mean = float(latencies.mean())
+    return {
+        "samples": int(latencies.size),
+        "mean_ms": round(mean * 1000, 6),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 6),
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 6),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 6),
+        "fps": round(1 / mean, 2) if mean > 0 else 0.0,
+    }
+
+
+def time_calls(function, calls, block=1):
+    # Calls are timed in blocks so timer overhead does not dominate sub-microsecond stages.
+    latencies = []
+    for start in range(0, len(calls) - block + 1, block):
+        start_time = time.perf_counter()
+        for args in calls[start:start + block]:
+            function(*args)
+        latencies.append((time.perf_counter() - start_time) / block)
+    return latencies
+
+
+def load_frames(video_file, frames):
+    if video_file is None:
+        rng = np.random.default_rng(0)
+        return [rng.integers(0, 256, (480, 640, 3), dtype=np.uint8) for _ in range(frames)]
+
+    cap = cv2.VideoCapture(video_file)
+    images = []
+    while len(images) < frames:
+        success, img = cap.read()
+        if not success:
+            break
+        images.append(img)
+    cap.release()
+    return images
+
+
+def bench_find_pose(images, model_complexity):
+    detector = pd.PoseDetector(model_complexity=model_complexity)
+    detector.find_pose(images[0], draw=False)
+    return time_calls(lambda img: detector.find_pose(img, draw=False), [(img,) for img in images])
+
+
+def bench_find_arm_angles(images):
+    detector = pd.PoseDetector()
+    detector.find_arm_angles(images[0])
+    return time_calls(detector.find_arm_angles, [(img,) for img in images])
+
+
+def bench_find_angle(recording, frames):
+    detector = pd.PoseDetector()
+    img = np.zeros((recording.height, recording.width, 3), dtype=np.uint8)
+    all_landmarks = [recording.frame_landmarks(i) for i in range(min(frames, len(recording)))]
+
+    def find_angles(landmarks):
+        detector.landmarks = landmarks
+        detector.find_angle(img, 14, 16, draw=False)
+        detector.find_angle(img, 13, 15, draw=False)
+
+    return time_calls(find_angles, [(landmarks,) for landmarks in all_landmarks if landmarks], block=10)
+
+
+def bench_find_letter(right_angles, left_angles, language):
+    decoder = sd.SemaphoreDecoder()
+    calls = [(None if np.isnan(right) else right, None if np.isnan(left) else left, language)
+             for right, left in zip(right_angles.tolist(), left_angles.tolist())]
+    return time_calls(decoder.find_letter, calls, block=100)
+
+
+def bench_find_letters(right_angles, left_angles, language, repeats):
+    decoder = sd.SemaphoreDecoder()
+    decoder.find_letters(right_angles[:1], left_angles[:1], language)
+    latencies = time_calls(decoder.find_letters, [(right_angles, left_angles, language)] * repeats)
+    return [latency / len(right_angles) for latency in latencies]
+
+
+def bench_stabiliser(letters, fps, language):
+    stabiliser = LetterStabiliser(alphabet=ALPHABETS.get(language))
+    calls = [(letter, i / fps, i) for i, letter in enumerate(letters)]
+    return time_calls(stabiliser.update, calls, block=100)
+
+
+def bench_decode_recording(recording, language, repeats):
+    latencies = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        _, frames = bd.decode_recording(recording, language)
+        latencies.append((time.perf_counter() - start_time) / max(frames, 1))
+    return latencies
+
+
+def bench_decode_video(video_file, frames, language):
+    video_fps, _ = bd.video_info(video_file)
+    decoder = sd.SemaphoreDecoder()
+    stabiliser = LetterStabiliser(alphabet=ALPHABETS.get(language))
+    angles = bd.read_angles(video_file)
+    latencies = []
+    start_time = None
+    for frame_index, right_angle, left_angle in angles:
+        letter = decoder.find_letter(right_angle, left_angle, language)
+        stabiliser.update(letter, frame_index / video_fps, frame_index)
+        now = time.perf_counter()
+        # The first frame also pays for building the MediaPipe graph.
+        if start_time is not None:
+            latencies.append(now - start_time)
+        start_time = now
+        if len(latencies) >= frames:
+            break
+    angles.close()
+    return latencies
+
+
+def run_benchmarks(video_file=None, fixture_files=(), frames=200, repeats=20, model_complexities=(0, 1, 2),
+                   language="en"):
+    results = {}
+    synthetic = fx.synthesize_landmarks(BENCHMARK_TEXT, language, jitter=4.0, dropout=0.02)
+    right_angles, left_angles = synthetic.angles(14, 16), synthetic.angles(13, 15)
+    decoder = sd.SemaphoreDecoder()
+    letters = decoder.letters_from_codes(decoder.find_letters(right_angles, left_angles, language), language)
+
+    images = load_frames(video_file, frames)
+    for model_complexity in model_complexities:
+        results[f"find_pose[model_complexity={model_complexity}]"] = bench_find_pose(images, model_complexity)
+    results["find_arm_angles"] = bench_find_arm_angles(images)
+    results["find_angle"] = bench_find_angle(synthetic, len(synthetic))
+    results["find_letter[scalar]"] = bench_find_letter(right_angles, left_angles, language)
+    results["find_letters[batch]"] = bench_find_letters(right_angles, left_angles, language, repeats)
+    results["stabiliser"] = bench_stabiliser(letters, synthetic.fps, language)
+    results["decode[synthetic]"] = bench_decode_recording(synthetic, language, repeats)
+
+    for fixture_file in fixture_files:
+        recording = lc.load_recording(fixture_file)
+        if recording is None:
+            raise IOError(f"Cannot load fixture: {fixture_file}")
+        name = os.path.splitext(os.path.basename(fixture_file))[0]
+        results[f"decode[fixture:{name}]"] = bench_decode_recording(recording, recording.meta.get("language", language),
+                                                                    repeats)
+    if video_file is not None:
+        results["decode[video]"] = bench_decode_video(video_file, frames, language)
+
+    return {name: summarise(latencies) for name, latencies in results.items() if latencies}
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, stats in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if stats["fps"] < reference["fps"] * (1 - tolerance):
+            regressions.append(f"{name}: {stats['fps']} FPS < baseline {reference['fps']} FPS")
+        if stats["p95_ms"] > reference["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {stats['p95_ms']} ms > baseline {reference['p95_ms']} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark each decoding stage and compare with a baseline.")
+    parser.add_argument("--video", default=None, help="video used for pose and end-to-end stages "
+                                                      "(random frames when omitted)")
+    parser.add_argument("--fixture", action="append", default=[], help="recorded landmark fixture (.npy)")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--model-complexity", type=int, nargs="+", choices=[0, 1, 2], default=[0, 1, 2])
+    parser.add_argument("-o", "--output", default=None, help="write results as JSON")
+    parser.add_argument("--baseline", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", default=None, metavar="PATH",
+                        help="store these results as a baseline JSON, after any comparison with --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.video, args.fixture, args.frames, args.repeats, args.model_complexity)
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "time": round(time.time()),
+        "results": results,
+    }
+
+    print(f"{'stage':40} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'FPS':>14}")
+    for name, stats in results.items():
+        print(f"{name:40} {stats['p50_ms']:10.4f} {stats['p95_ms']:10.4f} {stats['p99_ms']:10.4f} {stats['fps']:14.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if not regressions:
+            print(f"No regressions against {args.baseline}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
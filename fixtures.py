@@ -0,0 +1,181 @@
+import os
+import math
+import argparse
+import numpy as np
+import landmark_cache as lc
+from alphabet import ALPHABETS
+
+REST_ANGLES = (90, 90)
+BODY = {
+    0: (0.50, 0.22), 11: (0.56, 0.36), 12: (0.44, 0.36), 13: (0.60, 0.48), 14: (0.40, 0.48),
+    23: (0.54, 0.62), 24: (0.46, 0.62), 25: (0.54, 0.78), 26: (0.46, 0.78), 27: (0.54, 0.93), 28: (0.46, 0.93),
+}
+
+
+def letter_angles(language="en"):
+    angles = {}
+    for letter, key in ALPHABETS[language].letters.items():
+        angles[letter] = key
+        for variant in letter.split("/"):
+            angles.setdefault(variant, key)
+    return angles
+
+
+def text_to_letters(text, language="en", stop=True):
+    alphabet = ALPHABETS[language]
+    angles = letter_angles(language)
+    mode_chars = {char: (name, letter) for name, mode in alphabet.modes.items()
+                  for letter, char in mode["letters"].items()}
+    letters = []
+    mode = None
+    for char in text.upper():
+        if char == " ":
+            if alphabet.space is None:
+                raise ValueError(f"Language {language!r} has no space letter")
+            letters.append(alphabet.space)
+        elif mode is not None and char in mode_chars and mode_chars[char][0] == mode:
+            letters.append(mode_chars[char][1])
+        elif char in angles:
+            if mode is not None:
+                letters.append(alphabet.modes[mode]["exit"])
+                mode = None
+            letters.append(next(letter for letter, key in angles.items() if key == angles[char]))
+        elif char in mode_chars:
+            mode, letter = mode_chars[char]
+            letters += [alphabet.modes[mode]["enter"], letter]
+        else:
+            raise ValueError(f"No semaphore letter for {char!r} in language {language!r}")
+    if stop:
+        if alphabet.stop is None:
+            raise ValueError(f"Language {language!r} has no stop letter")
+        letters.append(alphabet.stop)
+    return letters
+
+
+def expected_text(letters, language="en"):
+    alphabet = ALPHABETS[language]
+    text, mode = "", None
+    for letter in letters:
+        if letter == alphabet.stop:
+            break
+        if letter == alphabet.space:
+            text += " "
+        else:
+            text, mode = alphabet.apply(text, mode, letter)
+    return text
+
+
+def pose_frame(right_angle, left_angle, width, height, arm_length=0.12):
+    frame = np.empty((lc.NUM_LANDMARKS, 3), dtype=np.float32)
+    frame[:, 0], frame[:, 1], frame[:, 2] = 0.5, 0.4, 0.95
+    for idx, (x, y) in BODY.items():
+        frame[idx] = x, y, 0.99
+
+    length = arm_length * height
+    for elbow, wrist, angle in ((14, 16, right_angle), (13, 15, left_angle)):
+        elbow_x, elbow_y = frame[elbow, 0] * width, frame[elbow, 1] * height
+        frame[wrist, 0] = (elbow_x + length * math.cos(math.radians(angle))) / width
+        frame[wrist, 1] = (elbow_y + length * math.sin(math.radians(angle))) / height
+        frame[wrist, 2] = 0.99
+    return frame
+
+
+def interpolate_angle(start, end, fraction):
+    delta = (end - start + 180) % 360 - 180
+    return start + delta * fraction
+
+
+def synthesize_landmarks(text, language="en", fps=30.0, hold=2.5, transition=0.3, rest=0.3, jitter=0.0,
+                         dropout=0.0, stop=True, seed=0, width=1280, height=720):
+    rng = np.random.default_rng(seed)
+    angles = letter_angles(language)
+    letters = text_to_letters(text, language, stop)
+
+    targets = []
+    for letter in letters:
+        targets.append((None, REST_ANGLES, rest))
+        targets.append((letter, angles[letter], hold))
+
+    frames, segments = [], []
+    current = REST_ANGLES
+    for letter, target, duration in targets:
+        transition_frames = int(round(transition * fps))
+        for i in range(transition_frames):
+            fraction = (i + 1) / transition_frames
+            frames.append((interpolate_angle(current[0], target[0], fraction),
+                           interpolate_angle(current[1], target[1], fraction)))
+
+        start = len(frames) / fps
+        frames.extend([target] * int(round(duration * fps)))
+        if letter is not None:
+            segments.append({"letter": letter, "start": round(start, 3), "end": round(len(frames) / fps, 3)})
+        current = target
+
+    landmarks = np.empty((len(frames), lc.NUM_LANDMARKS, 3), dtype=np.float32)
+    noise = rng.normal(0.0, jitter, (len(frames), 2)) if jitter > 0 else np.zeros((len(frames), 2))
+    for i, (right_angle, left_angle) in enumerate(frames):
+        landmarks[i] = pose_frame(right_angle + noise[i, 0], left_angle + noise[i, 1], width, height)
+    if dropout > 0:
+        landmarks[rng.random(len(frames)) < dropout] = np.nan
+
+    meta = {
+        "version": lc.CACHE_VERSION,
+        "video": "synthetic",
+        "fps": fps,
+        "width": width,
+        "height": height,
+        "language": language,
+        "text": expected_text(letters, language),
+        "segments": segments,
+    }
+    return lc.LandmarkRecording(landmarks, meta)
+
+
+def edit_distance(reference, hypothesis):
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_char in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_char in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_char != hyp_char)))
+        previous = current
+    return previous[-1]
+
+
+def character_error_rate(reference, hypothesis):
+    if not reference:
+        return float(len(hypothesis) > 0)
+    return edit_distance(reference, hypothesis) / len(reference)
+
+
+def commit_latency(letters, segments):
+    # Seconds from the start of each held letter to its commit; letters never committed are left out.
+    latencies = []
+    for segment in segments:
+        for committed in letters:
+            if committed["letter"] == segment["letter"] and segment["start"] <= committed["time"] <= segment["end"]:
+                latencies.append(committed["time"] - segment["start"])
+                break
+    return sum(latencies) / len(latencies) if latencies else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic landmark recording with ground-truth text.")
+    parser.add_argument("text")
+    parser.add_argument("output", help="path of the .npy file; metadata is written next to it as .json")
+    parser.add_argument("-l", "--language", choices=sorted(ALPHABETS), default="en")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--hold", type=float, default=2.5, help="seconds each letter is held")
+    parser.add_argument("--jitter", type=float, default=0.0, help="standard deviation of arm angle noise in degrees")
+    parser.add_argument("--dropout", type=float, default=0.0, help="fraction of frames without a detected pose")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    recording = synthesize_landmarks(args.text, args.language, args.fps, args.hold, jitter=args.jitter,
+                                     dropout=args.dropout, seed=args.seed)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    lc.save_recording(args.output, recording.landmarks, recording.meta)
+    print(f"{args.output}: {len(recording)} frames, text {recording.meta['text']!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,86 +1,264 @@
-import cv2
+import os
 import time
+import argparse
+import numpy as np
 import threading
 import tkinter as tk
 import customtkinter as cs
-import pose_detector as pd
 import semaphore_decoder as sd
-from PIL import ImageTk, Image
-from queue import Queue
+from queue import Empty, Full
+from alphabet import ALPHABETS, alphabet_labels
+import metrics
+from metrics import METRICS
+from pipeline import CaptureSlot, Closed, FrameQueue, StageStats
+from smoothing import ArmSmoother
+from stabiliser import LetterStabiliser, COMMITTED, SPACE, STOP
+from adaptive import AdaptiveScheduler
+from session_log import open_session_log
+
+# OpenCV, MediaPipe and PIL are imported where they are first used, so the window does not wait for them.
+START_TIME = time.perf_counter()
+
+
+def opencv():
+    import cv2
+    return cv2
 
 
 class VideoThread(threading.Thread):
-    def __init__(self, video_player, video_button, buffer_size=10, *args, **kwargs):
+    def __init__(self, video_player, video_button, buffer_size=10, adaptive=False, refresh_rate=30,
+                 *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.cap = None
+        self.capture = CaptureSlot()
+        self.refresh_rate = refresh_rate
+        self.displayed = True
+        self.display_lock = threading.Lock()
+        self.display_frame = None
+        self.adaptive = adaptive
+        self.is_stable = lambda: False
+        self.scheduler = None
         self.aspect_ratio = 1
         self.video_player = video_player
         self.video_button = video_button
         self.buffer_size = buffer_size
-        self.angle_buffer = Queue()
+        self.angle_buffer = FrameQueue(maxsize=buffer_size, drop_oldest=True)
         self.not_paused_event = threading.Event()
         self.play_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.source_condition = threading.Condition()
+        self.source_generation = 0
+        self.frame_queue = FrameQueue(maxsize=1, drop_oldest=False)
+        self.render_queue = FrameQueue(maxsize=1, drop_oldest=True)
+        self.capture_thread = None
+        self.ended_generation = None
+        self.startup = {}
+        self.source_start_time = None
+        # Stage latencies and queue depths are reported through the metrics registry (--metrics-port/-log).
+        self.stage_stats = {
+            "capture": StageStats(name="capture"),
+            "inference": StageStats(name="inference"),
+            "render": StageStats(name="render"),
+        }
+        for name, queue in (("frame_queue", self.frame_queue), ("render_queue", self.render_queue),
+                            ("angle_buffer", self.angle_buffer)):
+            METRICS.gauge("queue_depth", queue.qsize, (("queue", name),))
+            METRICS.gauge("queue_dropped", lambda queue=queue: queue.dropped, (("queue", name),))
 
     def run(self):
-        detector = pd.PoseDetector()
-        left_elbow = 13
-        right_elbow = 14
-        left_wrist = 15
-        right_wrist = 16
+        self.capture_thread = threading.Thread(target=self.capture_loop, daemon=True)
+        self.capture_thread.start()
+        threading.Thread(target=self.render_loop, daemon=True).start()
+
+        from resources import POOL
+        detector = POOL.acquire()
+        detector.warm_up()
+        self.record_startup("detector_ready", time.perf_counter() - START_TIME)
+
+        def infer(frame):
+            # Drawing is left to the render thread, which only draws the frames it shows.
+            angles = detector.find_arm_angles(frame[0])
+            frame[1] = detector.results.pose_landmarks
+            return angles
+
+        if self.adaptive:
+            self.scheduler = AdaptiveScheduler(infer)
+            METRICS.gauge("inference_ratio", lambda: self.scheduler.inference_ratio)
+        scheduler_generation = self.source_generation
+        decoded_generation = None
+        detector_generation = self.source_generation
 
         while True:
+            scheduler = self.scheduler
+            try:
+                # Frames held back by the scheduler are released if no new frame arrives, e.g. at EOF or pause.
+                generation, img_bgr = self.frame_queue.get(timeout=0.2 if scheduler and scheduler.pending else None)
+            except Empty:
+                generation, img_bgr = scheduler_generation, None
+            except Closed:
+                break
+            if generation != self.source_generation:
+                continue
+            if generation != detector_generation:
+                # The detector is kept across sources, but must not track the previous source's signaller.
+                detector.reset()
+                detector_generation = generation
+
+            with self.stage_stats["inference"].time():
+                # A frame is [image, pose landmarks]; the landmarks stay False if inference was skipped.
+                frame = [img_bgr, False]
+                if scheduler is None:
+                    ready = [(frame, *infer(frame))]
+                elif img_bgr is None:
+                    ready = scheduler.flush()
+                else:
+                    if generation != scheduler_generation:
+                        scheduler.reset()
+                        scheduler_generation = generation
+                    ready = scheduler.push(frame, frame, self.is_stable())
+
+            try:
+                for frame, right_angle, left_angle in ready:
+                    if frame[1] is False:
+                        frame[1] = detector.results.pose_landmarks
+                    self.update_angle_buffer(right_angle, left_angle)
+                    if generation != decoded_generation and self.source_start_time is not None:
+                        decoded_generation = generation
+                        self.record_startup("first_frame", time.perf_counter() - self.source_start_time)
+                    self.render_queue.put((generation, frame, (right_angle, left_angle)))
+            except Closed:
+                break
+
+        POOL.release(detector)
+
+    def capture_loop(self):
+        while not self.stop_event.is_set():
+            # Taken before waiting for play or resume, so a source switched while waiting is noticed below.
+            generation = self.source_generation
             if not self.play_event.is_set():
-                default_img = Image.new("RGB", (1, 1), "black")
-                self.update_video_player(default_img)
+                try:
+                    self.render_queue.put((generation, None, None))
+                except Closed:
+                    break
                 self.play_event.wait()
 
             if not self.not_paused_event.is_set():
                 self.not_paused_event.wait()
 
-            success, img_bgr = self.cap.read()
-            if success:
-                img_bgr, landmarks = detector.find_pose(img_bgr)
-                if len(detector.landmarks) != 0:
-                    img_bgr, right_angle = detector.find_angle(img_bgr, right_elbow, right_wrist)
-                    img_bgr, left_angle = detector.find_angle(img_bgr, left_elbow, left_wrist)
-                    self.update_angle_buffer(right_angle, left_angle)
-                else:
-                    self.update_angle_buffer(None, None)
+            if self.stop_event.is_set():
+                break
 
-                img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-                img_rgb = Image.fromarray(img_rgb)
+            # The generation is checked with the capture held, so a switch made while this thread waited starts
+            # the loop over instead of reading one more frame, and a frame is never tagged with a newer source.
+            with self.capture.lock:
+                if generation != self.source_generation:
+                    continue
+                with self.stage_stats["capture"].time():
+                    success, img_bgr = self.capture.read()
 
-                new_width = int(img_rgb.width * self.aspect_ratio)
-                new_height = int(img_rgb.height * self.aspect_ratio)
-                if new_width > 0 and new_height > 0:
-                    img_rgb = img_rgb.resize((new_width, new_height))
-
-                self.update_video_player(img_rgb)
+            if success:
+                # Live sources keep only the newest frame; files block so no frame is skipped.
+                while generation == self.source_generation:
+                    try:
+                        self.frame_queue.put((generation, img_bgr), timeout=0.1)
+                        break
+                    except Full:
+                        pass
+                    except Closed:
+                        return
 
             else:
-                self.video_button.configure(state=tk.DISABLED)
-
-    def set_cap(self, cap):
-        self.cap = cap
+                if self.capture.is_open():
+                    # The main loop disables the button in show_source_state; Tk is not used from this thread.
+                    with self.display_lock:
+                        self.ended_generation = generation
+                with self.source_condition:
+                    self.source_condition.wait_for(
+                        lambda: generation != self.source_generation or self.stop_event.is_set())
+
+    def render_loop(self):
+        cv2 = opencv()
+        import pose_detector as pd
+        next_render_time = time.perf_counter()
+        while not self.stop_event.is_set():
+            # Sleeping until the next refresh lets the render queue drop frames that would never be seen.
+            delay = next_render_time - time.perf_counter()
+            if delay > 0 and self.stop_event.wait(delay):
+                break
+            try:
+                generation, frame, angles = self.render_queue.get()
+            except Closed:
+                break
+            next_render_time = max(next_render_time, time.perf_counter()) + 1 / self.refresh_rate
+            if generation != self.source_generation or not self.displayed:
+                continue
+
+            with self.stage_stats["render"].time():
+                if frame is None:
+                    img_rgb = np.zeros((1, 1, 3), dtype=np.uint8)
+                else:
+                    img_bgr, pose_landmarks = frame
+                    if pose_landmarks is not None:
+                        pd.draw_pose(img_bgr, pose_landmarks, *angles)
+                    img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
+
+                    height, width, _ = img_rgb.shape
+                    new_width = int(width * self.aspect_ratio)
+                    new_height = int(height * self.aspect_ratio)
+                    if new_width > 0 and new_height > 0:
+                        img_rgb = cv2.resize(img_rgb, (new_width, new_height), interpolation=cv2.INTER_AREA)
+
+                with self.display_lock:
+                    self.display_frame = img_rgb
+
+    def take_display_frame(self):
+        with self.display_lock:
+            img_rgb, self.display_frame = self.display_frame, None
+        return img_rgb
+
+    def show_source_state(self):
+        with self.display_lock:
+            generation, self.ended_generation = self.ended_generation, None
+        if generation is not None and generation == self.source_generation:
+            self.video_button.configure(state=tk.DISABLED)
+
+    def next_source(self):
+        with self.source_condition:
+            self.source_generation += 1
+            self.frame_queue.clear()
+            self.render_queue.clear()
+            self.source_condition.notify_all()
+
+    def set_cap(self, cap, live=False, owned=True):
+        # Captures opened for one source are owned and released as soon as another source replaces them.
+        self.source_start_time = time.perf_counter()
+        with self.capture.lock:
+            self.capture.replace(cap, owned)
+            self.frame_queue.set_drop_oldest(live)
+            self.next_source()
         self.play_event.set()
         self.not_paused_event.set()
 
+    def record_startup(self, phase, seconds):
+        if phase not in self.startup:
+            METRICS.gauge("startup_seconds", lambda: self.startup[phase], (("phase", phase),))
+        self.startup[phase] = round(seconds, 3)
+        metrics.logger.info(f"startup: {phase} {seconds:.2f} s")
+
     def set_aspect_ratio(self, player_width, player_height):
-        if self.cap is not None:
-            image_width = self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)
-            image_height = self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+        cv2 = opencv()
+        image_width = self.capture.get(cv2.CAP_PROP_FRAME_WIDTH)
+        image_height = self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT)
+        if image_width and image_height:
             self.aspect_ratio = min(player_width / image_width, player_height / image_height)
 
     def update_video_player(self, img):
+        from PIL import ImageTk
         img = ImageTk.PhotoImage(image=img)
         self.video_player.config(image=img)
         self.video_player.image = img
-        self.video_player.update_idletasks()
 
     def update_angle_buffer(self, right_angle, left_angle):
         self.angle_buffer.put((right_angle, left_angle))
-        if self.angle_buffer.qsize() > self.buffer_size:
-            self.angle_buffer.get()
 
     def toggle_pause(self):
         if self.not_paused_event.is_set():
@@ -93,120 +271,150 @@ class VideoThread(threading.Thread):
     def restart(self):
         if self.play_event.is_set():
             self.play_event.clear()
+        with self.capture.lock:
+            self.capture.release()
+            self.next_source()
         if not self.not_paused_event.is_set():
             self.not_paused_event.set()
 
     def stop(self):
-        if self.cap:
-            self.cap.release()
+        self.stop_event.set()
+        self.frame_queue.close()
+        self.render_queue.close()
+        self.angle_buffer.close()
+        self.play_event.set()
+        self.not_paused_event.set()
+        with self.source_condition:
+            self.source_condition.notify_all()
+
+        if self.capture_thread is not None:
+            self.capture_thread.join(timeout=1.0)
+        self.capture.release()
 
 
 class TextThread(threading.Thread):
     def __init__(self, detector_output, text_output, angle_buffer, buffer_size=10,
-                 output_threshold=5, language="en", stable_duration=2.0, *args, **kwargs):
+                 output_threshold=5, language="en", stable_duration=2.0, smoothing=False, session_log_dir=None,
+                 *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.smoothing = smoothing
+        self.decoder = sd.SemaphoreDecoder()
+        self.session_log = None
+        if session_log_dir is not None:
+            os.makedirs(session_log_dir, exist_ok=True)
+            self.session_log = open_session_log(session_log_dir, language, buffer_size, output_threshold,
+                                                stable_duration, self.decoder.angle_gap, smoothing=smoothing)
+        self.smoother = None
         self.detector_output = detector_output
         self.text_output = text_output
-        self.text = ""
         self.language = language
-        self.buffer_size = buffer_size
         self.angle_buffer = angle_buffer
-        self.letter_buffer = []
-        self.output_threshold = output_threshold
-        self.output_letter = None
-        self.stable_letter = None
-        self.stable_start_time = 0.0
-        self.stable_duration = stable_duration
+        self.stabiliser = LetterStabiliser(buffer_size, output_threshold, stable_duration, ALPHABETS.get(language))
+        self.display_lock = threading.Lock()
+        self.display_state = None
+        self.shown_text = None
         self.start_detection_event = threading.Event()
-        self.stable_letter_event = threading.Event()
+        self.restart_event = threading.Event()
+        self.stop_event = threading.Event()
 
     def run(self):
-        decoder = sd.SemaphoreDecoder()
+        decoder = self.decoder
+        if self.smoothing:
+            self.smoother = ArmSmoother(decoder)
         self.start_detection_event.set()
 
-        while True:
+        while not self.stop_event.is_set():
             if not self.start_detection_event.is_set():
                 self.start_detection_event.wait()
-
-            if self.angle_buffer:
-                right_angle, left_angle = self.angle_buffer.get()
+                continue
+            if self.restart_event.is_set():
+                self.restart_event.clear()
+                self.reset()
+
+            try:
+                right_angle, left_angle = self.angle_buffer.get(timeout=0.5)
+            except Empty:
+                continue
+            except Closed:
+                break
+
+            timestamp = time.time()
+            if self.smoother is not None:
+                right_angle, left_angle = self.smoother.update(right_angle, left_angle, timestamp)
+            with METRICS.time("find_letter"):
                 current_letter = decoder.find_letter(right_angle, left_angle, self.language)
-                self.update_letter_buffer(current_letter)
-
-                if self.is_stable(current_letter):
-                    if self.output_letter != current_letter:
-                        self.stable_letter = None
-                        self.output_letter = current_letter
-                        self.stable_start_time = time.time()
-
-                        if self.stable_letter_event.is_set():
-                            self.stable_letter_event.clear()
-
-                    elif time.time() - self.stable_start_time >= self.stable_duration:
-                        self.stable_letter = current_letter
-
-                        if not self.stable_letter_event.is_set():
-                            self.stable_letter_event.set()
-                            self.update_text()
-
-                    self.output_letter = current_letter
-                    self.update_output()
-
-    def update_letter_buffer(self, letter):
-        self.letter_buffer.append(letter)
-        if len(self.letter_buffer) > self.buffer_size:
-            self.letter_buffer.pop(0)
-
-    def is_stable(self, letter):
-        return self.letter_buffer.count(letter) >= self.output_threshold
+            if self.session_log is not None:
+                timestamp = self.session_log.frame(timestamp, decoder.angle_sector(right_angle),
+                                                   decoder.angle_sector(left_angle), self.stabiliser)
+            with METRICS.time("stabiliser"):
+                event = self.stabiliser.update(current_letter, timestamp)
+            if self.session_log is not None and event in (COMMITTED, SPACE, STOP):
+                self.session_log.event(event, timestamp, self.stabiliser.stable_letter)
+
+            if self.stabiliser.stable:
+                if event == STOP:
+                    self.start_detection_event.clear()
+                self.update_output()
 
     def update_output(self):
+        # Only records what to show; show_output puts it on the widgets from the main loop.
+        with self.display_lock:
+            self.display_state = (self.stabiliser.output_letter, self.stabiliser.stable_letter is not None,
+                                  self.stabiliser.text)
+
+    def show_output(self):
+        with self.display_lock:
+            state, self.display_state = self.display_state, None
+        if state is None:
+            return
+        output_letter, stable, text = state
         default_color = self.detector_output.master.cget("fg_color")
-
-        if self.output_letter is None:
+        if output_letter is None:
             self.detector_output.configure(text=" ", fg_color=default_color)
         else:
-            if self.stable_letter is None:
-                self.detector_output.configure(fg_color=default_color)
-            else:
-                self.detector_output.configure(fg_color="orange")
-            self.detector_output.configure(text=self.output_letter)
-
-    def update_text(self):
-        if self.stable_letter in ("STOP", "КІНЕЦЬ"):
-            self.start_detection_event.clear()
-
-        elif self.stable_letter in ("SPACE", "ПРОБІЛ"):
-            self.text += " "
-            self.text_output.configure(text=self.text)
-
-        elif self.stable_letter is not None:
-            self.text += self.stable_letter
-            self.text_output.configure(text=self.text)
+            self.detector_output.configure(text=output_letter, fg_color="orange" if stable else default_color)
+        if text != self.shown_text:
+            self.text_output.configure(text=text or " ")
+            self.shown_text = text
 
     def update_settings(self, language, stable_duration):
         self.language = language
-        self.stable_duration = stable_duration
+        self.stabiliser.alphabet = ALPHABETS.get(language)
+        self.stabiliser.stable_duration = stable_duration
+        if self.session_log is not None:
+            self.session_log.settings(language=language, stable_duration=stable_duration)
+
+    def reset(self):
+        # Runs on the text thread, between frames, so the stabiliser is never cleared halfway through an update.
+        self.stabiliser.reset()
+        if self.smoother is not None:
+            self.smoother.reset()
+        if self.session_log is not None:
+            self.session_log.reset()
+        self.update_output()
 
     def restart(self):
-        self.text = ""
-        self.letter_buffer = []
-        self.output_letter = None
-        self.stable_letter = None
-        self.stable_start_time = 0.0
-
+        self.restart_event.set()
         if not self.start_detection_event.is_set():
             self.start_detection_event.set()
-        if self.stable_letter_event.is_set():
-            self.stable_letter_event.clear()
 
+        with self.display_lock:
+            self.display_state = None
+        self.shown_text = ""
         self.text_output.configure(text=" ")
         self.detector_output.configure(text=" ")
         self.detector_output.configure(fg_color=self.detector_output.master.cget("fg_color"))
 
+    def stop(self):
+        self.stop_event.set()
+        self.start_detection_event.set()
+        self.angle_buffer.close()
+        if self.session_log is not None:
+            self.session_log.close()
+
 
 class SemaphoreApp(cs.CTk):
-    def __init__(self, master=None):
+    def __init__(self, master=None, adaptive=False, smoothing=False, session_log_dir=None):
         super().__init__(master)
         self.camera = None
         self.video_file = ''
@@ -227,8 +435,8 @@ class SemaphoreApp(cs.CTk):
 
         self.language_label = cs.CTkLabel(self.settings_frame, text="Language:")
         self.language_label.grid(row=1, column=0, padx=(20, 10), pady=(20, 20), sticky="nsew")
-        self.language = cs.CTkOptionMenu(self.settings_frame, values=["English", "Ukrainian"])
-        self.language.set("English")
+        self.language = cs.CTkOptionMenu(self.settings_frame, values=list(alphabet_labels(ALPHABETS)))
+        self.language.set(next(label for label, language in alphabet_labels(ALPHABETS).items() if language == "en"))
         self.language.grid(row=1, column=1, padx=(10, 20), pady=(20, 20), sticky="nsew")
 
         self.detection_speed_label = cs.CTkLabel(self.settings_frame, text="Detection Speed:")
@@ -273,16 +481,38 @@ class SemaphoreApp(cs.CTk):
 
         buffer_size = 10
         self.video_thread = VideoThread(video_player=self.video_player, video_button=self.button2,
-                                        buffer_size=buffer_size,
+                                        buffer_size=buffer_size, adaptive=adaptive,
                                         daemon=True)
-        self.video_thread.start()
 
         self.text_thread = TextThread(detector_output=self.detector_output, text_output=self.text_output,
                                       buffer_size=buffer_size, angle_buffer=self.video_thread.angle_buffer,
-                                      daemon=True)
+                                      smoothing=smoothing, session_log_dir=session_log_dir, daemon=True)
         self.text_thread.start()
+        self.video_thread.is_stable = lambda: self.text_thread.stabiliser.committed
+        self.display_job = self.after(0, self.show_video_frame)
+        self.bind("<Map>", self.on_map, add="+")
+
+    def on_map(self, event):
+        # The video thread loads and warms up MediaPipe, so it starts only once the window is on screen.
+        if event.widget is not self or self.video_thread.ident is not None:
+            return
+        self.video_thread.record_startup("window", time.perf_counter() - START_TIME)
+        self.video_thread.start()
+
+    def show_video_frame(self):
+        from PIL import Image
+        # The worker threads only publish frames and state; widgets are updated here, on the main loop, at the
+        # video thread's refresh rate.
+        img_rgb = self.video_thread.take_display_frame()
+        if img_rgb is not None:
+            self.video_thread.update_video_player(Image.fromarray(img_rgb))
+        self.video_thread.show_source_state()
+        self.text_thread.show_output()
+        self.video_thread.displayed = bool(self.video_player.winfo_viewable())
+        self.display_job = self.after(int(1000 / self.video_thread.refresh_rate), self.show_video_frame)
 
     def start_camera(self):
+        cv2 = opencv()
         if self.camera is None:
             self.camera = cv2.VideoCapture(0)
             self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, 900)
@@ -290,10 +520,11 @@ class SemaphoreApp(cs.CTk):
         self.button1.configure(text="Restart", command=self.restart)
         self.button2.configure(state=tk.DISABLED)
 
-        self.video_thread.set_cap(self.camera)
+        self.video_thread.set_cap(self.camera, live=True, owned=False)
         self.on_resize(None)
 
     def open_video(self):
+        cv2 = opencv()
         self.video_file = tk.filedialog.askopenfilename(
             filetypes=[('Video', ['*.mp4', '*.avi', '*.mov', '*.mkv', '*gif']), ('All Files', '*.*')])
         if self.video_file:
@@ -311,10 +542,7 @@ class SemaphoreApp(cs.CTk):
         self.button2.configure(state=tk.NORMAL)
 
     def on_settings_update(self):
-        language_dict = {
-            "English": "en",
-            "Ukrainian": "uk"
-        }
+        language_dict = alphabet_labels(ALPHABETS)
         detection_speed_dict = {
             "0.5 sec": 0.5,
             "1 sec": 1.0,
@@ -327,9 +555,11 @@ class SemaphoreApp(cs.CTk):
         self.text_thread.update_settings(language, detection_speed)
 
     def on_close(self):
+        self.after_cancel(self.display_job)
+        self.video_thread.stop()
+        self.text_thread.stop()
         if self.camera:
             self.camera.release()
-        self.video_thread.stop()
         self.destroy()
 
     def on_resize(self, event):
@@ -340,7 +570,18 @@ class SemaphoreApp(cs.CTk):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Semaphore Decoder")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="skip pose detection on frames while a committed letter is held still")
+    parser.add_argument("--smooth", action="store_true",
+                        help="filter arm angles over time and hold sectors with hysteresis before decoding")
+    parser.add_argument("--session-log", default=None, metavar="DIR",
+                        help="record every decoded session to a replayable log in DIR")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.start_from_args(args)
+
     cs.set_appearance_mode("dark")
     cs.set_default_color_theme("dark-blue")
-    app = SemaphoreApp()
+    app = SemaphoreApp(adaptive=args.adaptive, smoothing=args.smooth, session_log_dir=args.session_log)
     app.mainloop()
@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import numpy as np
+
+NUM_LANDMARKS = 33
+CACHE_VERSION = 1
+
+
+def video_hash(video_file, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(video_file, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def round_angles(angles):
+    rounded = np.round(angles, 1)
+    # np.round scales by 10 before rounding, which can differ from round() right at a .x5 tie.
+    scaled = angles * 10
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for idx in zip(*np.nonzero(near_tie)):
+        rounded[idx] = round(float(angles[idx]), 1)
+    return rounded
+
+
+class LandmarkRecording:
+    def __init__(self, landmarks, meta):
+        self.landmarks = landmarks
+        self.meta = meta
+        self.fps = meta["fps"]
+        self.width = meta["width"]
+        self.height = meta["height"]
+
+    def __len__(self):
+        return len(self.landmarks)
+
+    def frame_landmarks(self, frame_index, visibility=0.5):
+        frame = self.landmarks[frame_index]
+        if np.isnan(frame[0, 0]):
+            return []
+
+        landmarks = []
+        for idx, (x, y, v) in enumerate(frame.tolist()):
+            confident = (0 <= x <= 1) and (0 <= y <= 1) and (v > visibility)
+            landmarks.append([idx, int(x * self.width), int(y * self.height), confident])
+        return landmarks
+
+    def angles(self, point1, point2, visibility=0.5):
+        points = self.landmarks[:, [point1, point2]].astype(np.float64)
+        x, y, v = points[..., 0], points[..., 1], points[..., 2]
+        confident = (0 <= x) & (x <= 1) & (0 <= y) & (y <= 1) & (v > visibility)
+        px, py = np.trunc(x * self.width), np.trunc(y * self.height)
+
+        angles = np.degrees(np.arctan2(py[:, 1] - py[:, 0], px[:, 1] - px[:, 0]))
+        angles[~(confident[:, 0] & confident[:, 1])] = np.nan
+        return round_angles(angles)
+
+
+class LandmarkWriter:
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self.frames = 0
+        self.part_path = path + ".part"
+        self.part = open(self.part_path, "wb")
+        self.row = np.empty((NUM_LANDMARKS, 3), dtype=np.float32)
+
+    def append(self, pose_landmarks):
+        if pose_landmarks is None:
+            self.row.fill(np.nan)
+        else:
+            for idx, landmark in enumerate(pose_landmarks.landmark):
+                self.row[idx] = landmark.x, landmark.y, landmark.visibility
+        self.part.write(self.row.tobytes())
+        self.frames += 1
+
+    def close(self):
+        self.part.close()
+        header = {"descr": "<f4", "fortran_order": False, "shape": (self.frames, NUM_LANDMARKS, 3)}
+        with open(self.path + ".tmp", "wb") as f, open(self.part_path, "rb") as part:
+            np.lib.format.write_array_header_1_0(f, header)
+            shutil.copyfileobj(part, f)
+        os.remove(self.part_path)
+
+        self.meta["frames"] = self.frames
+        with open(os.path.splitext(self.path)[0] + ".json", "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(self.path + ".tmp", self.path)
+
+    def abort(self):
+        self.part.close()
+        os.remove(self.part_path)
+
+
+def load_recording(path):
+    meta_path = os.path.splitext(path)[0] + ".json"
+    if not (os.path.exists(path) and os.path.exists(meta_path)):
+        return None
+
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    return LandmarkRecording(np.load(path, mmap_mode="r"), meta)
+
+
+def save_recording(path, landmarks, meta):
+    meta = dict(meta, frames=len(landmarks))
+    with open(os.path.splitext(path)[0] + ".json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    np.save(path, np.asarray(landmarks, dtype=np.float32))
+
+
+class LandmarkCache:
+    def __init__(self, cache_dir="landmark_cache"):
+        self.cache_dir = cache_dir
+        self.hashes = None
+
+    def key(self, video_file, settings):
+        content = json.dumps({"version": CACHE_VERSION, "video": self.video_hash(video_file), "settings": settings},
+                             sort_keys=True)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+    def video_hash(self, video_file):
+        # Hashing a long recording costs more than the cache saves, so the hash is kept per path and only
+        # computed again when the file's size or modification time changes.
+        stat = os.stat(video_file)
+        path = os.path.abspath(video_file)
+        hashes = self.load_hashes()
+        entry = hashes.get(path)
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["sha256"]
+
+        digest = video_hash(video_file)
+        hashes[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        hashes_path = os.path.join(self.cache_dir, "hashes.json")
+        with open(hashes_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(hashes, f, ensure_ascii=False, indent=2)
+        os.replace(hashes_path + ".tmp", hashes_path)
+        return digest
+
+    def load_hashes(self):
+        if self.hashes is None:
+            try:
+                with open(os.path.join(self.cache_dir, "hashes.json"), encoding="utf-8") as f:
+                    self.hashes = json.load(f)
+            except (OSError, ValueError):
+                self.hashes = {}
+        return self.hashes
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + ".npy")
+
+    def load(self, key):
+        return load_recording(self.path(key))
+
+    def writer(self, key, video_file, settings, fps, width, height):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        meta = {
+            "version": CACHE_VERSION,
+            "video": os.path.basename(video_file),
+            "settings": settings,
+            "fps": fps,
+            "width": width,
+            "height": height,
+        }
+        return LandmarkWriter(self.path(key), meta)
+
+
+def main():
+    cache = LandmarkCache(sys.argv[1] if len(sys.argv) > 1 else "landmark_cache")
+    for name in sorted(os.listdir(cache.cache_dir)):
+        if name.endswith(".npy"):
+            recording = cache.load(name[:-4])
+            if recording is not None:
+                print(f"{name[:-4]}: {recording.meta['video']} {len(recording)} frames "
+                      f"{recording.width}x{recording.height} @ {recording.fps:.2f} FPS")
+
+
+if __name__ == "__main__":
+    main()
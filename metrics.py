@@ -0,0 +1,234 @@
+import time
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds, from 50 us to 2.5 s, plus the implicit +Inf bucket.
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5)
+COMMIT_BUCKETS = (0.25, 0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 4.0, 5.0, 7.5, 10.0)
+
+logger = logging.getLogger("semaphore.metrics")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        # Stages are timed from several threads at once; each histogram has its own lock so they rarely wait.
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.count, self.sum
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the quantile; good enough for a log line.
+        counts, count, _ = self.snapshot()
+        if not count:
+            return 0.0
+        rank = q * count
+        total = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            total += bucket_count
+            if total >= rank:
+                return bound
+        return float("inf")
+
+
+class Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start_time = 0.0
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.histogram.observe(time.perf_counter() - self.start_time)
+        return False
+
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class Registry:
+    def __init__(self, enabled=False, prefix="semaphore"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.gauges = {}
+        self.counters = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def histogram(self, name, labels=(), buckets=LATENCY_BUCKETS):
+        key = (name, tuple(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram(buckets))
+        return histogram
+
+    def time(self, stage):
+        # Disabled metrics cost one attribute check and a shared no-op context manager.
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self.histogram("stage_seconds", (("stage", stage),)))
+
+    def observe(self, name, value, labels=(), buckets=LATENCY_BUCKETS):
+        if self.enabled:
+            self.histogram(name, labels, buckets).observe(value)
+
+    def increment(self, name, labels=(), value=1):
+        if self.enabled:
+            key = (name, tuple(labels))
+            with self.lock:
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, function, labels=()):
+        # Gauges are read when the metrics are collected, so they cost nothing on the hot path.
+        with self.lock:
+            self.gauges[(name, tuple(labels))] = function
+
+    def remove_gauge(self, name, labels=()):
+        with self.lock:
+            self.gauges.pop((name, tuple(labels)), None)
+
+    def remove_gauges(self, labels):
+        labels = tuple(labels)
+        with self.lock:
+            for key in [key for key in self.gauges if key[1] == labels]:
+                del self.gauges[key]
+
+    def render(self):
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            gauges = sorted(self.gauges.items(), key=lambda item: item[0])
+            counters = sorted(self.counters.items())
+
+        seen = set()
+        for (name, labels), histogram in histograms:
+            full_name = f"{self.prefix}_{name}"
+            if full_name not in seen:
+                lines.append(f"# TYPE {full_name} histogram")
+                seen.add(full_name)
+            counts, count, histogram_sum = histogram.snapshot()
+            total = 0
+            for bound, bucket_count in zip(histogram.buckets + (float("inf"),), counts):
+                total += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{full_name}_bucket{format_labels(labels + (('le', le),))} {total}")
+            lines.append(f"{full_name}_sum{format_labels(labels)} {histogram_sum}")
+            lines.append(f"{full_name}_count{format_labels(labels)} {count}")
+
+        for kind, items in (("gauge", gauges), ("counter", counters)):
+            for (name, labels), value in items:
+                if callable(value):
+                    try:
+                        value = value()
+                    except Exception:
+                        continue
+                full_name = f"{self.prefix}_{name}"
+                if full_name not in seen:
+                    lines.append(f"# TYPE {full_name} {kind}")
+                    seen.add(full_name)
+                lines.append(f"{full_name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+        parts = []
+        for (name, labels), histogram in histograms:
+            _, count, histogram_sum = histogram.snapshot()
+            if name != "stage_seconds" or not count:
+                continue
+            stage = dict(labels)["stage"]
+            parts.append(f"{stage} {histogram_sum / count * 1000:.2f}/"
+                         f"{histogram.quantile(0.95) * 1000:g} ms")
+        return "avg/p95 " + ", ".join(parts) if parts else "no samples"
+
+
+METRICS = Registry()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host="127.0.0.1", registry=METRICS):
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    server.registry = registry
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def log_metrics(interval, registry=METRICS, stop_event=None):
+    stop_event = stop_event or threading.Event()
+
+    def loop():
+        while not stop_event.wait(interval):
+            logger.info(registry.summary())
+
+    threading.Thread(target=loop, daemon=True).start()
+    return stop_event
+
+
+def add_arguments(parser):
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-log", type=float, default=None, metavar="SECONDS",
+                        help="log average and p95 stage latencies every SECONDS")
+
+
+def start_from_args(args, registry=METRICS):
+    if args.metrics_port is None and args.metrics_log is None:
+        return
+    registry.enable()
+    if args.metrics_port is not None:
+        serve_metrics(args.metrics_port, registry=registry)
+    if args.metrics_log is not None:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+        log_metrics(args.metrics_log, registry)
@@ -0,0 +1,230 @@
+import json
+import time
+import argparse
+import batch_decoder as bd
+import pose_detector as pd
+import semaphore_decoder as sd
+import metrics
+from metrics import METRICS
+from alphabet import ALPHABETS
+from smoothing import ArmSmoother
+from stabiliser import LetterStabiliser, CANDIDATE
+from video_reader import VideoReader
+
+
+def box_iou(box1, box2):
+    x0, y0 = max(box1[0], box2[0]), max(box1[1], box2[1])
+    x1, y1 = min(box1[2], box2[2]), min(box1[3], box2[3])
+    overlap = max(0, x1 - x0) * max(0, y1 - y0)
+    area1 = (box1[2] - box1[0]) * (box1[3] - box1[1])
+    area2 = (box2[2] - box2[0]) * (box2[3] - box2[1])
+    union = area1 + area2 - overlap
+    return overlap / union if union > 0 else 0.0
+
+
+class Track:
+    def __init__(self, track_id, box, timestamp):
+        self.track_id = track_id
+        self.box = box
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.missed = 0
+
+
+class PersonTracker:
+    # Greedy matching on bounding box overlap with the previous frame. Signallers mostly stand still, so
+    # overlap is a strong cue and the few people in frame make the quadratic pairing cheap.
+    def __init__(self, min_iou=0.3, max_missed=15):
+        self.min_iou = min_iou
+        self.max_missed = max_missed
+        self.tracks = {}
+        self.next_id = 1
+
+    def update(self, boxes, timestamp):
+        # Returns the track id for each box, and the tracks that ended because they were missed for too long.
+        pairs = sorted(((box_iou(track.box, box), track_id, index)
+                        for track_id, track in self.tracks.items() for index, box in enumerate(boxes)),
+                       reverse=True)
+        assigned = [None] * len(boxes)
+        matched = set()
+        for iou, track_id, index in pairs:
+            if iou < self.min_iou:
+                break
+            if track_id in matched or assigned[index] is not None:
+                continue
+            assigned[index] = track_id
+            matched.add(track_id)
+
+        for index, box in enumerate(boxes):
+            if assigned[index] is None:
+                assigned[index] = self.next_id
+                self.tracks[self.next_id] = Track(self.next_id, box, timestamp)
+                self.next_id += 1
+            track = self.tracks[assigned[index]]
+            track.box = box
+            track.last_seen = timestamp
+            track.missed = 0
+
+        ended = []
+        for track_id, track in list(self.tracks.items()):
+            if track_id in assigned:
+                continue
+            track.missed += 1
+            if track.missed > self.max_missed:
+                ended.append(self.tracks.pop(track_id))
+        return assigned, ended
+
+    def reset(self):
+        self.tracks.clear()
+
+
+class Signaller:
+    def __init__(self, track_id, decoder, language, buffer_size, output_threshold, stable_duration, smoothing):
+        self.track_id = track_id
+        self.stabiliser = LetterStabiliser(buffer_size, output_threshold, stable_duration,
+                                           decoder.alphabets.get(language))
+        self.smoother = ArmSmoother(decoder) if smoothing else None
+        self.frames = 0
+
+
+class MultiSignallerDecoder:
+    # Every track gets its own smoother and stabiliser, so one signaller's letters never vote in another's
+    # window. A track that is briefly lost keeps its state and sees frames without a letter until it is
+    # found again or ends.
+    def __init__(self, language="en", buffer_size=10, output_threshold=5, stable_duration=2.0, angle_gap=22.5,
+                 smoothing=False, min_iou=0.3, max_missed=15):
+        self.language = language
+        self.buffer_size = buffer_size
+        self.output_threshold = output_threshold
+        self.stable_duration = stable_duration
+        self.smoothing = smoothing
+        self.decoder = sd.SemaphoreDecoder(angle_gap=angle_gap)
+        self.tracker = PersonTracker(min_iou, max_missed)
+        self.signallers = {}
+        self.finished = []
+
+    def update(self, people, timestamp, frame_index=None):
+        with METRICS.time("tracking"):
+            track_ids, ended = self.tracker.update([box for box, _, _ in people], timestamp)
+        for track in ended:
+            self.finished.append(self.signallers.pop(track.track_id))
+
+        angles = {track_id: (right_angle, left_angle) for track_id, (_, right_angle, left_angle)
+                  in zip(track_ids, people)}
+        events = []
+        for track_id in self.tracker.tracks:
+            signaller = self.signallers.get(track_id)
+            if signaller is None:
+                signaller = Signaller(track_id, self.decoder, self.language, self.buffer_size,
+                                      self.output_threshold, self.stable_duration, self.smoothing)
+                self.signallers[track_id] = signaller
+            right_angle, left_angle = angles.get(track_id, (None, None))
+            if signaller.smoother is not None:
+                right_angle, left_angle = signaller.smoother.update(right_angle, left_angle, timestamp)
+            letter = self.decoder.find_letter(right_angle, left_angle, self.language)
+            stabiliser = signaller.stabiliser
+            with METRICS.time("stabiliser"):
+                event = stabiliser.update(letter, timestamp, frame_index)
+            signaller.frames += 1
+            if event is not None and event != CANDIDATE:
+                events.append({
+                    "track": track_id,
+                    "type": event,
+                    "letter": stabiliser.stable_letter,
+                    "text": stabiliser.text,
+                    "frame": frame_index,
+                    "time": round(timestamp, 3),
+                })
+        return events
+
+    def reset(self):
+        self.tracker.reset()
+        self.signallers.clear()
+        self.finished.clear()
+
+    def results(self):
+        signallers = sorted(self.finished + list(self.signallers.values()), key=lambda signaller: signaller.track_id)
+        return [{"track": signaller.track_id, "text": signaller.stabiliser.text,
+                 "letters": signaller.stabiliser.letters, "frames": signaller.frames}
+                for signaller in signallers if signaller.stabiliser.letters]
+
+
+def decode_video(video_file, model_path, num_poses=4, language="en", buffer_size=10, output_threshold=5,
+                 stable_duration=2.0, angle_gap=22.5, smoothing=False, min_iou=0.3, max_missed=15, step=1,
+                 max_width=None, on_event=None):
+    if step > 1:
+        buffer_size, output_threshold = bd.scale_window(buffer_size, output_threshold, step)
+    detector = pd.MultiPoseDetector(model_path, num_poses)
+    decoder = MultiSignallerDecoder(language, buffer_size, output_threshold, stable_duration, angle_gap, smoothing,
+                                    min_iou, max(1, round(max_missed / step)))
+    reader = VideoReader(video_file, step=step, max_width=max_width)
+    # Registered for this decode only, so the registry never holds on to a finished decoder.
+    METRICS.gauge("tracks", lambda: len(decoder.signallers))
+    start_time = time.perf_counter()
+    frames = 0
+    people = 0
+    try:
+        for frame_index, img in reader:
+            timestamp = frame_index / reader.fps
+            found = detector.find_people(img, timestamp * 1000)
+            for event in decoder.update(found, timestamp, frame_index):
+                if on_event is not None:
+                    on_event(event)
+            frames += 1
+            people += len(found)
+    finally:
+        METRICS.remove_gauge("tracks")
+        reader.close()
+        detector.close()
+    elapsed = time.perf_counter() - start_time
+    return {
+        "video": video_file,
+        "language": language,
+        "tracks": decoder.results(),
+        "frames": frames,
+        "people_per_frame": round(people / frames, 2) if frames else 0.0,
+        "video_fps": reader.fps,
+        "elapsed": round(elapsed, 3),
+        "decode_fps": round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode every semaphore signaller in a video separately.")
+    parser.add_argument("video")
+    parser.add_argument("--model", required=True, help="PoseLandmarker model bundle (.task)")
+    parser.add_argument("--num-poses", type=int, default=4, help="most people detected in a frame")
+    parser.add_argument("-l", "--language", choices=sorted(ALPHABETS), default="en")
+    parser.add_argument("--buffer-size", type=int, default=10)
+    parser.add_argument("--output-threshold", type=int, default=5)
+    parser.add_argument("--stable-duration", type=float, default=2.0)
+    parser.add_argument("--angle-gap", type=float, default=22.5)
+    parser.add_argument("--smooth", action="store_true",
+                        help="filter arm angles over time and hold sectors with hysteresis before decoding")
+    parser.add_argument("--min-iou", type=float, default=0.3,
+                        help="least box overlap with the previous frame to keep a person's track")
+    parser.add_argument("--max-missed", type=int, default=15,
+                        help="frames a person may go undetected before their track ends")
+    parser.add_argument("--frame-step", type=bd.positive_int, default=1, help="run detection on every Nth frame")
+    parser.add_argument("--max-width", type=bd.positive_int, default=None, help="downscale frames wider than this")
+    parser.add_argument("-o", "--output", default=None, help="write the decoded tracks to this JSON file")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.start_from_args(args)
+
+    # Committed letters are printed as they happen, one JSON line each, tagged with the signaller's track.
+    result = decode_video(args.video, args.model, args.num_poses, args.language, args.buffer_size,
+                          args.output_threshold, args.stable_duration, args.angle_gap, args.smooth, args.min_iou,
+                          args.max_missed, args.frame_step, args.max_width,
+                          lambda event: print(json.dumps(event, ensure_ascii=False), flush=True))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"{result['frames']} frames in {result['elapsed']:.2f} s ({result['decode_fps']:.1f} FPS), "
+          f"{result['people_per_frame']:.2f} people per frame")
+    for track in result["tracks"]:
+        print(f"  track {track['track']}: {track['text']!r}")
+
+
+if __name__ == "__main__":
+    main()
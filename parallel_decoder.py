@@ -0,0 +1,108 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import batch_decoder as bd
+
+
+def split_frames(frame_count, chunks):
+    chunks = max(1, min(chunks, frame_count))
+    bounds = [round(i * frame_count / chunks) for i in range(chunks + 1)]
+    ranges = [(bounds[i], bounds[i + 1]) for i in range(chunks)]
+    # The frame count reported by the container may be short, so the last chunk reads until EOF.
+    ranges[-1] = (ranges[-1][0], None)
+    return ranges
+
+
+def decode_chunk(video_file, start_frame, end_frame, warmup_frames, step, max_width, detector_options):
+    angles = bd.read_angles(video_file, start_frame, end_frame, warmup_frames, step, max_width, **detector_options)
+    return list(angles)
+
+
+def merge_chunks(chunks, step=1):
+    merged = []
+    next_frame = 0
+    for chunk in chunks:
+        for frame_index, right_angle, left_angle in chunk:
+            if frame_index < next_frame:
+                continue
+            if frame_index != next_frame:
+                raise ValueError(f"Missing frames {next_frame}..{frame_index - 1} between chunks")
+            merged.append((frame_index, right_angle, left_angle))
+            next_frame += step
+    return merged
+
+
+def decode_video_parallel(video_file, workers=None, chunks=None, warmup_frames=30, language="en", buffer_size=10,
+                          output_threshold=5, stable_duration=2.0, angle_gap=22.5, smoothing=False, step=1,
+                          max_width=None, **detector_options):
+    workers = workers or os.cpu_count() or 1
+    chunks = chunks or workers
+    video_fps, frame_count = bd.video_info(video_file)
+    if step > 1:
+        buffer_size, output_threshold = bd.scale_window(buffer_size, output_threshold, step)
+
+    start_time = time.perf_counter()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [executor.submit(decode_chunk, video_file, start_frame, end_frame, warmup_frames, step,
+                                   max_width, detector_options)
+                   for start_frame, end_frame in split_frames(frame_count, chunks)]
+        angles = merge_chunks((future.result() for future in futures), step)
+
+    stabiliser, frames = bd.decode_angles(angles, video_fps, language, buffer_size, output_threshold,
+                                          stable_duration, angle_gap, smoothing)
+    elapsed = time.perf_counter() - start_time
+    return bd.make_result(video_file, language, stabiliser, frames, video_fps, elapsed)
+
+
+def build_parser():
+    parser = bd.build_parser()
+    parser.description = "Decode semaphore videos in parallel by splitting them into frame ranges."
+    # Shared with the batch decoder but not supported here; no default lets main tell when one was given.
+    parser.set_defaults(max_skip=None)
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--chunks", type=int, default=None, help="number of frame ranges (default: workers)")
+    parser.add_argument("--warmup-frames", type=int, default=30,
+                        help="frames decoded before each range so pose tracking settles")
+    parser.add_argument("--compare", action="store_true",
+                        help="also run the sequential decoder and report the speed-up")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.adaptive or args.max_skip is not None or args.cache_dir is not None:
+        parser.error("--adaptive, --max-skip and --cache-dir are not supported by the parallel decoder")
+    try:
+        names = bd.output_names(args.videos)
+    except ValueError as error:
+        parser.error(str(error))
+    os.makedirs(args.output_dir, exist_ok=True)
+    writers = {"json": bd.write_json, "csv": bd.write_csv}
+
+    for video_file, name in zip(args.videos, names):
+        result = decode_video_parallel(video_file, args.workers, args.chunks, args.warmup_frames, args.language,
+                                       args.buffer_size, args.output_threshold, args.stable_duration,
+                                       args.angle_gap, args.smooth, args.frame_step, args.max_width,
+                                       **bd.detector_options(args))
+        for output_format in args.format:
+            writers[output_format](result, os.path.join(args.output_dir, f"{name}.{output_format}"))
+
+        print(f"{video_file}: {result['frames']} frames in {result['elapsed']:.2f} s "
+              f"({result['decode_fps']:.1f} FPS, {args.workers} workers) -> {result['text']!r}")
+
+        if args.compare:
+            sequential = bd.decode_video(video_file, args.language, args.buffer_size, args.output_threshold,
+                                         args.stable_duration, args.angle_gap, smoothing=args.smooth,
+                                         step=args.frame_step, max_width=args.max_width,
+                                         **bd.detector_options(args))
+            speedup = sequential["elapsed"] / result["elapsed"] if result["elapsed"] > 0 else 0.0
+            match = sequential["letters"] == result["letters"]
+            print(f"  sequential: {sequential['elapsed']:.2f} s ({sequential['decode_fps']:.1f} FPS), "
+                  f"speed-up x{speedup:.2f}, output {'matches' if match else 'DIFFERS'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import time
+import threading
+from collections import deque
+from queue import Empty, Full
+from metrics import METRICS
+
+
+class Closed(Exception):
+    pass
+
+
+class FrameQueue:
+    def __init__(self, maxsize=1, drop_oldest=True):
+        self.maxsize = maxsize
+        self.drop_oldest = drop_oldest
+        self.items = deque()
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item, timeout=None):
+        with self.condition:
+            if self.closed:
+                raise Closed
+            if len(self.items) >= self.maxsize:
+                if self.drop_oldest:
+                    self.items.popleft()
+                    self.dropped += 1
+                elif not self.condition.wait_for(lambda: self.closed or len(self.items) < self.maxsize, timeout):
+                    raise Full
+                elif self.closed:
+                    raise Closed
+            self.items.append(item)
+            self.condition.notify_all()
+
+    def get(self, timeout=None):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.closed or self.items, timeout):
+                raise Empty
+            if not self.items:
+                raise Closed
+            item = self.items.popleft()
+            self.condition.notify_all()
+            return item
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def set_drop_oldest(self, drop_oldest):
+        with self.condition:
+            self.drop_oldest = drop_oldest
+
+    def clear(self):
+        with self.condition:
+            self.items.clear()
+            self.condition.notify_all()
+
+    def qsize(self):
+        return len(self.items)
+
+
+class CaptureSlot:
+    # Holds the capture a reader thread pulls frames from. Replacing or clearing it releases the previous
+    # capture at once, under the same lock as read, so a switch never races a read on a released capture.
+    # Captures opened elsewhere and shared, such as the GUI's camera, are passed with owned=False.
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.cap = None
+        self.owned = False
+        self.opened = 0
+        self.released = 0
+
+    def replace(self, cap, owned=True):
+        with self.lock:
+            self.release()
+            self.cap = cap
+            self.owned = owned
+            if owned:
+                self.opened += 1
+
+    def read(self):
+        with self.lock:
+            if self.cap is None:
+                return False, None
+            return self.cap.read()
+
+    def get(self, prop):
+        with self.lock:
+            return self.cap.get(prop) if self.cap is not None else 0.0
+
+    def is_open(self):
+        return self.cap is not None
+
+    def release(self):
+        with self.lock:
+            if self.cap is not None and self.owned:
+                self.cap.release()
+                self.released += 1
+            self.cap = None
+            self.owned = False
+
+
+class StageStats:
+    def __init__(self, smoothing=0.1, name=None):
+        self.smoothing = smoothing
+        self.name = name
+        self.count = 0
+        self.last = 0.0
+        self.average = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.count += 1
+        self.last = seconds
+        self.max = max(self.max, seconds)
+        if self.count == 1:
+            self.average = seconds
+        else:
+            self.average += self.smoothing * (seconds - self.average)
+        if self.name is not None and METRICS.enabled:
+            METRICS.observe("stage_seconds", seconds, (("stage", self.name),))
+
+    def time(self):
+        return StageTimer(self)
+
+
+class StageTimer:
+    def __init__(self, stats):
+        self.stats = stats
+        self.start_time = 0.0
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stats.record(time.perf_counter() - self.start_time)
+        return False
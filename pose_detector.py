@@ -1,7 +1,42 @@
 import time
 import math
+import argparse
+import tracemalloc
 import cv2
+import numpy as np
 import mediapipe as mp
+from metrics import METRICS
+
+RIGHT_ELBOW, RIGHT_WRIST, LEFT_ELBOW, LEFT_WRIST = 14, 16, 13, 15
+ARM_LANDMARKS = (RIGHT_ELBOW, RIGHT_WRIST, LEFT_ELBOW, LEFT_WRIST)
+DRAW_COLOR = (165, 106, 31)
+DRAW_SPEC = mp.solutions.drawing_utils.DrawingSpec(color=DRAW_COLOR, thickness=2, circle_radius=2)
+
+
+def draw_landmarks(img, pose_landmarks):
+    mp.solutions.drawing_utils.draw_landmarks(img, pose_landmarks, mp.solutions.pose.POSE_CONNECTIONS,
+                                              DRAW_SPEC, DRAW_SPEC)
+
+
+def draw_arm(img, x1, y1, x2, y2, angle_degrees):
+    cv2.circle(img, (x1, y1), 5, DRAW_COLOR, cv2.FILLED)
+    cv2.circle(img, (x1, y1), 10, DRAW_COLOR, 2)
+    cv2.circle(img, (x2, y2), 5, DRAW_COLOR, cv2.FILLED)
+    cv2.circle(img, (x2, y2), 10, DRAW_COLOR, 2)
+    if angle_degrees is not None:
+        cv2.putText(img, str(angle_degrees), (x2 - 50, y2 + 50),
+                    cv2.FONT_HERSHEY_PLAIN, 2, (255, 255, 255), 2)
+
+
+def draw_pose(img, pose_landmarks, right_angle=None, left_angle=None):
+    height, width, _ = img.shape
+    draw_landmarks(img, pose_landmarks)
+    landmarks = pose_landmarks.landmark
+    for (point1, point2), angle_degrees in (((RIGHT_ELBOW, RIGHT_WRIST), right_angle),
+                                            ((LEFT_ELBOW, LEFT_WRIST), left_angle)):
+        draw_arm(img, int(landmarks[point1].x * width), int(landmarks[point1].y * height),
+                 int(landmarks[point2].x * width), int(landmarks[point2].y * height), angle_degrees)
+    return img
 
 
 class PoseDetector:
@@ -11,7 +46,10 @@ class PoseDetector:
                  enable_segmentation: bool = False,
                  smooth_segmentation: bool = True,
                  min_detection_confidence: float = 0.5,
-                 min_tracking_confidence: float = 0.5):
+                 min_tracking_confidence: float = 0.5,
+                 roi: bool = False,
+                 roi_padding: float = 0.3,
+                 roi_target_size: int = 256):
         self.static_image_mode = static_image_mode
         self.model_complexity = model_complexity
         self.smooth_landmarks = smooth_landmarks
@@ -19,6 +57,10 @@ class PoseDetector:
         self.smooth_segmentation = smooth_segmentation
         self.min_detection_confidence = min_detection_confidence
         self.min_tracking_confidence = min_tracking_confidence
+        self.roi = roi
+        self.roi_padding = roi_padding
+        self.roi_target_size = roi_target_size
+        self.roi_box = None
         self.landmarks = []
 
         self.mp_draw = mp.solutions.drawing_utils
@@ -32,32 +74,152 @@ class PoseDetector:
                                       self.min_tracking_confidence)
         self.results = None
         self.landmarks = []
+        self.rgb_buffer = None
+        self.arm_points = np.zeros((len(ARM_LANDMARKS), 3), dtype=np.int32)
+
+    def to_rgb(self, img):
+        if self.rgb_buffer is None or self.rgb_buffer.shape != img.shape:
+            self.rgb_buffer = np.empty_like(img)
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=self.rgb_buffer)
 
     def find_pose(self, img, visibility=0.5, draw=True):
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        self.results = self.pose.process(img_rgb)
+        if self.roi and self.roi_box is not None:
+            self.results = self.process_roi(img, self.roi_box)
+            if not self.results.pose_landmarks:
+                self.set_roi_box(None)
+                self.results = self.process(img)
+        else:
+            self.results = self.process(img)
         self.landmarks = []
 
         if self.results.pose_landmarks:
-            for idx, landmark in enumerate(self.results.pose_landmarks.landmark):
-                if (0 <= landmark.x <= 1) and (0 <= landmark.y <= 1) and (landmark.visibility > visibility):
-                    confident = True
-                else:
-                    confident = False
-
+            with METRICS.time("landmarks"):
                 height, weight, _ = img.shape
-                x, y = int(landmark.x * weight), int(landmark.y * height)
-                self.landmarks.append([idx, x, y, confident])
+                for idx, landmark in enumerate(self.results.pose_landmarks.landmark):
+                    if (0 <= landmark.x <= 1) and (0 <= landmark.y <= 1) and (landmark.visibility > visibility):
+                        confident = True
+                    else:
+                        confident = False
+
+                    x, y = int(landmark.x * weight), int(landmark.y * height)
+                    self.landmarks.append([idx, x, y, confident])
 
             if draw:
-                self.mp_draw.draw_landmarks(img, self.results.pose_landmarks,
-                                            self.mp_pose.POSE_CONNECTIONS,
-                                            self.mp_draw.DrawingSpec(color=(165, 106, 31), thickness=2, circle_radius=2),
-                                            self.mp_draw.DrawingSpec(color=(165, 106, 31), thickness=2, circle_radius=2))
+                draw_landmarks(img, self.results.pose_landmarks)
+
+        if self.roi:
+            self.set_roi_box(self.track_roi(img.shape[1], img.shape[0]))
 
         return img, self.landmarks
 
+    def find_arm_angles(self, img, visibility=0.5):
+        # Fast path for decoding: only the elbows and wrists are read and self.landmarks is left empty.
+        if self.roi:
+            # The roi tracker needs every landmark, so it goes through find_pose.
+            self.find_pose(img, visibility, draw=False)
+            if len(self.landmarks) == 0:
+                return None, None
+            return (self.find_angle(img, RIGHT_ELBOW, RIGHT_WRIST, draw=False)[1],
+                    self.find_angle(img, LEFT_ELBOW, LEFT_WRIST, draw=False)[1])
+
+        self.results = self.process(img)
+        self.landmarks = []
+        if not self.results.pose_landmarks:
+            return None, None
+
+        with METRICS.time("angles"):
+            height, width, _ = img.shape
+            landmarks = self.results.pose_landmarks.landmark
+            points = self.arm_points
+            for i, idx in enumerate(ARM_LANDMARKS):
+                landmark = landmarks[idx]
+                points[i, 0] = int(landmark.x * width)
+                points[i, 1] = int(landmark.y * height)
+                points[i, 2] = (0 <= landmark.x <= 1) and (0 <= landmark.y <= 1) and (landmark.visibility > visibility)
+
+            return self.points_angle(0, 1), self.points_angle(2, 3)
+
+    def process(self, img):
+        with METRICS.time("convert"):
+            img_rgb = self.to_rgb(img)
+        with METRICS.time("pose"):
+            return self.pose.process(img_rgb)
+
+    def warm_up(self, width=640, height=480):
+        # MediaPipe starts its graph and loads the models on the first frame; a blank frame takes that cost
+        # before real frames arrive. Reset drops the empty tracking state it leaves behind.
+        self.process(np.zeros((height, width, 3), dtype=np.uint8))
+        self.reset()
+
+    def reset(self):
+        # Forgets the tracked person so the next frame starts a new source; the graph itself is kept.
+        self.pose.reset()
+        self.results = None
+        self.landmarks = []
+        self.roi_box = None
+
+    def close(self):
+        self.pose.close()
+
+    def points_angle(self, point1, point2):
+        x1, y1, c1 = self.arm_points[point1].tolist()
+        x2, y2, c2 = self.arm_points[point2].tolist()
+        if c1 and c2:
+            return round(math.degrees(math.atan2(y2 - y1, x2 - x1)), 1)
+        return None
+
+    def set_roi_box(self, box):
+        # The tracker keeps landmarks in input coordinates, so it must restart when the crop moves.
+        if box != self.roi_box and not self.static_image_mode:
+            self.pose.reset()
+        self.roi_box = box
+
+    def process_roi(self, img, box):
+        x0, y0, x1, y1 = box
+        crop = img[y0:y1, x0:x1]
+        scale = self.roi_target_size / max(crop.shape[:2])
+        if scale < 1:
+            crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        with METRICS.time("convert"):
+            crop = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        with METRICS.time("pose"):
+            results = self.pose.process(crop)
+
+        if results.pose_landmarks:
+            height, width, _ = img.shape
+            for landmark in results.pose_landmarks.landmark:
+                landmark.x = (x0 + landmark.x * (x1 - x0)) / width
+                landmark.y = (y0 + landmark.y * (y1 - y0)) / height
+        return results
+
+    def track_roi(self, width, height):
+        points = [(min(max(x, 0), width), min(max(y, 0), height)) for _, x, y, _ in self.landmarks]
+        if len(points) < 2:
+            return None
+
+        xs, ys = [x for x, _ in points], [y for _, y in points]
+        left, top, right, bottom = min(xs), min(ys), max(xs), max(ys)
+        # Keep the crop while the person stays inside it so the tracker sees a stable input.
+        if self.roi_box is not None:
+            x0, y0, x1, y1 = self.roi_box
+            margin = self.roi_padding * max(x1 - x0, y1 - y0) / 4
+            inside = x0 + margin <= left and y0 + margin <= top and right <= x1 - margin and bottom <= y1 - margin
+            if inside and 2 * max(right - left, bottom - top) >= max(x1 - x0, y1 - y0):
+                return self.roi_box
+
+        size = max(right - left, bottom - top) * (1 + 2 * self.roi_padding)
+        center_x, center_y = (left + right) / 2, (top + bottom) / 2
+        x0, y0 = max(0, int(center_x - size / 2)), max(0, int(center_y - size / 2))
+        x1, y1 = min(width, int(center_x + size / 2)), min(height, int(center_y + size / 2))
+        if x1 - x0 < 16 or y1 - y0 < 16:
+            return None
+        return x0, y0, x1, y1
+
     def find_angle(self, img, point1, point2, draw=True):
+        with METRICS.time("angles"):
+            return self.measure_angle(img, point1, point2, draw)
+
+    def measure_angle(self, img, point1, point2, draw):
         x1, y1, c1 = self.landmarks[point1][1:]
         x2, y2, c2 = self.landmarks[point2][1:]
         angle_degrees = None
@@ -67,24 +229,183 @@ class PoseDetector:
             angle_degrees = round(math.degrees(angle_radians), 1)
 
         if draw:
-            cv2.circle(img, (x1, y1), 5, (165, 106, 31), cv2.FILLED)
-            cv2.circle(img, (x1, y1), 10, (165, 106, 31), 2)
-            cv2.circle(img, (x2, y2), 5, (165, 106, 31), cv2.FILLED)
-            cv2.circle(img, (x2, y2), 10, (165, 106, 31), 2)
-            if c1 and c2:
-                cv2.putText(img, str(angle_degrees), (x2 - 50, y2 + 50),
-                            cv2.FONT_HERSHEY_PLAIN, 2, (255, 255, 255), 2)
+            draw_arm(img, x1, y1, x2, y2, angle_degrees)
 
         return img, angle_degrees
 
 
-def main():
-    cap = cv2.VideoCapture('videos/semaphore_en.mp4')
+def landmark_angle(landmarks, point1, point2, width, height, visibility=0.5):
+    x1, y1 = int(landmarks[point1].x * width), int(landmarks[point1].y * height)
+    x2, y2 = int(landmarks[point2].x * width), int(landmarks[point2].y * height)
+    for landmark in (landmarks[point1], landmarks[point2]):
+        if not ((0 <= landmark.x <= 1) and (0 <= landmark.y <= 1) and (landmark.visibility > visibility)):
+            return None
+    return round(math.degrees(math.atan2(y2 - y1, x2 - x1)), 1)
+
+
+def landmark_box(landmarks, width, height):
+    xs = [min(max(landmark.x, 0.0), 1.0) * width for landmark in landmarks]
+    ys = [min(max(landmark.y, 0.0), 1.0) * height for landmark in landmarks]
+    return int(min(xs)), int(min(ys)), int(max(xs)), int(max(ys))
+
+
+class MultiPoseDetector:
+    # The single-person Pose solution follows whichever body it found first, so several signallers need the
+    # PoseLandmarker task. One pass of its person detector finds up to num_poses people, then the landmark
+    # model runs on a crop around each of them. In video mode the crops follow each person from the previous
+    # frame, and the detector only runs again while fewer than num_poses people are tracked.
+    def __init__(self, model_path, num_poses=4, min_detection_confidence=0.5, min_presence_confidence=0.5,
+                 min_tracking_confidence=0.5):
+        self.model_path = model_path
+        self.num_poses = num_poses
+        self.min_detection_confidence = min_detection_confidence
+        self.min_presence_confidence = min_presence_confidence
+        self.min_tracking_confidence = min_tracking_confidence
+        self.landmarker = self.create_landmarker()
+        self.results = None
+        self.last_timestamp = -1
+        self.rgb_buffer = None
+
+    def create_landmarker(self):
+        vision = mp.tasks.vision
+        options = vision.PoseLandmarkerOptions(
+            base_options=mp.tasks.BaseOptions(model_asset_path=self.model_path),
+            running_mode=vision.RunningMode.VIDEO,
+            num_poses=self.num_poses,
+            min_pose_detection_confidence=self.min_detection_confidence,
+            min_pose_presence_confidence=self.min_presence_confidence,
+            min_tracking_confidence=self.min_tracking_confidence)
+        return vision.PoseLandmarker.create_from_options(options)
+
+    def process(self, img, timestamp_ms):
+        with METRICS.time("convert"):
+            if self.rgb_buffer is None or self.rgb_buffer.shape != img.shape:
+                self.rgb_buffer = np.empty_like(img)
+            cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=self.rgb_buffer)
+            image = mp.Image(image_format=mp.ImageFormat.SRGB, data=self.rgb_buffer)
+        # The task rejects timestamps that do not increase, which live sources can produce.
+        timestamp_ms = max(int(timestamp_ms), self.last_timestamp + 1)
+        self.last_timestamp = timestamp_ms
+        with METRICS.time("pose"):
+            return self.landmarker.detect_for_video(image, timestamp_ms)
+
+    def find_people(self, img, timestamp_ms, visibility=0.5):
+        # Returns a (box, right_angle, left_angle) tuple for every person found, boxes in pixels.
+        self.results = self.process(img, timestamp_ms)
+        people = []
+        with METRICS.time("angles"):
+            height, width, _ = img.shape
+            for landmarks in self.results.pose_landmarks:
+                people.append((landmark_box(landmarks, width, height),
+                               landmark_angle(landmarks, RIGHT_ELBOW, RIGHT_WRIST, width, height, visibility),
+                               landmark_angle(landmarks, LEFT_ELBOW, LEFT_WRIST, width, height, visibility)))
+        return people
+
+    def reset(self):
+        # The task has no reset of its own, so the graph is rebuilt to forget the people it was tracking.
+        self.landmarker.close()
+        self.landmarker = self.create_landmarker()
+        self.results = None
+        self.last_timestamp = -1
+
+    def close(self):
+        self.landmarker.close()
+
+
+def slow_arm_angles(detector, img):
+    detector.find_pose(img, draw=False)
+    if len(detector.landmarks) == 0:
+        return None, None
+    _, right_angle = detector.find_angle(img, RIGHT_ELBOW, RIGHT_WRIST, draw=False)
+    _, left_angle = detector.find_angle(img, LEFT_ELBOW, LEFT_WRIST, draw=False)
+    return right_angle, left_angle
+
+
+def measure_latency(video_file, frames=300, fast=False, **kwargs):
+    cap = cv2.VideoCapture(video_file)
+    detector = PoseDetector(**kwargs)
+    latencies = []
+
+    while len(latencies) < frames:
+        success, img = cap.read()
+        if not success:
+            break
+        start_time = time.perf_counter()
+        if fast:
+            detector.find_arm_angles(img)
+        else:
+            detector.find_pose(img, draw=False)
+        latencies.append(time.perf_counter() - start_time)
+
+    cap.release()
+    return sum(latencies) / len(latencies) if latencies else 0.0
+
+
+def measure_allocations(video_file, frames=300, fast=False):
+    cap = cv2.VideoCapture(video_file)
     detector = PoseDetector()
-    start_time = 0
+    images = []
+    while len(images) < frames:
+        success, img = cap.read()
+        if not success:
+            break
+        images.append(img)
+    cap.release()
+
+    find_angles = detector.find_arm_angles if fast else lambda img: slow_arm_angles(detector, img)
+    find_angles(images[0])
+    allocated = 0
+    tracemalloc.start()
+    for img in images[1:]:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        find_angles(img)
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return allocated / max(len(images) - 1, 1)
+
+
+def compare_roi(video_file, frames=300):
+    full_latency = measure_latency(video_file, frames)
+    roi_latency = measure_latency(video_file, frames, roi=True)
+    print(f"full frame: {full_latency * 1000:.2f} ms/frame")
+    print(f"roi:        {roi_latency * 1000:.2f} ms/frame")
+    if full_latency > 0:
+        print(f"reduction:  {(1 - roi_latency / full_latency) * 100:.1f}%")
+
+
+def compare_fast(video_file, frames=300):
+    for name, fast in (("find_pose + find_angle", False), ("find_arm_angles", True)):
+        latency = measure_latency(video_file, frames, fast=fast)
+        allocated = measure_allocations(video_file, frames, fast=fast)
+        print(f"{name:24} {latency * 1000:8.2f} ms/frame {allocated / 1024:10.1f} KiB peak allocated/frame")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show pose landmarks detected in a video.")
+    parser.add_argument("video", nargs="?", default='videos/semaphore_en.mp4')
+    parser.add_argument("--roi", action="store_true", help="run detection on a crop around the tracked person")
+    parser.add_argument("--compare-roi", type=int, metavar="FRAMES", default=0,
+                        help="report per-frame latency with and without the roi crop over FRAMES frames")
+    parser.add_argument("--compare-fast", type=int, metavar="FRAMES", default=0,
+                        help="report latency and allocations of find_arm_angles against find_pose over FRAMES frames")
+    args = parser.parse_args()
+
+    if args.compare_roi:
+        compare_roi(args.video, args.compare_roi)
+        return
+    if args.compare_fast:
+        compare_fast(args.video, args.compare_fast)
+        return
+
+    cap = cv2.VideoCapture(args.video)
+    detector = PoseDetector(roi=args.roi)
+    start_time = time.time()
 
     while True:
         success, img = cap.read()
+        if not success:
+            break
         img, landmarks = detector.find_pose(img)
 
         stop_time = time.time()
@@ -97,6 +418,8 @@ def main():
         cv2.imshow("Image", img)
         cv2.waitKey(1)
 
+    cap.release()
+
 
 if __name__ == "__main__":
     main()
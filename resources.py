@@ -0,0 +1,177 @@
+import os
+import time
+import inspect
+import argparse
+import threading
+import tracemalloc
+from contextlib import contextmanager
+import cv2
+import pose_detector as pd
+from metrics import METRICS
+from pipeline import CaptureSlot
+
+DETECTOR_DEFAULTS = {name: parameter.default for name, parameter in
+                     inspect.signature(pd.PoseDetector.__init__).parameters.items() if name != "self"}
+
+
+def detector_key(**options):
+    return tuple((name, options.get(name, default)) for name, default in DETECTOR_DEFAULTS.items())
+
+
+class DetectorPool:
+    # Building a Pose graph loads its models and costs hundreds of milliseconds and several MiB, so released
+    # detectors are kept per configuration and handed out again with their tracking state reset.
+    def __init__(self, max_idle=4):
+        self.max_idle = max_idle
+        self.lock = threading.Lock()
+        self.idle = {}
+        self.created = 0
+        self.reused = 0
+        self.closed = 0
+        self.in_use = 0
+
+    def acquire(self, **options):
+        key = detector_key(**options)
+        with self.lock:
+            detectors = self.idle.get(key)
+            detector = detectors.pop() if detectors else None
+            self.in_use += 1
+            if detector is not None:
+                self.reused += 1
+        if detector is None:
+            try:
+                detector = pd.PoseDetector(**dict(key))
+            except BaseException:
+                with self.lock:
+                    self.in_use -= 1
+                raise
+            with self.lock:
+                self.created += 1
+        return detector
+
+    def release(self, detector):
+        key = tuple((name, getattr(detector, name)) for name in DETECTOR_DEFAULTS)
+        detector.reset()
+        with self.lock:
+            self.in_use -= 1
+            detectors = self.idle.setdefault(key, [])
+            if len(detectors) < self.max_idle:
+                detectors.append(detector)
+                return
+            self.closed += 1
+        detector.close()
+
+    @contextmanager
+    def detector(self, **options):
+        detector = self.acquire(**options)
+        try:
+            yield detector
+        finally:
+            self.release(detector)
+
+    def clear(self):
+        with self.lock:
+            detectors = [detector for detectors in self.idle.values() for detector in detectors]
+            self.idle.clear()
+            self.closed += len(detectors)
+        for detector in detectors:
+            detector.close()
+
+    def stats(self):
+        with self.lock:
+            return {"created": self.created, "reused": self.reused, "closed": self.closed, "in_use": self.in_use,
+                    "idle": sum(map(len, self.idle.values()))}
+
+
+POOL = DetectorPool()
+METRICS.gauge("detectors", lambda: POOL.in_use, (("state", "in_use"),))
+METRICS.gauge("detectors", lambda: sum(map(len, POOL.idle.values())), (("state", "idle"),))
+
+
+def resident_memory():
+    # Current resident set size in bytes where /proc is available, otherwise the peak from getrusage.
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def switch_sources(video_file, switches=1000, frames=3, pool=True, report_every=100, **options):
+    # Mirrors what the GUI does when an operator opens another video: a new capture replaces the old one
+    # and the detector starts over on the new source.
+    detector_pool = DetectorPool() if pool else None
+    slot = CaptureSlot()
+    detector = detector_pool.acquire(**options) if pool else None
+    tracemalloc.start()
+    samples = []
+    start_time = time.perf_counter()
+    try:
+        for switch in range(1, switches + 1):
+            slot.replace(cv2.VideoCapture(video_file))
+            if pool:
+                detector_pool.release(detector)
+                detector = detector_pool.acquire(**options)
+            else:
+                if detector is not None:
+                    detector.close()
+                detector = pd.PoseDetector(**options)
+            for _ in range(frames):
+                success, img = slot.read()
+                if not success:
+                    break
+                detector.find_arm_angles(img)
+
+            if switch % report_every == 0 or switch == switches:
+                sample = {
+                    "switches": switch,
+                    "rss_mib": round(resident_memory() / 2 ** 20, 1),
+                    "python_mib": round(tracemalloc.get_traced_memory()[0] / 2 ** 20, 2),
+                    "seconds": round(time.perf_counter() - start_time, 1),
+                }
+                samples.append(sample)
+                print(f"{sample['switches']:6d} switches  rss {sample['rss_mib']:8.1f} MiB  "
+                      f"python {sample['python_mib']:6.2f} MiB  {sample['seconds']:7.1f} s", flush=True)
+    finally:
+        tracemalloc.stop()
+        slot.release()
+        if pool:
+            detector_pool.release(detector)
+            print(f"pool: {detector_pool.stats()}, captures opened {slot.opened}, released {slot.released}")
+            detector_pool.clear()
+        elif detector is not None:
+            detector.close()
+    return samples
+
+
+def steady_state_growth(samples):
+    # Growth over the second half of the run, after caches and allocator arenas have settled.
+    if len(samples) < 2:
+        return 0.0
+    middle = samples[len(samples) // 2]
+    return samples[-1]["rss_mib"] - middle["rss_mib"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report memory use over many source switches.")
+    parser.add_argument("video", help="video file opened on every switch")
+    parser.add_argument("--switches", type=int, default=1000)
+    parser.add_argument("--frames", type=int, default=3, help="frames decoded after each switch")
+    parser.add_argument("--report-every", type=int, default=100)
+    parser.add_argument("--no-pool", action="store_true", help="build a new detector on every switch instead")
+    parser.add_argument("--model-complexity", type=int, choices=[0, 1, 2], default=1)
+    args = parser.parse_args()
+
+    samples = switch_sources(args.video, args.switches, args.frames, not args.no_pool, args.report_every,
+                             model_complexity=args.model_complexity)
+    print(f"steady-state growth over the last {args.switches - samples[len(samples) // 2]['switches']} switches: "
+          f"{steady_state_growth(samples):+.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,117 +1,75 @@
-import cv2
 import time
-import pose_detector as pd
+import bisect
+import numpy as np
+import alphabet as ab
+from alphabet import SECTOR_ANGLES, NO_SECTOR
 
 
 class SemaphoreDecoder:
-    def __init__(self, angle_gap=22.5):
+    def __init__(self, angle_gap=22.5, alphabets=None):
         self.angle_gap = angle_gap
-        self.angle_ranges = {
-            0: (-self.angle_gap, self.angle_gap),
-            -45: (-45 - self.angle_gap, -45 + self.angle_gap),
-            -90: (-90 - self.angle_gap, -90 + self.angle_gap),
-            -135: (-135 - self.angle_gap, -135 + self.angle_gap),
-            -180: (-180, -180 + self.angle_gap),
-            45: (45 - self.angle_gap, 45 + self.angle_gap),
-            90: (90 - self.angle_gap, 90 + self.angle_gap),
-            135: (135 - self.angle_gap, 135 + self.angle_gap),
-            180: (180 - self.angle_gap, 180),
-        }
-        self.english_alphabet = {
-            (135, 90): 'A',
-            (180, 90): 'B',
-            (-135, 90): 'C',
-            (-90, 90): 'D',
-            (90, -45): 'E',
-            (90, 0): 'F',
-            (90, 45): 'G',
-            (180, 135): 'H',
-            (-135, 135): 'I',
-            (-90, 0): 'J',
-            (135, -90): 'K',
-            (135, -45): 'L',
-            (135, 0): 'M',
-            (135, 45): 'N',
-            (-135, 180): 'O',
-            (180, -90): 'P',
-            (180, -45): 'Q',
-            (180, 0): 'R',
-            (180, 45): 'S',
-            (-135, -90): 'T',
-            (-135, -45): 'U',
-            (-90, 45): 'V',
-            (0, -45): 'W',
-            (45, -45): 'X',
-            (-135, 0): 'Y',
-            (45, 0): 'Z',
-            (90, -90): 'SPACE',
-            (-45, -135): 'STOP'
-        }
-        self.ukrainian_alphabet = {
-            (135, 45): 'А',
-            (180, 135): 'Б',
-            (180, 90): 'В',
-            (90, 0): 'Г/Ґ',
-            (45, 0): 'Д',
-            (-135, 90): 'E/Є',
-            (-135, 0): 'Ж',
-            (180, -45): 'З',
-            (135, -90): 'И',
-            (-90, 90): 'І/Ї/Й',
-            (45, -45): 'К',
-            (-135, 45): 'Л',
-            (135, -45): 'М',
-            (135, 90): 'Н',
-            (90, 45): 'О',
-            (-90, 0): 'П',
-            (180, -90): 'Р',
-            (90, -45): 'С',
-            (180, 0): 'Т',
-            (-135, -45): 'У',
-            (-90, 45): 'Ф',
-            (-135, 135): 'Х',
-            (180, 45): 'Ц',
-            (135, 0): 'Ч',
-            (-90, -45): 'Ш',
-            (-135, -90): 'Щ',
-            (-90, -90): 'Ь',
-            (-135, 180): 'Ю',
-            (0, -45): 'Я',
-            (90, -90): 'ПРОБІЛ',
-            (-45, -135): 'КІНЕЦЬ'
-        }
+        self.alphabets = alphabets if alphabets is not None else ab.ALPHABETS
+        self.bounds, self.sectors = ab.sector_bounds(angle_gap)
 
     def match_angle(self, angle):
-        for matching_angle, (lower_bound, upper_bound) in self.angle_ranges.items():
-            if lower_bound < angle <= upper_bound:
-                if matching_angle == -180:
-                    matching_angle = 180
-                return matching_angle
+        sector = self.sectors[bisect.bisect_left(self.bounds, angle)]
+        if sector != NO_SECTOR:
+            return SECTOR_ANGLES[sector]
 
     def find_letter(self, right_angle, left_angle, language="en"):
         if left_angle is None or right_angle is None:
             return None
-        letter_right_angle = self.match_angle(right_angle)
-        letter_left_angle = self.match_angle(left_angle)
+        alphabet = self.alphabets.get(language)
+        if alphabet is None:
+            return None
+
+        right_sector = self.sectors[bisect.bisect_left(self.bounds, right_angle)]
+        left_sector = self.sectors[bisect.bisect_left(self.bounds, left_angle)]
+        return alphabet.table[right_sector * (NO_SECTOR + 1) + left_sector]
+
+    def angle_sector(self, angle):
+        if angle is None:
+            return NO_SECTOR
+        return self.sectors[bisect.bisect_left(self.bounds, angle)]
+
+    def letter_at(self, right_sector, left_sector, language="en"):
+        alphabet = self.alphabets.get(language)
+        if alphabet is None:
+            return None
+        return alphabet.letter_at(right_sector, left_sector)
 
-        if language == "en":
-            letter = self.english_alphabet.get((letter_right_angle, letter_left_angle))
-        elif language == "uk":
-            letter = self.ukrainian_alphabet.get((letter_right_angle, letter_left_angle))
-        else:
-            letter = None
+    def match_angles(self, angles):
+        return ab.angle_sectors(angles, self.angle_gap)
 
-        return letter
+    def letter_table(self, language="en"):
+        alphabet = self.alphabets.get(language)
+        if alphabet is None:
+            return np.full((NO_SECTOR + 1, NO_SECTOR + 1), -1, dtype=np.int16), ()
+        return alphabet.codes.reshape(NO_SECTOR + 1, NO_SECTOR + 1), alphabet.names
+
+    def find_letters(self, right_angles, left_angles, language="en"):
+        table, _ = self.letter_table(language)
+        return table[self.match_angles(right_angles), self.match_angles(left_angles)]
+
+    def letters_from_codes(self, codes, language="en"):
+        _, letters = self.letter_table(language)
+        return [letters[code] if code >= 0 else None for code in codes]
 
 
 def main():
+    # The demo needs OpenCV and MediaPipe; importing them here keeps the decoder itself light to load.
+    import cv2
+    import pose_detector as pd
+
     cap = cv2.VideoCapture('videos/semaphore_en.mp4')
     detector = pd.PoseDetector()
     decoder = SemaphoreDecoder()
-    start_time = 0
+    start_time = time.time()
 
     while True:
         success, img = cap.read()
+        if not success:
+            break
         img, landmarks = detector.find_pose(img)
         if len(landmarks) != 0:
             img, right_angle = detector.find_angle(img, 14, 16)
@@ -143,6 +101,8 @@ def main():
             cv2.imshow("Image", img)
             cv2.waitKey(1)
 
+    cap.release()
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,324 @@
+import os
+import json
+import time
+import bisect
+import struct
+import logging
+import argparse
+import itertools
+import threading
+from collections import deque
+import numpy as np
+import semaphore_decoder as sd
+from alphabet import ALPHABETS
+from stabiliser import LetterStabiliser, COMMITTED, SPACE, STOP
+
+MAGIC = b"SEMLOG\x00\x01"
+BLOCK = struct.Struct("<cI")
+FRAMES, EVENT, SETTINGS, RESET, INDEX = b"F", b"E", b"S", b"R", b"I"
+FRAMES_HEADER = struct.Struct("<IdH")
+EVENT_HEADER = struct.Struct("<Id")
+INDEX_HEADER = struct.Struct("<IdQ")
+# Milliseconds since the previous frame and both arm sectors, right in the high nibble: 3 bytes a frame.
+FRAME_DTYPE = np.dtype([("delta", "<u2"), ("sectors", "u1")])
+MAX_DELTA = np.iinfo(np.uint16).max
+COMMIT_EVENTS = (COMMITTED, SPACE, STOP)
+
+logger = logging.getLogger("semaphore.session_log")
+
+
+class SessionLogWriter:
+    # The decode loop only appends to a deque; a background thread encodes the records into blocks and
+    # writes them in batches. Index blocks carry the stabiliser state, so a reader can start from any of them.
+    def __init__(self, path, language="en", buffer_size=10, output_threshold=5, stable_duration=2.0,
+                 angle_gap=22.5, checkpoint_frames=900, flush_interval=1.0, **header):
+        self.path = path
+        self.checkpoint_frames = checkpoint_frames
+        self.flush_interval = flush_interval
+        self.settings_state = {"language": language, "buffer_size": buffer_size,
+                               "output_threshold": output_threshold, "stable_duration": stable_duration}
+        self.header = {"version": 1, "start_time": time.time(), "angle_gap": angle_gap, **self.settings_state,
+                       **header}
+        self.pending = deque()
+        self.frames = 0
+        self.written_frames = 0
+        self.last_index = 0
+        self.error = None
+        self.closed = False
+        self.wake_event = threading.Event()
+
+        self.file = open(path, "xb")
+        header_bytes = json.dumps(self.header).encode("utf-8")
+        self.file.write(MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+        self.file.flush()
+        self.thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.thread.start()
+
+    def frame(self, timestamp, right_sector, left_sector, stabiliser=None):
+        # Returns the frame's time as a replay will see it; the caller decodes with it so a replay makes the
+        # same decisions, even for a letter held exactly stable_duration.
+        timestamp = log_time(self.header["start_time"], round((timestamp - self.header["start_time"]) * 1000))
+        if stabiliser is not None and self.frames % self.checkpoint_frames == 0:
+            self.pending.append((INDEX, timestamp, stabiliser.snapshot()))
+        self.pending.append((FRAMES, timestamp, right_sector << 4 | left_sector))
+        self.frames += 1
+        if len(self.pending) >= 4096:
+            self.wake_event.set()
+        return timestamp
+
+    def event(self, event, timestamp, letter):
+        self.pending.append((EVENT, timestamp, {"type": event, "letter": letter}))
+
+    def settings(self, **settings):
+        self.pending.append((SETTINGS, None, settings))
+
+    def reset(self, timestamp=None):
+        self.pending.append((RESET, time.time() if timestamp is None else timestamp, None))
+
+    def write_loop(self):
+        while not self.closed:
+            self.wake_event.wait(self.flush_interval)
+            self.wake_event.clear()
+            self.write_pending()
+
+    def write_pending(self):
+        if self.error is not None:
+            self.pending.clear()
+            return
+        data = bytearray()
+        frames = []
+        while self.pending:
+            kind, timestamp, value = self.pending.popleft()
+            if kind == FRAMES:
+                frames.append((timestamp, value))
+                continue
+            self.encode_frames(data, frames)
+            frames = []
+            if kind == INDEX:
+                offset = self.file.tell() + len(data)
+                payload = INDEX_HEADER.pack(self.written_frames, timestamp, self.last_index) + json.dumps(
+                    {"settings": self.settings_state, "stabiliser": value}).encode("utf-8")
+                self.last_index = offset
+            elif kind == SETTINGS:
+                self.settings_state = {**self.settings_state, **value}
+                payload = struct.pack("<I", self.written_frames) + json.dumps(value).encode("utf-8")
+            elif kind == EVENT:
+                # Events follow the frame that produced them.
+                payload = EVENT_HEADER.pack(self.written_frames - 1, timestamp) + json.dumps(value).encode("utf-8")
+            else:
+                payload = EVENT_HEADER.pack(self.written_frames, timestamp)
+            data += BLOCK.pack(kind, len(payload)) + payload
+        self.encode_frames(data, frames)
+
+        if data:
+            try:
+                self.file.write(data)
+                self.file.flush()
+            except OSError as error:
+                self.error = error
+                logger.error("Session log %s stopped: %s", self.path, error)
+
+    def encode_frames(self, data, frames):
+        # Times are stored to the millisecond from the block's first frame; a gap too long for the delta
+        # or a clock going backwards starts a new block.
+        start = 0
+        while start < len(frames):
+            base_time = frames[start][0]
+            records = [(0, frames[start][1])]
+            elapsed = 0
+            for timestamp, sectors in frames[start + 1:start + MAX_DELTA]:
+                delta = round((timestamp - base_time) * 1000) - elapsed
+                if not 0 <= delta <= MAX_DELTA:
+                    break
+                elapsed += delta
+                records.append((delta, sectors))
+            payload = FRAMES_HEADER.pack(self.written_frames, base_time, len(records)) + np.array(
+                records, dtype=FRAME_DTYPE).tobytes()
+            data += BLOCK.pack(FRAMES, len(payload)) + payload
+            self.written_frames += len(records)
+            start += len(records)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.wake_event.set()
+        self.thread.join()
+        self.write_pending()
+        self.file.close()
+
+
+def log_time(origin, milliseconds):
+    # Frame times are whole milliseconds from the session start, computed the same way when written and replayed.
+    return origin + milliseconds / 1000
+
+
+def open_session_log(directory, *args, **kwargs):
+    # Sessions started within the same second are numbered; the exclusive open makes the name check atomic.
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    for number in itertools.count(1):
+        name = f"session-{stamp}.semlog" if number == 1 else f"session-{stamp}-{number}.semlog"
+        try:
+            return SessionLogWriter(os.path.join(directory, name), *args, **kwargs)
+        except FileExistsError:
+            pass
+
+
+class SessionLog:
+    def __init__(self, path):
+        self.path = path
+        self.blocks = []
+        self.index = []
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a session log")
+            header_length, = struct.unpack("<I", f.read(4))
+            self.header = json.loads(f.read(header_length))
+            self.scan(f, os.fstat(f.fileno()).st_size)
+
+    def scan(self, f, size):
+        # Only block headers and index blocks are read; a block cut short by a crash ends the log.
+        while True:
+            offset = f.tell()
+            header = f.read(BLOCK.size)
+            if len(header) < BLOCK.size:
+                break
+            kind, length = BLOCK.unpack(header)
+            if kind == INDEX:
+                payload = f.read(length)
+                if len(payload) < length:
+                    break
+                frame_index, timestamp, _ = INDEX_HEADER.unpack_from(payload)
+                self.index.append((timestamp, frame_index, len(self.blocks),
+                                   json.loads(payload[INDEX_HEADER.size:])))
+            elif f.seek(length, 1) > size:
+                break
+            self.blocks.append((kind, offset + BLOCK.size, length))
+
+    def read_blocks(self, start=0):
+        with open(self.path, "rb") as f:
+            for kind, offset, length in self.blocks[start:]:
+                f.seek(offset)
+                yield kind, f.read(length)
+
+    def decode_frames(self, payload):
+        first_frame, base_time, count = FRAMES_HEADER.unpack_from(payload)
+        records = np.frombuffer(payload, FRAME_DTYPE, count, FRAMES_HEADER.size)
+        origin = self.header["start_time"]
+        milliseconds = round((base_time - origin) * 1000) + np.cumsum(records["delta"], dtype=np.int64)
+        return first_frame, log_time(origin, milliseconds), records["sectors"]
+
+    def events(self):
+        for kind, payload in self.read_blocks():
+            if kind == EVENT:
+                frame_index, timestamp = EVENT_HEADER.unpack_from(payload)
+                yield {**json.loads(payload[EVENT_HEADER.size:]), "frame": frame_index, "time": timestamp}
+
+    def frame_count(self):
+        count = 0
+        for kind, payload in self.read_blocks():
+            if kind == FRAMES:
+                count += FRAMES_HEADER.unpack_from(payload)[2]
+        return count
+
+    def start(self, timestamp=None):
+        # The stabiliser as it was at the last index block before timestamp, and the block to go on from.
+        settings = {key: self.header[key] for key in ("language", "buffer_size", "output_threshold",
+                                                      "stable_duration")}
+        position = 0
+        state = None
+        if timestamp is not None and self.index:
+            i = bisect.bisect_right([entry[0] for entry in self.index], timestamp) - 1
+            if i >= 0:
+                _, _, position, checkpoint = self.index[i]
+                settings, state = checkpoint["settings"], checkpoint["stabiliser"]
+        stabiliser = LetterStabiliser(settings["buffer_size"], settings["output_threshold"],
+                                      settings["stable_duration"], ALPHABETS.get(settings["language"]))
+        if state is not None:
+            stabiliser.restore(state)
+        return position, settings, stabiliser
+
+    def replay(self, start_time=None, end_time=None):
+        position, settings, stabiliser = self.start(start_time)
+        return self.run(position, settings, stabiliser, start_time, end_time)
+
+    def seek(self, timestamp):
+        position, settings, stabiliser = self.start(timestamp)
+        for _ in self.run(position, settings, stabiliser, timestamp, timestamp):
+            pass
+        return stabiliser
+
+    def run(self, position, settings, stabiliser, start_time=None, end_time=None):
+        # Feeds the logged sectors through the decoder's letter tables and the stabiliser, as the live
+        # decoder did, and yields the letters committed between start_time and end_time.
+        decoder = sd.SemaphoreDecoder(angle_gap=self.header["angle_gap"])
+        language = settings["language"]
+        for kind, payload in self.read_blocks(position):
+            if kind == FRAMES:
+                first_frame, times, sectors = self.decode_frames(payload)
+                for i, (timestamp, sector) in enumerate(zip(times.tolist(), sectors.tolist())):
+                    if end_time is not None and timestamp > end_time:
+                        return
+                    letter = decoder.letter_at(sector >> 4, sector & 15, language)
+                    event = stabiliser.update(letter, timestamp, first_frame + i)
+                    if event in COMMIT_EVENTS and (start_time is None or timestamp >= start_time):
+                        yield {"type": event, "letter": stabiliser.stable_letter, "text": stabiliser.text,
+                               "frame": first_frame + i, "time": timestamp}
+            elif kind == SETTINGS:
+                changes = json.loads(payload[4:])
+                language = changes.get("language", language)
+                stabiliser.alphabet = ALPHABETS.get(language)
+                if "stable_duration" in changes:
+                    stabiliser.stable_duration = changes["stable_duration"]
+            elif kind == RESET:
+                stabiliser.reset()
+
+
+def summary(log):
+    events = list(log.events())
+    frames = log.frame_count()
+    size = sum(BLOCK.size + length for _, _, length in log.blocks)
+    end_time = events[-1]["time"] if events else log.header["start_time"]
+    print(f"{log.path}: {frames} frames, {len(events)} events, {len(log.index)} index blocks, "
+          f"{size / max(frames, 1):.2f} bytes/frame")
+    print(f"  language {log.header['language']}, angle gap {log.header['angle_gap']}, "
+          f"last event at {end_time - log.header['start_time']:.1f} s")
+    text = "".join(" " if event["type"] == SPACE else event["letter"] for event in events
+                   if event["type"] != STOP)
+    print(f"  committed letters: {text!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect, replay or seek a decoded session log.")
+    parser.add_argument("log", help="session log written by the GUI's --session-log")
+    parser.add_argument("--replay", action="store_true", help="print the replayed letters as JSON lines")
+    parser.add_argument("--start", type=float, default=None, help="replay from this many seconds into the session")
+    parser.add_argument("--end", type=float, default=None, help="replay up to this many seconds into the session")
+    parser.add_argument("--seek", type=float, default=None, metavar="SECONDS",
+                        help="print the decoded text as it stood this many seconds into the session")
+    parser.add_argument("--verify", action="store_true", help="check the replay against the logged letters")
+    args = parser.parse_args()
+
+    log = SessionLog(args.log)
+    origin = log.header["start_time"]
+    if args.seek is not None:
+        stabiliser = log.seek(origin + args.seek)
+        print(json.dumps({"time": args.seek, "text": stabiliser.text, "letter": stabiliser.output_letter},
+                         ensure_ascii=False))
+    elif args.replay:
+        start = None if args.start is None else origin + args.start
+        end = None if args.end is None else origin + args.end
+        for event in log.replay(start, end):
+            event["time"] = round(event["time"] - origin, 3)
+            print(json.dumps(event, ensure_ascii=False))
+    elif args.verify:
+        replayed = [(event["type"], event["letter"], event["frame"]) for event in log.replay()]
+        logged = [(event["type"], event["letter"], event["frame"]) for event in log.events()]
+        matching = sum(a == b for a, b in zip(replayed, logged))
+        print(f"{matching} of {len(logged)} logged letters reproduced, {len(replayed)} replayed")
+    else:
+        summary(log)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import math
+import numpy as np
+from alphabet import SECTOR_ANGLES, NO_SECTOR
+
+
+def wrap_angle(angle):
+    angle = (angle + 180) % 360 - 180
+    return 180.0 if angle == -180 else angle
+
+
+def smoothing_factor(cutoff, dt):
+    r = 2 * math.pi * cutoff * dt
+    return r / (r + 1)
+
+
+class AngleFilter:
+    # One-Euro filter on the circle: it filters the wrapped difference to the last estimate, so an arm moving
+    # through +-180 degrees is not dragged the long way round.
+    def __init__(self, min_cutoff=1.0, beta=0.02, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.angle = None
+        self.speed = 0.0
+        self.timestamp = None
+
+    def update(self, angle, timestamp):
+        if angle is None:
+            self.reset()
+            return None
+        if self.angle is None or timestamp <= self.timestamp:
+            self.angle, self.timestamp = angle, timestamp
+            return angle
+
+        dt = timestamp - self.timestamp
+        delta = wrap_angle(angle - self.angle)
+        self.speed += smoothing_factor(self.d_cutoff, dt) * (delta / dt - self.speed)
+        cutoff = self.min_cutoff + self.beta * abs(self.speed)
+        self.angle = wrap_angle(self.angle + smoothing_factor(cutoff, dt) * delta)
+        self.timestamp = timestamp
+        return self.angle
+
+
+class SectorHysteresis:
+    # Holds the current sector until the angle is more than margin degrees past its range, and reports
+    # the sector's centre while held so find_letter sees a steady angle.
+    def __init__(self, decoder, margin=5.0):
+        self.decoder = decoder
+        self.margin = margin
+        self.sector = NO_SECTOR
+
+    def reset(self):
+        self.sector = NO_SECTOR
+
+    def update(self, angle):
+        if angle is None:
+            self.sector = NO_SECTOR
+            return None
+        if self.sector != NO_SECTOR:
+            centre = SECTOR_ANGLES[self.sector]
+            if abs(wrap_angle(angle - centre)) <= self.decoder.angle_gap + self.margin:
+                return centre
+
+        matching_angle = self.decoder.match_angle(angle)
+        self.sector = NO_SECTOR if matching_angle is None else SECTOR_ANGLES.index(matching_angle)
+        return angle
+
+
+class ArmSmoother:
+    def __init__(self, decoder, min_cutoff=1.0, beta=0.02, d_cutoff=1.0, margin=5.0):
+        self.filters = (AngleFilter(min_cutoff, beta, d_cutoff), AngleFilter(min_cutoff, beta, d_cutoff))
+        self.hysteresis = (SectorHysteresis(decoder, margin), SectorHysteresis(decoder, margin))
+
+    def reset(self):
+        for arm_filter, hysteresis in zip(self.filters, self.hysteresis):
+            arm_filter.reset()
+            hysteresis.reset()
+
+    def update(self, right_angle, left_angle, timestamp):
+        return tuple(hysteresis.update(arm_filter.update(angle, timestamp))
+                     for angle, arm_filter, hysteresis in zip((right_angle, left_angle), self.filters,
+                                                              self.hysteresis))
+
+
+def smooth_angles(right_angles, left_angles, fps, smoother):
+    smoothed = np.full((2, len(right_angles)), np.nan)
+    for i, (right_angle, left_angle) in enumerate(zip(right_angles.tolist(), left_angles.tolist())):
+        right_angle, left_angle = smoother.update(None if math.isnan(right_angle) else right_angle,
+                                                  None if math.isnan(left_angle) else left_angle, i / fps)
+        smoothed[:, i] = (np.nan if right_angle is None else right_angle,
+                          np.nan if left_angle is None else left_angle)
+    return smoothed[0], smoothed[1]
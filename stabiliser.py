@@ -0,0 +1,177 @@
+from collections import deque
+from metrics import METRICS, COMMIT_BUCKETS
+
+CANDIDATE = "letter_candidate"
+COMMITTED = "letter_committed"
+SPACE = "space"
+STOP = "stop"
+
+
+class LetterWindow:
+    def __init__(self, size=10):
+        self.size = size
+        self.window = deque()
+        self.counts = {}
+        # Letters grouped by their count; dicts keep ties in a deterministic order.
+        self.buckets = {}
+        self.max_count = 0
+
+    def __len__(self):
+        return len(self.window)
+
+    def push(self, letter):
+        self.increment(letter)
+        self.window.append(letter)
+        if len(self.window) > self.size:
+            self.decrement(self.window.popleft())
+
+    def count(self, letter):
+        return self.counts.get(letter, 0)
+
+    def majority(self):
+        if not self.window:
+            return None, 0.0
+        letter = next(iter(self.buckets[self.max_count]))
+        return letter, self.max_count / len(self.window)
+
+    def clear(self):
+        self.window.clear()
+        self.counts.clear()
+        self.buckets.clear()
+        self.max_count = 0
+
+    def increment(self, letter):
+        count = self.counts.get(letter, 0)
+        if count:
+            self.remove_from_bucket(letter, count)
+        self.counts[letter] = count + 1
+        self.buckets.setdefault(count + 1, {})[letter] = None
+        if count + 1 > self.max_count:
+            self.max_count = count + 1
+
+    def decrement(self, letter):
+        count = self.counts[letter]
+        self.remove_from_bucket(letter, count)
+        if count == self.max_count and count not in self.buckets:
+            self.max_count -= 1
+
+        if count > 1:
+            self.counts[letter] = count - 1
+            self.buckets.setdefault(count - 1, {})[letter] = None
+        else:
+            del self.counts[letter]
+
+    def remove_from_bucket(self, letter, count):
+        bucket = self.buckets[count]
+        del bucket[letter]
+        if not bucket:
+            del self.buckets[count]
+
+
+class LetterStabiliser:
+    def __init__(self, buffer_size=10, output_threshold=5, stable_duration=2.0, alphabet=None):
+        self.window = LetterWindow(buffer_size)
+        self.output_threshold = output_threshold
+        self.stable_duration = stable_duration
+        self.alphabet = alphabet
+        self.reset()
+
+    def reset(self):
+        self.window.clear()
+        self.output_letter = None
+        self.stable_letter = None
+        self.stable_start_time = 0.0
+        self.first_seen = {}
+        self.stable = False
+        self.committed = False
+        self.stopped = False
+        self.text = ""
+        self.mode = None
+        self.letters = []
+
+    def snapshot(self):
+        # Everything update needs to carry on from this point; committed letters are left to the caller.
+        return {
+            "window": list(self.window.window),
+            "output_letter": self.output_letter,
+            "stable_letter": self.stable_letter,
+            "stable_start_time": self.stable_start_time,
+            "first_seen": list(self.first_seen.items()),
+            "stable": self.stable,
+            "committed": self.committed,
+            "stopped": self.stopped,
+            "text": self.text,
+            "mode": self.mode,
+        }
+
+    def restore(self, state):
+        self.reset()
+        for letter in state["window"]:
+            self.window.push(letter)
+        self.output_letter = state["output_letter"]
+        self.stable_letter = state["stable_letter"]
+        self.stable_start_time = state["stable_start_time"]
+        self.first_seen = dict(map(tuple, state["first_seen"]))
+        self.stable = state["stable"]
+        self.committed = state["committed"]
+        self.stopped = state["stopped"]
+        self.text = state["text"]
+        self.mode = state["mode"]
+
+    @property
+    def buffer_size(self):
+        return self.window.size
+
+    def is_stable(self, letter):
+        return self.window.count(letter) >= self.output_threshold
+
+    def update(self, letter, timestamp, frame_index=None):
+        if self.stopped:
+            return None
+
+        self.window.push(letter)
+        if METRICS.enabled and letter not in self.first_seen:
+            self.first_seen[letter] = timestamp
+        self.stable = self.is_stable(letter)
+        if not self.stable:
+            return None
+
+        if self.output_letter != letter:
+            self.stable_letter = None
+            self.output_letter = letter
+            self.stable_start_time = timestamp
+            # Time to commit is measured from the first frame showing the letter since the last candidate.
+            if METRICS.enabled:
+                self.first_seen = {letter: self.first_seen.get(letter, timestamp)}
+            self.committed = False
+            return CANDIDATE
+
+        if timestamp - self.stable_start_time >= self.stable_duration:
+            self.stable_letter = letter
+
+            if not self.committed:
+                self.committed = True
+                return self.commit(timestamp, frame_index)
+        return None
+
+    def commit(self, timestamp, frame_index):
+        if self.stable_letter is None:
+            return None
+
+        self.letters.append({"letter": self.stable_letter, "frame": frame_index, "time": round(timestamp, 3)})
+        if METRICS.enabled:
+            METRICS.observe("commit_seconds", timestamp - self.first_seen.get(self.stable_letter, timestamp),
+                            buckets=COMMIT_BUCKETS)
+            METRICS.increment("letters_committed_total", (("letter", self.stable_letter),))
+        if self.alphabet is None:
+            self.text += self.stable_letter
+            return COMMITTED
+        elif self.stable_letter == self.alphabet.stop:
+            self.stopped = True
+            return STOP
+        elif self.stable_letter == self.alphabet.space:
+            self.text += " "
+            return SPACE
+        else:
+            self.text, self.mode = self.alphabet.apply(self.text, self.mode, self.stable_letter)
+            return COMMITTED
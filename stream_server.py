@@ -0,0 +1,278 @@
+import json
+import time
+import socket
+import argparse
+import threading
+import socketserver
+from queue import Full
+import cv2
+import semaphore_decoder as sd
+from alphabet import ALPHABETS
+import metrics
+from metrics import METRICS
+from pipeline import Closed, FrameQueue, StageStats
+from resources import POOL
+from stabiliser import LetterStabiliser, CANDIDATE
+
+
+def parse_source(source):
+    return int(source) if source.isdigit() else source
+
+
+class Stream:
+    def __init__(self, stream_id, source, language="en", buffer_size=10, output_threshold=5,
+                 stable_duration=2.0, queue_size=4):
+        self.stream_id = stream_id
+        self.source = source
+        self.live = isinstance(source, int) or "://" in source
+        self.language = language
+        self.frames = FrameQueue(maxsize=1 if self.live else queue_size, drop_oldest=self.live)
+        self.decoder = sd.SemaphoreDecoder()
+        self.stabiliser = LetterStabiliser(buffer_size, output_threshold, stable_duration,
+                                           self.decoder.alphabets.get(language))
+        self.inference_stats = StageStats(name="inference")
+        self.labels = (("stream", stream_id),)
+        METRICS.gauge("queue_depth", self.frames.qsize, self.labels)
+        METRICS.gauge("queue_dropped", lambda: self.frames.dropped, self.labels)
+        METRICS.gauge("stream_fps", lambda: self.fps, self.labels)
+        self.busy = False
+        self.finished = False
+        self.processed = 0
+        self.last_processed = 0
+        self.fps = 0.0
+
+    def read_frames(self, server):
+        cap = cv2.VideoCapture(self.source)
+        video_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        frame_index = 0
+        try:
+            while not server.stop_event.is_set() and not self.stabiliser.stopped:
+                with METRICS.time("capture"):
+                    success, img = cap.read()
+                if not success:
+                    break
+
+                timestamp = time.time() if self.live else frame_index / video_fps
+                while True:
+                    try:
+                        self.frames.put((frame_index, timestamp, img), timeout=0.1)
+                        break
+                    except Full:
+                        if server.stop_event.is_set():
+                            return
+                server.notify_work()
+                frame_index += 1
+        except Closed:
+            pass
+        finally:
+            cap.release()
+            self.frames.close()
+            server.notify_work()
+
+    def metrics(self, interval):
+        processed = self.processed
+        self.fps = (processed - self.last_processed) / interval if interval > 0 else 0.0
+        self.last_processed = processed
+        return {
+            "source": str(self.source),
+            "fps": round(self.fps, 2),
+            "processed": processed,
+            "backlog": self.frames.qsize(),
+            "dropped": self.frames.dropped,
+            "inference_ms": round(self.inference_stats.average * 1000, 2),
+            "text": self.stabiliser.text,
+        }
+
+
+class EventPublisher(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, EventHandler)
+        self.clients = set()
+        self.clients_lock = threading.Lock()
+
+    def publish(self, message):
+        data = (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+        with self.clients_lock:
+            clients = list(self.clients)
+        for client in clients:
+            try:
+                client.sendall(data)
+            except OSError:
+                with self.clients_lock:
+                    self.clients.discard(client)
+
+
+class EventHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        with self.server.clients_lock:
+            self.server.clients.add(self.request)
+        try:
+            while self.request.recv(1024):
+                pass
+        except OSError:
+            pass
+        finally:
+            with self.server.clients_lock:
+                self.server.clients.discard(self.request)
+
+
+class StreamServer:
+    def __init__(self, sources, workers=2, host="127.0.0.1", port=8765, language="en", buffer_size=10,
+                 output_threshold=5, stable_duration=2.0, queue_size=4, model_complexity=1):
+        self.streams = [Stream(str(i), parse_source(source), language, buffer_size, output_threshold,
+                               stable_duration, queue_size)
+                        for i, source in enumerate(sources)]
+        self.workers = workers
+        self.model_complexity = model_complexity
+        self.publisher = EventPublisher((host, port))
+        self.work_condition = threading.Condition()
+        self.next_stream = 0
+        self.stop_event = threading.Event()
+
+    def notify_work(self):
+        with self.work_condition:
+            self.work_condition.notify_all()
+
+    def next_job(self):
+        # Round-robin over streams with a queued frame; one frame per stream is in flight at a time
+        # so every stream is decoded in order.
+        for offset in range(len(self.streams)):
+            stream = self.streams[(self.next_stream + offset) % len(self.streams)]
+            if stream.busy or not stream.frames.qsize():
+                continue
+            self.next_stream = (self.next_stream + offset + 1) % len(self.streams)
+            stream.busy = True
+            return stream, stream.frames.get()
+        return None
+
+    def all_finished(self):
+        for stream in self.streams:
+            if not stream.finished:
+                if stream.frames.closed and not stream.frames.qsize() and not stream.busy:
+                    stream.finished = True
+                    METRICS.remove_gauges(stream.labels)
+                else:
+                    return False
+        return True
+
+    def worker_loop(self):
+        # Frames from different streams interleave on a detector, so it cannot track between frames.
+        with POOL.detector(static_image_mode=True, model_complexity=self.model_complexity) as detector:
+            self.run_worker(detector)
+
+    def run_worker(self, detector):
+        while not self.stop_event.is_set():
+            with self.work_condition:
+                job = self.next_job()
+                while job is None:
+                    if self.all_finished():
+                        self.stop_event.set()
+                        self.work_condition.notify_all()
+                    if self.stop_event.is_set():
+                        return
+                    self.work_condition.wait(timeout=0.5)
+                    job = self.next_job()
+
+            stream, (frame_index, timestamp, img) = job
+            try:
+                with stream.inference_stats.time():
+                    right_angle, left_angle = detector.find_arm_angles(img)
+                self.decode(stream, frame_index, timestamp, right_angle, left_angle)
+            finally:
+                with self.work_condition:
+                    stream.busy = False
+                    self.work_condition.notify_all()
+
+    def decode(self, stream, frame_index, timestamp, right_angle, left_angle):
+        with METRICS.time("find_letter"):
+            letter = stream.decoder.find_letter(right_angle, left_angle, stream.language)
+        with METRICS.time("stabiliser"):
+            event = stream.stabiliser.update(letter, timestamp, frame_index)
+        stream.processed += 1
+
+        if event is not None and not (event == CANDIDATE and stream.stabiliser.output_letter is None):
+            self.publisher.publish({
+                "type": event,
+                "stream": stream.stream_id,
+                "letter": stream.stabiliser.output_letter,
+                "text": stream.stabiliser.text,
+                "frame": frame_index,
+                "time": round(timestamp, 3),
+            })
+        if stream.stabiliser.stopped:
+            stream.frames.close()
+
+    def metrics_loop(self, interval):
+        while not self.stop_event.wait(interval):
+            self.publish_metrics(interval)
+
+    def publish_metrics(self, interval):
+        metrics = {stream.stream_id: stream.metrics(interval) for stream in self.streams}
+        self.publisher.publish({"type": "metrics", "time": round(time.time(), 3), "streams": metrics})
+        return metrics
+
+    def serve(self, metrics_interval=5.0):
+        threading.Thread(target=self.publisher.serve_forever, daemon=True).start()
+        threads = [threading.Thread(target=stream.read_frames, args=(self,), daemon=True) for stream in self.streams]
+        threads += [threading.Thread(target=self.worker_loop, daemon=True) for _ in range(self.workers)]
+        threading.Thread(target=self.metrics_loop, args=(metrics_interval,), daemon=True).start()
+        for thread in threads:
+            thread.start()
+
+        try:
+            while not self.stop_event.wait(0.5):
+                pass
+        except KeyboardInterrupt:
+            self.stop_event.set()
+        finally:
+            for stream in self.streams:
+                stream.frames.close()
+                METRICS.remove_gauges(stream.labels)
+            self.publisher.publish({"type": "finished", "streams": {stream.stream_id: stream.stabiliser.text
+                                                                    for stream in self.streams}})
+            self.publisher.shutdown()
+            self.publisher.server_close()
+
+
+def listen(host="127.0.0.1", port=8765):
+    with socket.create_connection((host, port)) as connection:
+        for line in connection.makefile("r", encoding="utf-8"):
+            print(line, end="")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode several semaphore streams with a shared detector pool.")
+    parser.add_argument("sources", nargs="*", help="camera indices, video files or stream URLs")
+    parser.add_argument("-w", "--workers", type=int, default=2, help="number of pose detector workers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("-l", "--language", choices=sorted(ALPHABETS), default="en")
+    parser.add_argument("--buffer-size", type=int, default=10)
+    parser.add_argument("--output-threshold", type=int, default=5)
+    parser.add_argument("--stable-duration", type=float, default=2.0)
+    parser.add_argument("--queue-size", type=int, default=4, help="frames buffered per file stream")
+    parser.add_argument("--model-complexity", type=int, choices=[0, 1, 2], default=1)
+    parser.add_argument("--metrics-interval", type=float, default=5.0)
+    parser.add_argument("--listen", action="store_true", help="print events from a running server")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.listen:
+        listen(args.host, args.port)
+        return
+    if not args.sources:
+        parser.error("at least one source is required")
+    metrics.start_from_args(args)
+
+    server = StreamServer(args.sources, args.workers, args.host, args.port, args.language, args.buffer_size,
+                          args.output_threshold, args.stable_duration, args.queue_size, args.model_complexity)
+    server.serve(args.metrics_interval)
+    for stream in server.streams:
+        print(f"{stream.source}: {stream.processed} frames -> {stream.stabiliser.text!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import os
+import csv
+import math
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import landmark_cache as lc
+import fixtures as fx
+import semaphore_decoder as sd
+from alphabet import ALPHABETS
+from smoothing import ArmSmoother, smooth_angles
+
+PARAMETERS = ("angle_gap", "buffer_size", "output_threshold", "stable_duration")
+
+
+def letter_totals(codes):
+    # Running count of every letter up to each frame; column 0 counts frames without a letter.
+    columns = codes.astype(np.intp) + 1
+    totals = np.zeros((len(codes) + 1, columns.max(initial=0) + 1), dtype=np.int32)
+    totals[np.arange(1, len(codes) + 1), columns] = 1
+    np.cumsum(totals, axis=0, out=totals)
+    return columns, totals
+
+
+def window_counts(columns, totals, buffer_size):
+    # How often each frame's letter occurs in the stabiliser's window ending at that frame.
+    frames = np.arange(1, len(columns) + 1)
+    return totals[frames, columns] - totals[np.maximum(frames - buffer_size, 0), columns]
+
+
+def commit_frames(codes, counts, times, output_threshold, stable_durations):
+    # Mirrors LetterStabiliser.update for every stable duration at once. Only frames where the letter is
+    # stable change its state: a run of equal stable letters starts a candidate, and the letter is committed
+    # on the first later frame of the run that is stable_duration past the run's start.
+    stable = np.flatnonzero(counts >= output_threshold)
+    if not len(stable):
+        return [np.empty(0, dtype=np.intp)] * len(stable_durations)
+    letters = codes[stable]
+    run_starts = np.flatnonzero(np.concatenate(([True], letters[1:] != letters[:-1])))
+    run_ids = np.repeat(np.arange(len(run_starts)), np.diff(np.append(run_starts, len(stable))))
+    stable_times = times[stable]
+    elapsed = stable_times - stable_times[run_starts][run_ids]
+    # The frame starting a run only raises the candidate, so it can never commit.
+    elapsed[run_starts] = -np.inf
+
+    reached = elapsed >= np.asarray(stable_durations)[:, None]
+    positions = np.where(reached, np.arange(len(stable)), len(stable))
+    first = np.minimum.reduceat(positions, run_starts, axis=1)
+    # Runs of frames without a letter commit nothing.
+    first[:, letters[run_starts] < 0] = len(stable)
+    return [stable[row[row < len(stable)]] for row in first]
+
+
+def score(frames, codes, times, names, language, reference, segments):
+    stop = ALPHABETS[language].stop
+    letters = []
+    for frame_index in frames.tolist():
+        letter = names[codes[frame_index]]
+        letters.append({"letter": letter, "frame": frame_index, "time": round(float(times[frame_index]), 3)})
+        if letter == stop:
+            break
+    text = fx.expected_text([committed["letter"] for committed in letters], language)
+    return fx.character_error_rate(reference, text), fx.commit_latency(letters, segments)
+
+
+def sweep_recording(right_angles, left_angles, fps, reference, segments, language, angle_gap, buffer_sizes,
+                    output_thresholds, stable_durations, smoothing=False):
+    decoder = sd.SemaphoreDecoder(angle_gap=angle_gap)
+    if smoothing:
+        right_angles, left_angles = smooth_angles(right_angles, left_angles, fps, ArmSmoother(decoder))
+    codes = decoder.find_letters(right_angles, left_angles, language)
+    _, names = decoder.letter_table(language)
+    times = np.arange(len(codes)) / fps
+    columns, totals = letter_totals(codes)
+
+    results = []
+    for buffer_size in buffer_sizes:
+        counts = window_counts(columns, totals, buffer_size)
+        for output_threshold in output_thresholds:
+            if output_threshold > buffer_size:
+                continue
+            commits = commit_frames(codes, counts, times, output_threshold, stable_durations)
+            for stable_duration, frames in zip(stable_durations, commits):
+                error_rate, latency = score(frames, codes, times, names, language, reference, segments)
+                results.append(((angle_gap, buffer_size, output_threshold, stable_duration), error_rate, latency))
+    return results
+
+
+def recording_job(recording, language):
+    right_elbow, right_wrist, left_elbow, left_wrist = 14, 16, 13, 15
+    return (np.ascontiguousarray(recording.angles(right_elbow, right_wrist)),
+            np.ascontiguousarray(recording.angles(left_elbow, left_wrist)), recording.fps,
+            recording.meta.get("text", ""), recording.meta.get("segments", []), language)
+
+
+def sweep(recordings, angle_gaps, buffer_sizes, output_thresholds, stable_durations, language="en",
+          smoothing=False, workers=None):
+    jobs = [recording_job(recording, language) for recording in recordings]
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, mp_context=context) as executor:
+        futures = [executor.submit(sweep_recording, *job, angle_gap, buffer_sizes, output_thresholds,
+                                   stable_durations, smoothing)
+                   for job in jobs for angle_gap in angle_gaps]
+
+        settings = {}
+        for future in futures:
+            for key, error_rate, latency in future.result():
+                errors, latencies = settings.setdefault(key, ([], []))
+                errors.append(error_rate)
+                latencies.append(latency)
+
+    rows = []
+    for key, (errors, latencies) in settings.items():
+        latencies = [latency for latency in latencies if not math.isnan(latency)]
+        rows.append({
+            **dict(zip(PARAMETERS, key)),
+            "cer": round(sum(errors) / len(errors), 4),
+            "max_cer": round(max(errors), 4),
+            "latency": round(sum(latencies) / len(latencies), 3) if latencies else None,
+        })
+    rows.sort(key=lambda row: (row["cer"], row["max_cer"], math.inf if row["latency"] is None else row["latency"]))
+    return rows
+
+
+def write_csv(rows, path):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=[*PARAMETERS, "cer", "max_cer", "latency"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score decoding settings over landmark recordings with known text.")
+    parser.add_argument("--fixture", action="append", default=[], help="recorded landmark fixture (.npy) with text")
+    parser.add_argument("--text", default="SEMAPHORE DECODER TEST", help="text of the synthetic fixtures")
+    parser.add_argument("--jitter", type=float, nargs="*", default=[6.0, 10.0, 14.0],
+                        help="arm angle noise of the synthetic fixtures in degrees; none to use only --fixture")
+    parser.add_argument("--seeds", type=int, default=3, help="synthetic fixtures per jitter level")
+    parser.add_argument("-l", "--language", choices=sorted(ALPHABETS), default="en")
+    parser.add_argument("--angle-gap", type=float, nargs="+", default=[15.0, 17.5, 20.0, 22.5, 25.0, 27.5])
+    parser.add_argument("--buffer-size", type=int, nargs="+", default=list(range(4, 21, 2)))
+    parser.add_argument("--output-threshold", type=int, nargs="+", default=list(range(2, 13)))
+    parser.add_argument("--stable-duration", type=float, nargs="+",
+                        default=[0.5, 0.75, 1.0, 1.25, 1.5, 1.75, 2.0, 2.25, 2.5, 2.75, 3.0])
+    parser.add_argument("--smooth", action="store_true", help="score the settings on smoothed arm angles")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("-o", "--output", default=None, help="write every scored setting to this CSV file")
+    parser.add_argument("--top", type=int, default=10, help="number of best settings to print")
+    args = parser.parse_args()
+
+    recordings = []
+    for fixture_file in args.fixture:
+        recording = lc.load_recording(fixture_file)
+        if recording is None:
+            raise IOError(f"Cannot load fixture: {fixture_file}")
+        recordings.append(recording)
+    for jitter in args.jitter:
+        recordings += [fx.synthesize_landmarks(args.text, args.language, jitter=jitter, dropout=0.03, seed=seed)
+                       for seed in range(args.seeds)]
+    if not recordings:
+        parser.error("no recordings to score")
+
+    start_time = time.perf_counter()
+    rows = sweep(recordings, args.angle_gap, args.buffer_size, args.output_threshold, args.stable_duration,
+                 args.language, args.smooth, args.workers)
+    elapsed = time.perf_counter() - start_time
+    print(f"{len(rows)} settings x {len(recordings)} recordings in {elapsed:.1f} s")
+
+    if args.output:
+        write_csv(rows, args.output)
+    print(f"  {'gap':>5} {'buffer':>6} {'thresh':>6} {'stable s':>8} {'CER':>7} {'max CER':>7} {'commit s':>8}")
+    for row in rows[:args.top]:
+        latency = "-" if row["latency"] is None else f"{row['latency']:.2f}"
+        print(f"  {row['angle_gap']:5g} {row['buffer_size']:6d} {row['output_threshold']:6d} "
+              f"{row['stable_duration']:8g} {row['cer']:7.3f} {row['max_cer']:7.3f} {latency:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope="session")
+def video_file(tmp_path_factory):
+    # A short clip without a person: enough for anything that reads, decodes and closes a source.
+    cv2 = pytest.importorskip("cv2")
+    path = str(tmp_path_factory.mktemp("videos") / "blank.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (160, 120))
+    for index in range(60):
+        frame = np.full((120, 160, 3), index * 4, dtype=np.uint8)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def frame_index_of(img):
+    # Inverse of the indexed clip below: one bit of the frame index in each eighth of the width.
+    width = img.shape[1]
+    bits = [img[:, width * bit // 8 + 2:width * (bit + 1) // 8 - 2].mean() > 128 for bit in range(8)]
+    return sum(1 << bit for bit, on in enumerate(bits) if on)
+
+
+@pytest.fixture(scope="session")
+def indexed_video(tmp_path_factory):
+    # Every frame shows its own index, so readers can be checked for seeking, stepping and scaling.
+    cv2 = pytest.importorskip("cv2")
+    path = str(tmp_path_factory.mktemp("videos") / "indexed.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (320, 120))
+    for index in range(90):
+        frame = np.zeros((120, 320, 3), dtype=np.uint8)
+        for bit in range(8):
+            if index >> bit & 1:
+                frame[:, bit * 40:(bit + 1) * 40] = 255
+        writer.write(frame)
+    writer.release()
+    return path
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+import fixtures as fx
+import semaphore_decoder as sd
+from adaptive import AdaptiveScheduler
+from stabiliser import LetterStabiliser
+from alphabet import ALPHABETS
+from smoothing import wrap_angle
+
+FPS = 30.0
+
+
+def arm_angles(letters, hold, jitter, seed):
+    # Held letters with small noise, moving straight from one to the next; frames are stood in for by indices.
+    rng = np.random.default_rng(seed)
+    angles = fx.letter_angles()
+    frames = [angles[letter] for letter, frames in zip(letters, hold) for _ in range(frames)]
+    return [(wrap_angle(right + rng.normal(0, jitter)), wrap_angle(left + rng.normal(0, jitter)))
+            for right, left in frames]
+
+
+def decode(frames, stabiliser, decoder):
+    for frame_index, right_angle, left_angle in frames:
+        stabiliser.update(decoder.find_letter(right_angle, left_angle), frame_index / FPS, frame_index)
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("max_skip", [2, 4, 7])
+def test_skipping_commits_the_letters_found_at_full_rate(seed, max_skip):
+    letters = ["H", "E", "L", "P", "SPACE", "O", "STOP"]
+    rng = np.random.default_rng(seed)
+    # Hold lengths that are not multiples of the skip, so letter changes fall inside skipped windows.
+    hold = [int(frames) for frames in rng.integers(50, 80, len(letters))]
+    angles = arm_angles(letters, hold, 1.0, seed)
+    decoder = sd.SemaphoreDecoder()
+
+    full = LetterStabiliser(10, 5, 1.0, ALPHABETS["en"])
+    decode([(frame_index, *pair) for frame_index, pair in enumerate(angles)], full, decoder)
+
+    inferred = []
+
+    def infer(frame_index):
+        inferred.append(frame_index)
+        return angles[frame_index]
+
+    scheduler = AdaptiveScheduler(infer, max_skip, angle_tolerance=5.0)
+    adaptive = LetterStabiliser(10, 5, 1.0, ALPHABETS["en"])
+    for frame_index in range(len(angles)):
+        decode(scheduler.push(frame_index, frame_index, adaptive.committed), adaptive, decoder)
+    decode(scheduler.flush(), adaptive, decoder)
+
+    assert adaptive.letters == full.letters
+    assert adaptive.text == full.text == "HELP O"
+    assert len(set(inferred)) < len(angles)
+    # Skipped frames were decoded after a later frame showed the arms had moved.
+    assert any(later > earlier for later, earlier in zip(inferred, inferred[1:]))
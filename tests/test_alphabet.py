@@ -0,0 +1,77 @@
+import json
+import warnings
+import numpy as np
+import pytest
+import batch_decoder as bd
+import fixtures as fx
+import landmark_cache as lc
+from alphabet import ALPHABETS, AlphabetError, load_alphabets, alphabet_labels, installed_alphabets
+
+# Held poses including the numeral sign and cancel, which English only learned with alphabet files.
+POSES = ["H", "E", "Numerical sign", "A", "J", "L", "Cancel", "L", "O", "STOP"]
+
+
+def held_poses(letters, fps=30.0, hold=2.5, width=1280, height=720):
+    angles = fx.letter_angles("en_numeric")
+    frames = []
+    for letter in letters:
+        frames += [fx.pose_frame(*fx.REST_ANGLES, width, height)] * int(0.3 * fps)
+        frames += [fx.pose_frame(*angles[letter], width, height)] * int(hold * fps)
+    meta = {"version": lc.CACHE_VERSION, "video": "synthetic", "fps": fps, "width": width, "height": height}
+    return lc.LandmarkRecording(np.array(frames), meta)
+
+
+def test_english_decodes_as_before_numeric_mode():
+    # Decoded by the English of the hard-coded tables, which had neither pose.
+    stabiliser, _ = bd.decode_recording(held_poses(POSES), "en")
+    assert stabiliser.text == "HEAJLLO"
+    assert stabiliser.stopped
+
+
+def test_numeric_variant_reads_numerals_and_cancel():
+    stabiliser, _ = bd.decode_recording(held_poses(POSES), "en_numeric")
+    assert stabiliser.text == "HE1LO"
+    assert stabiliser.stopped
+
+
+@pytest.mark.parametrize("language", sorted(ALPHABETS))
+def test_every_alphabet_declares_space_and_stop(language):
+    alphabet = ALPHABETS[language]
+    assert alphabet.space in alphabet.letters
+    assert alphabet.stop in alphabet.letters
+    recording = fx.synthesize_landmarks("AB C" if language.startswith("en") else "АБ В", language)
+    stabiliser, _ = bd.decode_recording(recording, language)
+    assert stabiliser.text == recording.meta["text"]
+
+
+def write_alphabet(directory, language, spec):
+    with open(directory / f"{language}.json", "w", encoding="utf-8") as f:
+        json.dump(spec, f)
+
+
+def test_variant_has_its_own_name(tmp_path):
+    write_alphabet(tmp_path, "en_flags", {"extends": "en"})
+    alphabets = load_alphabets(tmp_path)
+    assert alphabets["en_flags"].name == "en_flags"
+    assert alphabets["en_flags"].stop == "STOP"
+    assert len(set(alphabet_labels(alphabets).values())) == len(alphabets)
+
+
+def test_shared_names_get_unique_labels(tmp_path):
+    write_alphabet(tmp_path, "en_flags", {"extends": "en", "name": "English"})
+    labels = alphabet_labels(load_alphabets(tmp_path))
+    assert labels["English (en)"] == "en"
+    assert labels["English (en_flags)"] == "en_flags"
+
+
+@pytest.mark.parametrize("spec", ["{", json.dumps({"extends": "xx"}), json.dumps({"name": "No letters"})])
+def test_broken_site_alphabets_fall_back_to_builtins(tmp_path, monkeypatch, spec):
+    (tmp_path / "broken.json").write_text(spec, encoding="utf-8")
+    with pytest.raises((AlphabetError, ValueError)):
+        load_alphabets(tmp_path)
+    monkeypatch.setenv("SEMAPHORE_ALPHABETS", str(tmp_path))
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        alphabets = installed_alphabets()
+    assert sorted(alphabets) == sorted(ALPHABETS)
+    assert "SEMAPHORE_ALPHABETS" in str(caught[0].message)
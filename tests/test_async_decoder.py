@@ -0,0 +1,64 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+pytest.importorskip("mediapipe")
+import async_decoder as ad
+
+
+@pytest.fixture
+def readers(monkeypatch):
+    readers = []
+
+    class RecordedReader(ad.FrameReader):
+        def __init__(self, source):
+            super().__init__(source)
+            readers.append(self)
+
+    monkeypatch.setattr(ad, "FrameReader", RecordedReader)
+    return readers
+
+
+def test_timeout_releases_every_capture(video_file, readers, monkeypatch):
+    cv2 = pytest.importorskip("cv2")
+    read = ad.FrameReader.read
+
+    def read_forever(reader):
+        # Loops the clip so the timeout always ends the sources mid-stream.
+        success, img = read(reader)
+        if not success and reader.cap is not None:
+            reader.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, img = read(reader)
+        return success, img
+
+    monkeypatch.setattr(ad.FrameReader, "read", read_forever)
+    in_use = ad.POOL.in_use
+    asyncio.run(ad.decode_sources([video_file, video_file], 2, "en", 10, 5, 2.0, timeout=3.0))
+    assert len(readers) == 2
+    assert all(reader.cap is None for reader in readers)
+    assert ad.POOL.in_use == in_use
+
+
+def test_closing_frames_waits_for_the_release(video_file, readers, monkeypatch):
+    release = ad.FrameReader.release
+
+    def slow_release(reader):
+        time.sleep(0.2)
+        release(reader)
+
+    monkeypatch.setattr(ad.FrameReader, "release", slow_release)
+
+    async def read_one_frame(executor):
+        frames = ad.video_frames(video_file, executor)
+        await frames.__anext__()
+        await frames.aclose()
+        return readers[0].cap is None
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert asyncio.run(read_one_frame(executor))
+
+
+def test_finished_sources_release_their_captures(video_file, readers):
+    asyncio.run(ad.decode_sources([video_file], 2, "en", 10, 5, 2.0, timeout=None))
+    assert len(readers) == 1 and readers[0].cap is None
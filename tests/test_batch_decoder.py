@@ -0,0 +1,39 @@
+import os
+import pytest
+import batch_decoder as bd
+
+
+def test_output_names_keep_unique_file_names():
+    assert bd.output_names(["a/x.mp4", "b/y.mp4"]) == ["x", "y"]
+
+
+def test_output_names_add_directories_for_shared_file_names():
+    names = bd.output_names([os.path.join("runs", "a", "x.mp4"), os.path.join("runs", "b", "x.mp4"), "runs/c.mp4"])
+    assert names == ["a_x", "b_x", "c"]
+
+
+def test_output_names_reject_the_same_video_twice():
+    with pytest.raises(ValueError):
+        bd.output_names(["a/x.mp4", "a/x.mp4"])
+
+
+@pytest.mark.parametrize("option", ["--frame-step", "--max-width"])
+@pytest.mark.parametrize("value", ["0", "-2", "x"])
+def test_frame_options_must_be_positive(option, value, capsys):
+    with pytest.raises(SystemExit):
+        bd.build_parser().parse_args(["x.mp4", option, value])
+    assert option in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("mode", [["--adaptive"], ["--cache-dir", "cache"]])
+@pytest.mark.parametrize("option", [["--frame-step", "2"], ["--max-width", "640"]])
+def test_frame_options_are_not_silently_ignored(tmp_path, mode, option, capsys):
+    with pytest.raises(SystemExit):
+        bd.main(["x.mp4", "-o", str(tmp_path), *mode, *option])
+    assert "cannot be combined" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("option", [{"step": 2}, {"max_width": 640}])
+def test_cached_decoding_rejects_frame_options(tmp_path, option):
+    with pytest.raises(ValueError):
+        bd.decode_video("x.mp4", cache_dir=str(tmp_path), **option)
@@ -0,0 +1,185 @@
+import time
+import threading
+import numpy as np
+import pytest
+
+pytest.importorskip("customtkinter")
+import gui
+
+
+class FakeButton:
+    def configure(self, **options):
+        pass
+
+
+class FakeCapture:
+    def __init__(self):
+        self.reads = 0
+
+    def read(self):
+        self.reads += 1
+        return True, np.zeros((4, 4, 3), dtype=np.uint8)
+
+    def get(self, prop):
+        return 0.0
+
+    def release(self):
+        pass
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def video_thread():
+    thread = gui.VideoThread(None, FakeButton())
+    thread.capture_thread = threading.Thread(target=thread.capture_loop, daemon=True)
+    thread.capture_thread.start()
+    yield thread
+    thread.stop()
+
+
+def count_reads(capture):
+    reads = []
+    read = capture.read
+
+    def counted():
+        result = read()
+        reads.append(capture.cap)
+        return result
+    capture.read = counted
+    return reads
+
+
+def test_no_read_after_source_switched_while_paused(video_thread):
+    old, new = FakeCapture(), FakeCapture()
+    reads = count_reads(video_thread.capture)
+    video_thread.set_cap(old, owned=False)
+    generation, _ = video_thread.frame_queue.get(timeout=1.0)
+    assert generation == video_thread.source_generation
+
+    video_thread.toggle_pause()
+    # One frame may already be on its way into the queue; after that the thread waits for resume.
+    video_thread.frame_queue.get(timeout=1.0)
+    time.sleep(0.1)
+    paused_reads = len(reads)
+    # Restarting while paused drops the source; the thread must go back to waiting without reading.
+    video_thread.restart()
+    time.sleep(0.1)
+    assert len(reads) == paused_reads
+
+    video_thread.set_cap(new, owned=False)
+    generation, _ = video_thread.frame_queue.get(timeout=1.0)
+    assert generation == video_thread.source_generation
+    assert all(cap is new for cap in reads[paused_reads:])
+    wait_until(lambda: new.reads > 0)
+
+
+class FakeWidget:
+    def __init__(self, master=None):
+        self.master = master
+        self.options = {"fg_color": "gray"}
+        self.threads = set()
+
+    def configure(self, **options):
+        self.threads.add(threading.current_thread())
+        self.options.update(options)
+
+    def cget(self, name):
+        return self.options[name]
+
+
+def test_video_thread_leaves_the_button_to_the_main_loop(video_thread):
+    class EndedCapture(FakeCapture):
+        def read(self):
+            return False, None
+
+    button = FakeWidget()
+    video_thread.video_button = button
+    video_thread.set_cap(EndedCapture(), owned=False)
+    wait_until(lambda: video_thread.ended_generation is not None)
+    assert not button.threads
+
+    video_thread.show_source_state()
+    assert button.threads == {threading.current_thread()}
+    assert button.options["state"] == gui.tk.DISABLED
+
+
+def test_text_thread_leaves_widgets_to_the_main_loop():
+    import fixtures as fx
+    detector_output, text_output = FakeWidget(FakeWidget()), FakeWidget()
+    angle_buffer = gui.FrameQueue(maxsize=100, drop_oldest=False)
+    thread = gui.TextThread(detector_output, text_output, angle_buffer, buffer_size=4, output_threshold=2,
+                            stable_duration=0.05, daemon=True)
+    thread.start()
+    angles = fx.letter_angles()
+    try:
+        for letter in "AB":
+            for _ in range(8):
+                angle_buffer.put(angles[letter])
+                time.sleep(0.02)
+        wait_until(lambda: thread.stabiliser.text == "AB")
+    finally:
+        thread.stop()
+        thread.join(timeout=2.0)
+
+    assert not detector_output.threads and not text_output.threads
+    thread.show_output()
+    assert text_output.options["text"] == "AB"
+    assert detector_output.options["text"] == "B"
+    assert detector_output.threads == text_output.threads == {threading.current_thread()}
+
+
+def test_startup_times_go_to_the_metrics_logger(video_thread, capsys, caplog):
+    with caplog.at_level("INFO", logger="semaphore.metrics"):
+        video_thread.record_startup("first_frame", 0.25)
+    assert video_thread.startup["first_frame"] == 0.25
+    assert "startup: first_frame 0.25 s" in caplog.text
+    assert capsys.readouterr().out == ""
+
+
+def test_restart_resets_the_stabiliser_on_the_text_thread():
+    import fixtures as fx
+    detector_output, text_output = FakeWidget(FakeWidget()), FakeWidget()
+    angle_buffer = gui.FrameQueue(maxsize=100, drop_oldest=False)
+    thread = gui.TextThread(detector_output, text_output, angle_buffer, buffer_size=4, output_threshold=2,
+                            stable_duration=0.05, daemon=True)
+    resets = []
+    reset = thread.stabiliser.reset
+
+    def recorded_reset():
+        resets.append(threading.current_thread())
+        reset()
+    thread.stabiliser.reset = recorded_reset
+    thread.start()
+    angles = fx.letter_angles()
+    try:
+        for _ in range(8):
+            angle_buffer.put(angles["A"])
+            time.sleep(0.02)
+        wait_until(lambda: thread.stabiliser.text == "A")
+        thread.restart()
+        wait_until(lambda: resets == [thread])
+        assert thread.stabiliser.text == ""
+        for _ in range(8):
+            angle_buffer.put(angles["B"])
+            time.sleep(0.02)
+        wait_until(lambda: thread.stabiliser.text == "B")
+    finally:
+        thread.stop()
+        thread.join(timeout=2.0)
+
+
+def test_stage_latency_and_queue_depth_reach_the_metrics(video_thread, monkeypatch):
+    from metrics import METRICS
+    monkeypatch.setattr(METRICS, "enabled", True)
+    monkeypatch.setattr(METRICS, "histograms", {})
+    video_thread.set_cap(FakeCapture(), owned=False)
+    video_thread.frame_queue.get(timeout=1.0)
+    wait_until(lambda: 'stage_seconds_count{stage="capture"}' in METRICS.render())
+    assert 'semaphore_queue_depth{queue="frame_queue"}' in METRICS.render()
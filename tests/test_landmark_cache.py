@@ -0,0 +1,29 @@
+import os
+import landmark_cache as lc
+
+
+def test_key_hashes_a_video_only_when_it_changes(tmp_path, monkeypatch):
+    video_file = tmp_path / "video.mp4"
+    video_file.write_bytes(b"frames" * 1000)
+    hashed = []
+    video_hash = lc.video_hash
+    monkeypatch.setattr(lc, "video_hash", lambda path: hashed.append(path) or video_hash(path))
+
+    cache = lc.LandmarkCache(str(tmp_path / "cache"))
+    key = cache.key(str(video_file), {"model_complexity": 1})
+    assert cache.key(str(video_file), {"model_complexity": 1}) == key
+    # A new cache object reads the stored hashes instead of hashing again.
+    assert lc.LandmarkCache(str(tmp_path / "cache")).key(str(video_file), {"model_complexity": 1}) == key
+    assert len(hashed) == 1
+
+    video_file.write_bytes(b"other frames" * 1000)
+    os.utime(video_file, ns=(0, os.stat(video_file).st_mtime_ns + 1))
+    assert cache.key(str(video_file), {"model_complexity": 1}) != key
+    assert len(hashed) == 2
+
+
+def test_key_follows_video_content_not_path(tmp_path):
+    for name in ("a.mp4", "b.mp4"):
+        (tmp_path / name).write_bytes(b"same frames")
+    cache = lc.LandmarkCache(str(tmp_path / "cache"))
+    assert cache.key(str(tmp_path / "a.mp4"), {}) == cache.key(str(tmp_path / "b.mp4"), {})
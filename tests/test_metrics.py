@@ -0,0 +1,49 @@
+import threading
+import pytest
+from metrics import METRICS, Registry
+from stabiliser import LetterStabiliser
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    monkeypatch.setattr(METRICS, "enabled", True)
+    monkeypatch.setattr(METRICS, "histograms", {})
+    monkeypatch.setattr(METRICS, "counters", {})
+    return METRICS
+
+
+def commit_letters(stabiliser, letters, fps=10.0):
+    frame_index = 0
+    for letter in letters:
+        for _ in range(30):
+            stabiliser.update(letter, frame_index / fps, frame_index)
+            frame_index += 1
+
+
+def test_observe_waits_for_the_histogram_lock():
+    histogram = Registry(enabled=True).histogram("stage_seconds", (("stage", "test"),))
+    with histogram.lock:
+        thread = threading.Thread(target=histogram.observe, args=(0.001,))
+        thread.start()
+        thread.join(0.2)
+        assert thread.is_alive()
+        assert histogram.count == 0
+    thread.join()
+    assert histogram.snapshot() == ([0, 0, 0, 0, 1] + [0] * 11, 1, 0.001)
+
+
+def test_stabiliser_skips_commit_timing_without_metrics():
+    assert not METRICS.enabled
+    stabiliser = LetterStabiliser()
+    commit_letters(stabiliser, ["A", None, "B"])
+    assert [letter["letter"] for letter in stabiliser.letters] == ["A", "B"]
+    assert stabiliser.first_seen == {}
+
+
+def test_stabiliser_counts_commits(metrics):
+    stabiliser = LetterStabiliser()
+    commit_letters(stabiliser, ["A", None, "A"])
+    rendered = metrics.render()
+    assert 'semaphore_letters_committed_total{letter="A"} 2' in rendered
+    assert "# TYPE semaphore_letters_committed_total counter" in rendered
+    assert "semaphore_commit_seconds_count 2" in rendered
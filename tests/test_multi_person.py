@@ -0,0 +1,31 @@
+import functools
+import multi_person as mp
+from metrics import METRICS
+
+
+class FakeDetector:
+    def __init__(self, tracks, model_path, num_poses):
+        self.tracks = tracks
+
+    def find_people(self, img, timestamp_ms):
+        self.tracks.append(METRICS.gauges[("tracks", ())]())
+        return [((10, 10, 50, 100), 90.0, 90.0)]
+
+    def close(self):
+        pass
+
+
+def test_decoders_do_not_register_gauges():
+    gauges = dict(METRICS.gauges)
+    mp.MultiSignallerDecoder()
+    mp.MultiSignallerDecoder()
+    assert METRICS.gauges == gauges
+
+
+def test_tracks_gauge_lasts_for_one_decode(video_file, monkeypatch):
+    tracks = []
+    monkeypatch.setattr(mp.pd, "MultiPoseDetector", functools.partial(FakeDetector, tracks))
+    result = mp.decode_video(video_file, "model.task")
+    assert result["frames"] == 60
+    assert tracks == [0] + [1] * 59
+    assert ("tracks", ()) not in METRICS.gauges
@@ -0,0 +1,75 @@
+import pytest
+import batch_decoder as bd
+import fixtures as fx
+import parallel_decoder as par
+from conftest import frame_index_of
+
+LETTERS = ["H"] * 20 + ["E"] * 25 + [None] * 5 + ["L"] * 20 + ["STOP"] * 20
+
+
+class FakeDetector:
+    # Reads the frame index off the clip and answers with the angles of the letter held at that frame.
+    def find_arm_angles(self, img):
+        letter = LETTERS[frame_index_of(img)]
+        return fx.letter_angles()[letter] if letter is not None else (None, None)
+
+
+class FakePool:
+    def acquire(self, **options):
+        return FakeDetector()
+
+    def release(self, detector):
+        pass
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    monkeypatch.setattr(bd, "POOL", FakePool())
+
+
+@pytest.mark.parametrize("frame_count, chunks", [(200, 7), (90, 4), (5, 8), (1, 3)])
+def test_split_frames_covers_every_frame_once(frame_count, chunks):
+    ranges = par.split_frames(frame_count, chunks)
+    assert len(ranges) == min(chunks, frame_count)
+    assert ranges[0][0] == 0
+    # The last range is open-ended, so frames beyond the container's count are still read.
+    assert ranges[-1][1] is None
+    assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+    assert all(start < end for start, end in ranges[:-1])
+
+
+def test_split_frames_for_200_frames_in_7_chunks():
+    assert par.split_frames(200, 7) == [(0, 29), (29, 57), (57, 86), (86, 114), (114, 143), (143, 171),
+                                        (171, None)]
+
+
+@pytest.mark.parametrize("step", [1, 2, 3, 4])
+@pytest.mark.parametrize("chunks", [1, 4, 7])
+@pytest.mark.parametrize("warmup_frames", [0, 5])
+def test_merged_chunks_match_a_sequential_decode(indexed_video, fake_pool, step, chunks, warmup_frames):
+    sequential = list(bd.read_angles(indexed_video, step=step))
+    assert [frame_index for frame_index, _, _ in sequential] == list(range(0, 90, step))
+    parts = [par.decode_chunk(indexed_video, start_frame, end_frame, warmup_frames, step, None, {})
+             for start_frame, end_frame in par.split_frames(90, chunks)]
+    merged = par.merge_chunks(parts, step)
+    assert merged == sequential
+
+    # The stabiliser runs over the merged angles, so a letter held across a chunk boundary commits once.
+    buffer_size, output_threshold = bd.scale_window(4, 3, step)
+    expected, _ = bd.decode_angles(sequential, 30.0, "en", buffer_size, output_threshold, 0.3)
+    stabiliser, _ = bd.decode_angles(merged, 30.0, "en", buffer_size, output_threshold, 0.3)
+    assert stabiliser.letters == expected.letters
+    assert stabiliser.text == "HEL"
+
+
+def test_merge_chunks_reports_missing_frames():
+    chunks = [[(0, 1.0, 2.0), (2, 1.0, 2.0)], [(6, 1.0, 2.0)]]
+    with pytest.raises(ValueError, match="Missing frames 4..5"):
+        par.merge_chunks(chunks, step=2)
+
+
+@pytest.mark.parametrize("option", [["--adaptive"], ["--max-skip", "2"], ["--cache-dir", "cache"]])
+def test_batch_only_options_are_rejected(tmp_path, option, capsys):
+    with pytest.raises(SystemExit):
+        par.main(["x.mp4", "-o", str(tmp_path), *option])
+    assert "not supported by the parallel decoder" in capsys.readouterr().err
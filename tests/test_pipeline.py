@@ -0,0 +1,78 @@
+import threading
+from queue import Empty, Full
+import pytest
+from pipeline import Closed, FrameQueue
+
+
+def blocked_call(function):
+    # Runs function on a thread and returns what it raised once it is released.
+    raised = []
+
+    def run():
+        try:
+            function()
+        except Exception as error:
+            raised.append(error)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(0.2)
+    assert thread.is_alive()
+    return thread, raised
+
+
+def test_close_wakes_blocked_getters():
+    queue = FrameQueue()
+    getters = [blocked_call(queue.get) for _ in range(3)]
+    queue.close()
+    for thread, raised in getters:
+        thread.join(1)
+        assert not thread.is_alive()
+        assert [type(error) for error in raised] == [Closed]
+
+
+def test_close_wakes_a_blocked_putter():
+    queue = FrameQueue(drop_oldest=False)
+    queue.put(1)
+    thread, raised = blocked_call(lambda: queue.put(2))
+    queue.close()
+    thread.join(1)
+    assert [type(error) for error in raised] == [Closed]
+
+
+def test_items_queued_before_close_are_still_delivered():
+    queue = FrameQueue(maxsize=2)
+    queue.put(1)
+    queue.close()
+    assert queue.get() == 1
+    with pytest.raises(Closed):
+        queue.get()
+
+
+def test_full_queue_drops_the_oldest_item():
+    queue = FrameQueue(maxsize=3)
+    for item in range(5):
+        queue.put(item)
+    assert queue.dropped == 2
+    assert queue.qsize() == 3
+    assert [queue.get() for _ in range(3)] == [2, 3, 4]
+
+
+def test_full_queue_without_dropping_times_out():
+    queue = FrameQueue(maxsize=1, drop_oldest=False)
+    queue.put(1)
+    with pytest.raises(Full):
+        queue.put(2, timeout=0.05)
+    assert queue.dropped == 0
+    assert queue.get() == 1
+    with pytest.raises(Empty):
+        queue.get(timeout=0.05)
+
+
+@pytest.mark.parametrize("drop_oldest", [True, False])
+def test_put_after_close_raises(drop_oldest):
+    queue = FrameQueue(drop_oldest=drop_oldest)
+    queue.close()
+    with pytest.raises(Closed):
+        queue.put(1)
+    assert queue.qsize() == 0
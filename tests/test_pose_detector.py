@@ -0,0 +1,91 @@
+import types
+import numpy as np
+import pytest
+
+pytest.importorskip("mediapipe")
+from mediapipe.framework.formats import landmark_pb2
+import pose_detector as pd
+
+FRAME_HEIGHT, FRAME_WIDTH = 480, 640
+
+
+def landmark_list(points):
+    landmarks = landmark_pb2.NormalizedLandmarkList()
+    for x, y, visibility in points:
+        landmark = landmarks.landmark.add()
+        landmark.x, landmark.y, landmark.visibility = x, y, visibility
+    return landmarks
+
+
+class FakePose:
+    # Stands in for MediaPipe: answers each image with fixed landmarks chosen by the test.
+    def __init__(self, *args):
+        self.answer = lambda img: None
+        self.images = []
+
+    def process(self, img):
+        self.images.append(img.shape)
+        points = self.answer(img)
+        return types.SimpleNamespace(pose_landmarks=None if points is None else landmark_list(points))
+
+    def reset(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def make_detector(monkeypatch):
+    monkeypatch.setattr(pd.mp.solutions.pose, "Pose", FakePose)
+    return pd.PoseDetector
+
+
+def frame():
+    return np.zeros((FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_fast_arm_angles_match_find_pose(make_detector, seed):
+    rng = np.random.default_rng(seed)
+    # Some points fall outside the frame or are barely visible, so missing arms are covered too.
+    points = [(x, y, visibility) for x, y, visibility in
+              zip(rng.uniform(-0.1, 1.1, 33), rng.uniform(-0.1, 1.1, 33), rng.uniform(0.3, 1.0, 33))]
+    detector = make_detector()
+    detector.pose.answer = lambda img: points
+    img = np.zeros((int(rng.integers(100, 1000)), int(rng.integers(100, 1000)), 3), dtype=np.uint8)
+    assert detector.find_arm_angles(img) == pd.slow_arm_angles(detector, img)
+
+
+def test_no_pose_gives_no_angles(make_detector):
+    detector = make_detector()
+    assert detector.find_arm_angles(frame()) == (None, None)
+    assert pd.slow_arm_angles(detector, frame()) == (None, None)
+
+
+@pytest.mark.parametrize("target_size, crop_shape", [(512, (300, 200, 3)), (64, (64, 43, 3))])
+def test_roi_landmarks_map_back_to_the_frame(make_detector, target_size, crop_shape):
+    detector = make_detector(roi=True, roi_target_size=target_size)
+    detector.pose.answer = lambda img: [(0.25, 0.5, 0.9), (1.0, 0.0, 0.9)]
+    box = (200, 100, 400, 400)
+    results = detector.process_roi(frame(), box)
+    assert detector.pose.images == [crop_shape]
+    first, second = results.pose_landmarks.landmark
+    # Whatever size the crop was scaled to, normalised coordinates map back through the box.
+    assert (first.x * FRAME_WIDTH, first.y * FRAME_HEIGHT) == pytest.approx((250, 250))
+    assert (second.x * FRAME_WIDTH, second.y * FRAME_HEIGHT) == pytest.approx((400, 100))
+
+
+def test_roi_falls_back_to_the_full_frame(make_detector):
+    detector = make_detector(roi=True, roi_target_size=64)
+    full_frame_points = [(0.4 + 0.005 * i, 0.3 + 0.01 * i, 0.9) for i in range(33)]
+    # The crop misses the person; only the full frame has one.
+    detector.pose.answer = lambda img: full_frame_points if img.shape[:2] == (FRAME_HEIGHT, FRAME_WIDTH) else None
+    detector.roi_box = (0, 0, 100, 100)
+    _, landmarks = detector.find_pose(frame(), draw=False)
+    assert detector.pose.images == [(64, 64, 3), (FRAME_HEIGHT, FRAME_WIDTH, 3)]
+    assert landmarks[0][1:3] == [int(0.4 * FRAME_WIDTH), int(0.3 * FRAME_HEIGHT)]
+    # The next frame is cropped around where the person was found.
+    x0, y0, x1, y1 = detector.roi_box
+    assert x0 <= int(0.4 * FRAME_WIDTH) and x1 >= int(0.56 * FRAME_WIDTH)
+    assert y0 <= int(0.3 * FRAME_HEIGHT) and y1 >= int(0.62 * FRAME_HEIGHT)
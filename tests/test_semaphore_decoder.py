@@ -0,0 +1,51 @@
+import math
+import numpy as np
+import pytest
+import fixtures as fx
+import semaphore_decoder as sd
+from alphabet import ALPHABETS
+
+
+def scalar_angle(angle):
+    return None if math.isnan(angle) else float(angle)
+
+
+def random_angles(rng, count, angle_gap):
+    # Angles on and right next to every sector boundary, plus missing arms, on top of uniform noise.
+    centres = np.arange(-180.0, 180.1, 45.0)
+    edges = np.concatenate([centres - angle_gap, centres + angle_gap])
+    angles = np.concatenate([rng.uniform(-180, 180, count), edges, np.nextafter(edges, np.inf),
+                             np.nextafter(edges, -np.inf)])
+    angles = angles[(angles >= -180) & (angles <= 180)]
+    angles[rng.random(len(angles)) < 0.05] = np.nan
+    return rng.permutation(angles)
+
+
+@pytest.mark.parametrize("angle_gap", [15.0, 22.5, 25.0])
+def test_match_angles_matches_angle_sector(angle_gap):
+    decoder = sd.SemaphoreDecoder(angle_gap=angle_gap)
+    angles = random_angles(np.random.default_rng(0), 2000, angle_gap)
+    sectors = decoder.match_angles(angles)
+    assert sectors.tolist() == [decoder.angle_sector(scalar_angle(angle)) for angle in angles]
+
+
+@pytest.mark.parametrize("language", sorted(ALPHABETS))
+@pytest.mark.parametrize("angle_gap", [15.0, 22.5, 25.0])
+def test_find_letters_matches_find_letter(language, angle_gap):
+    decoder = sd.SemaphoreDecoder(angle_gap=angle_gap)
+    rng = np.random.default_rng(1)
+    right_angles = random_angles(rng, 3000, angle_gap)
+    left_angles = rng.permutation(right_angles)
+    letters = decoder.letters_from_codes(decoder.find_letters(right_angles, left_angles, language), language)
+    assert letters == [decoder.find_letter(scalar_angle(right), scalar_angle(left), language)
+                       for right, left in zip(right_angles, left_angles)]
+
+
+@pytest.mark.parametrize("jitter", [0.0, 12.0])
+def test_find_letters_matches_find_letter_on_recordings(jitter):
+    decoder = sd.SemaphoreDecoder()
+    recording = fx.synthesize_landmarks("SEMAPHORE 42", "en_numeric", jitter=jitter, dropout=0.05, seed=3)
+    right_angles, left_angles = recording.angles(14, 16), recording.angles(13, 15)
+    letters = decoder.letters_from_codes(decoder.find_letters(right_angles, left_angles, "en_numeric"), "en_numeric")
+    assert letters == [decoder.find_letter(scalar_angle(right), scalar_angle(left), "en_numeric")
+                       for right, left in zip(right_angles, left_angles)]
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+import fixtures as fx
+import semaphore_decoder as sd
+from session_log import SessionLog, SessionLogWriter, open_session_log
+from stabiliser import LetterStabiliser, COMMITTED, SPACE, STOP
+from alphabet import ALPHABETS
+
+ORIGIN = 1.7e9
+
+
+def write_session(path, text="HELLO WORLD", seed=0, fps=30.0, stable_duration=1.0):
+    # Decodes a generated recording as the GUI does, with camera-like timestamps, and logs it.
+    rng = np.random.default_rng(seed)
+    recording = fx.synthesize_landmarks(text, hold=1.5, jitter=6.0, seed=seed)
+    decoder = sd.SemaphoreDecoder()
+    stabiliser = LetterStabiliser(10, 5, stable_duration, ALPHABETS["en"])
+    writer = SessionLogWriter(str(path), "en", 10, 5, stable_duration, decoder.angle_gap, checkpoint_frames=50)
+    times = ORIGIN + np.arange(len(recording)) / fps + rng.uniform(0, 0.004, len(recording))
+    committed = []
+    for frame_index, (timestamp, right_angle, left_angle) in enumerate(
+            zip(times.tolist(), recording.angles(14, 16).tolist(), recording.angles(13, 15).tolist())):
+        timestamp = writer.frame(timestamp, decoder.angle_sector(right_angle), decoder.angle_sector(left_angle),
+                                 stabiliser)
+        event = stabiliser.update(decoder.find_letter(right_angle, left_angle), timestamp, frame_index)
+        if event in (COMMITTED, SPACE, STOP):
+            writer.event(event, timestamp, stabiliser.stable_letter)
+            committed.append((timestamp, stabiliser.text))
+        if stabiliser.stopped:
+            break
+    writer.close()
+    return committed
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_seek_at_a_commit_includes_it(tmp_path, seed):
+    committed = write_session(tmp_path / "session.semlog", seed=seed)
+    log = SessionLog(str(tmp_path / "session.semlog"))
+    assert committed
+    for timestamp, text in committed:
+        assert log.seek(timestamp).text == text
+
+
+def test_replay_reproduces_the_logged_letters(tmp_path):
+    write_session(tmp_path / "session.semlog")
+    log = SessionLog(str(tmp_path / "session.semlog"))
+    replayed = [(event["type"], event["letter"], event["frame"]) for event in log.replay()]
+    assert replayed == [(event["type"], event["letter"], event["frame"]) for event in log.events()]
+    start, end = log.index[1][0], log.index[-1][0]
+    assert [event["frame"] for event in log.replay(start, end)] == [
+        event["frame"] for event in log.events() if start <= event["time"] <= end]
+
+
+def test_sessions_started_in_the_same_second_get_their_own_files(tmp_path):
+    writers = [open_session_log(str(tmp_path)) for _ in range(3)]
+    for writer in writers:
+        writer.close()
+    assert len({writer.path for writer in writers}) == 3
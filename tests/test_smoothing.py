@@ -0,0 +1,52 @@
+import math
+import numpy as np
+import pytest
+import semaphore_decoder as sd
+from smoothing import AngleFilter, ArmSmoother, SectorHysteresis, smooth_angles, wrap_angle
+
+
+def test_filter_crosses_180_degrees_the_short_way():
+    arm_filter = AngleFilter(min_cutoff=0.5)
+    # An arm swinging across the bottom, then held on both sides of it with noise.
+    angles = [wrap_angle(160 + 4 * i) for i in range(10)] + [175.0, -175.0] * 10
+    filtered = [arm_filter.update(angle, i / 30) for i, angle in enumerate(angles)]
+    assert filtered[9] < 0
+    assert all(abs(angle) >= 155 for angle in filtered)
+
+
+def test_filter_restarts_after_a_missing_angle():
+    arm_filter = AngleFilter()
+    arm_filter.update(90.0, 0.0)
+    assert arm_filter.update(None, 0.1) is None
+    assert arm_filter.update(-45.0, 0.2) == -45.0
+
+
+@pytest.mark.parametrize("centre", [90.0, 180.0])
+def test_hysteresis_holds_the_sector_within_the_margin(centre):
+    decoder = sd.SemaphoreDecoder(angle_gap=22.5)
+    hysteresis = SectorHysteresis(decoder, margin=5.0)
+    assert hysteresis.update(centre) == centre
+    # Past the sector's own range but inside the margin, the held sector's centre is reported.
+    for offset in (10.0, 24.0, 27.0, -27.0):
+        assert hysteresis.update(wrap_angle(centre + offset)) == centre
+    released = wrap_angle(centre + 29.0)
+    assert hysteresis.update(released) == released
+    assert hysteresis.update(wrap_angle(centre + 26.0)) == wrap_angle(centre + 45.0)
+
+
+def test_hysteresis_drops_the_sector_without_an_angle():
+    hysteresis = SectorHysteresis(sd.SemaphoreDecoder(), margin=5.0)
+    hysteresis.update(90.0)
+    assert hysteresis.update(None) is None
+    assert hysteresis.update(115.0) == 115.0
+
+
+def test_smooth_angles_passes_frames_without_a_pose_through():
+    right_angles = np.array([90.0, 91.0, np.nan, np.nan, -45.0, -44.0])
+    left_angles = np.array([0.0, np.nan, 1.0, 2.0, np.nan, 3.0])
+    smoothed_right, smoothed_left = smooth_angles(right_angles, left_angles, 30.0,
+                                                  ArmSmoother(sd.SemaphoreDecoder()))
+    assert np.array_equal(np.isnan(smoothed_right), np.isnan(right_angles))
+    assert np.array_equal(np.isnan(smoothed_left), np.isnan(left_angles))
+    assert smoothed_right[4] == -45.0
+    assert not any(math.isnan(angle) for angle in smoothed_left[[0, 2, 3, 5]])
@@ -0,0 +1,90 @@
+import json
+import random
+from collections import Counter, deque
+import pytest
+from alphabet import ALPHABETS
+from stabiliser import LetterStabiliser, LetterWindow, CANDIDATE, COMMITTED, SPACE, STOP
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_window_counts_match_a_counter(seed):
+    rng = random.Random(seed)
+    size = rng.randint(1, 12)
+    window = LetterWindow(size)
+    plain = deque(maxlen=size)
+    for step in range(2000):
+        if rng.random() < 0.01:
+            window.clear()
+            plain.clear()
+        letter = rng.choice(["A", "B", "C", None])
+        window.push(letter)
+        plain.append(letter)
+
+        counts = Counter(plain)
+        assert len(window) == len(plain)
+        assert window.counts == dict(counts)
+        assert all(window.count(letter) == counts[letter] for letter in ("A", "B", "C", None, "D"))
+        leader, ratio = window.majority()
+        assert counts[leader] == max(counts.values())
+        assert ratio == max(counts.values()) / len(plain)
+
+
+def test_empty_window_has_no_leader():
+    assert LetterWindow(4).majority() == (None, 0.0)
+
+
+def feed(stabiliser, letters, fps=10.0, start=0):
+    events = []
+    for frame_index, letter in enumerate(letters, start):
+        event = stabiliser.update(letter, frame_index / fps, frame_index)
+        if event is not None:
+            events.append((frame_index, event))
+    return events
+
+
+def held(*letters, frames=15):
+    return [letter for letter in letters for _ in range(frames)]
+
+
+def test_events_for_letters_space_and_stop():
+    stabiliser = LetterStabiliser(4, 3, 1.0, ALPHABETS["en"])
+    events = feed(stabiliser, held("A", "SPACE", "B", "STOP", "C"))
+    # Each letter becomes a candidate on the third frame of four that show it and commits a second later.
+    assert events == [(2, CANDIDATE), (12, COMMITTED), (17, CANDIDATE), (27, SPACE), (32, CANDIDATE),
+                      (42, COMMITTED), (47, CANDIDATE), (57, STOP)]
+    assert stabiliser.text == "A B"
+    assert stabiliser.stopped
+    assert [letter["letter"] for letter in stabiliser.letters] == ["A", "SPACE", "B", "STOP"]
+    assert stabiliser.update("C", 100.0) is None
+
+
+def test_letter_is_committed_once_while_held():
+    stabiliser = LetterStabiliser(4, 3, 0.5, ALPHABETS["en"])
+    events = feed(stabiliser, held("A", frames=60))
+    assert [event for _, event in events] == [CANDIDATE, COMMITTED]
+    assert stabiliser.text == "A"
+
+
+def test_frames_without_a_letter_commit_nothing():
+    stabiliser = LetterStabiliser(4, 3, 0.5, ALPHABETS["en"])
+    # A letter shown for less than stable_duration is only a candidate, and the gap after it commits nothing.
+    events = feed(stabiliser, held(None, frames=30) + held("A", frames=4) + held(None, frames=30))
+    assert [event for _, event in events] == [CANDIDATE, CANDIDATE]
+    assert stabiliser.output_letter is None
+    assert stabiliser.text == "" and not stabiliser.letters
+
+
+def test_restore_carries_on_like_the_original():
+    letters = held("H", None, "E", "L", "SPACE", "L", "O", "STOP", frames=15)
+    original = LetterStabiliser(6, 4, 0.8, ALPHABETS["en"])
+    for split in (5, 30, 41, 70, 100):
+        first = LetterStabiliser(6, 4, 0.8, ALPHABETS["en"])
+        feed(first, letters[:split])
+        state = json.loads(json.dumps(first.snapshot()))
+        restored = LetterStabiliser(6, 4, 0.8, ALPHABETS["en"])
+        restored.restore(state)
+        assert restored.snapshot() == first.snapshot()
+        assert feed(restored, letters[split:], start=split) == feed(first, letters[split:], start=split)
+        assert restored.text == first.text
+    feed(original, letters)
+    assert original.text == "HEL LO"
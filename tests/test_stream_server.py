@@ -0,0 +1,24 @@
+import threading
+import pytest
+
+pytest.importorskip("mediapipe")
+import stream_server as ss
+from metrics import METRICS
+from resources import POOL
+
+
+def test_streams_a_clip_to_the_end(video_file):
+    server = ss.StreamServer([video_file, video_file], workers=2, port=0)
+    assert ("stream_fps", (("stream", "1"),)) in METRICS.gauges
+    in_use = POOL.in_use
+    thread = threading.Thread(target=server.serve, args=(0.1,), daemon=True)
+    thread.start()
+    thread.join(60)
+    alive = thread.is_alive()
+    server.stop_event.set()
+    assert not alive
+    assert [stream.processed for stream in server.streams] == [60, 60]
+    assert all(stream.finished for stream in server.streams)
+    assert POOL.in_use == in_use
+    # Finished streams no longer report through the registry.
+    assert not any(labels in (stream.labels for stream in server.streams) for _, labels in METRICS.gauges)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+import batch_decoder as bd
+import fixtures as fx
+import semaphore_decoder as sd
+import sweep
+from alphabet import ALPHABETS
+from stabiliser import LetterStabiliser
+
+BUFFER_SIZES = (4, 10)
+OUTPUT_THRESHOLDS = (2, 4, 7)
+STABLE_DURATIONS = (0.0, 0.5, 2.0)
+
+
+def scalar_commits(letters, fps, language, buffer_size, output_threshold, stable_duration):
+    stabiliser = LetterStabiliser(buffer_size, output_threshold, stable_duration, ALPHABETS[language])
+    for frame_index, letter in enumerate(letters):
+        stabiliser.update(letter, frame_index / fps, frame_index)
+        if stabiliser.stopped:
+            break
+    return [committed["frame"] for committed in stabiliser.letters]
+
+
+@pytest.mark.parametrize("language, text", [("en", "SEMAPHORE TEST"), ("uk", "ШАХ І МАТ")])
+@pytest.mark.parametrize("jitter, dropout, seed", [(0.0, 0.0, 0), (8.0, 0.05, 1), (15.0, 0.15, 2)])
+def test_commit_frames_match_the_stabiliser(language, text, jitter, dropout, seed):
+    recording = fx.synthesize_landmarks(text, language, hold=1.5, jitter=jitter, dropout=dropout, seed=seed)
+    decoder = sd.SemaphoreDecoder()
+    codes = decoder.find_letters(recording.angles(14, 16), recording.angles(13, 15), language)
+    letters = decoder.letters_from_codes(codes, language)
+    _, names = decoder.letter_table(language)
+    times = np.arange(len(codes)) / recording.fps
+    columns, totals = sweep.letter_totals(codes)
+
+    for buffer_size in BUFFER_SIZES:
+        counts = sweep.window_counts(columns, totals, buffer_size)
+        for output_threshold in OUTPUT_THRESHOLDS:
+            if output_threshold > buffer_size:
+                continue
+            commits = sweep.commit_frames(codes, counts, times, output_threshold, STABLE_DURATIONS)
+            for stable_duration, frames in zip(STABLE_DURATIONS, commits):
+                frames = frames.tolist()
+                stops = [i for i, frame in enumerate(frames) if names[codes[frame]] == ALPHABETS[language].stop]
+                if stops:
+                    frames = frames[:stops[0] + 1]
+                assert frames == scalar_commits(letters, recording.fps, language, buffer_size, output_threshold,
+                                                stable_duration), (buffer_size, output_threshold, stable_duration)
+
+
+def test_sweep_recording_scores_like_decode_recording():
+    recording = fx.synthesize_landmarks("SEMAPHORE TEST", jitter=10.0, dropout=0.1, seed=4)
+    right_angles, left_angles, fps, reference, segments, language = sweep.recording_job(recording, "en")
+    results = sweep.sweep_recording(right_angles, left_angles, fps, reference, segments, language, 22.5,
+                                    BUFFER_SIZES, OUTPUT_THRESHOLDS, STABLE_DURATIONS)
+    assert len(results) == 15
+    for (angle_gap, buffer_size, output_threshold, stable_duration), error_rate, latency in results:
+        stabiliser, _ = bd.decode_recording(recording, "en", buffer_size, output_threshold, stable_duration,
+                                            angle_gap)
+        assert error_rate == fx.character_error_rate(reference, stabiliser.text)
+        assert latency == pytest.approx(fx.commit_latency(stabiliser.letters, segments), nan_ok=True)
@@ -0,0 +1,41 @@
+import pytest
+from conftest import frame_index_of
+
+cv2 = pytest.importorskip("cv2")
+from video_reader import VideoReader, scaled_size
+
+
+@pytest.mark.parametrize("start_frame, step", [(0, 1), (0, 3), (7, 1), (10, 4), (45, 2), (88, 5)])
+def test_frames_are_the_ones_their_index_names(indexed_video, start_frame, step):
+    with VideoReader(indexed_video, start_frame, step) as reader:
+        frames = [(frame_index, frame_index_of(img)) for frame_index, img in reader]
+    assert [frame_index for frame_index, _ in frames] == list(range(start_frame, 90, step))
+    assert all(frame_index == shown for frame_index, shown in frames)
+
+
+def test_wide_frames_are_scaled_down(indexed_video):
+    with VideoReader(indexed_video, 3, 2, max_width=160) as reader:
+        frames = list((frame_index, img.shape, frame_index_of(img)) for frame_index, img in reader)
+    assert len(frames) == 44
+    assert all(shape == (60, 160, 3) and frame_index == shown for frame_index, shape, shown in frames)
+
+
+def test_narrow_frames_keep_their_size():
+    assert scaled_size(320, 120, None) is None
+    assert scaled_size(320, 120, 320) is None
+    assert scaled_size(320, 120, 100) == (100, 38)
+
+
+def test_close_in_the_middle_stops_the_reader(indexed_video):
+    reader = VideoReader(indexed_video, buffer_frames=2)
+    frames = [reader.read()[0] for _ in range(5)]
+    assert frames == [0, 1, 2, 3, 4]
+    reader.close()
+    assert not reader.thread.is_alive()
+    assert not reader.cap.isOpened()
+    assert reader.read() is None
+
+
+def test_missing_file_raises(tmp_path):
+    with pytest.raises(IOError):
+        VideoReader(str(tmp_path / "missing.mp4"))
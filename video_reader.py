@@ -0,0 +1,178 @@
+import time
+import argparse
+import threading
+import cv2
+from metrics import METRICS
+from pipeline import Closed, FrameQueue
+
+END = object()
+
+
+def open_video(source, threads=None):
+    # FFmpeg decodes with frame threads; by default OpenCV lets it use every core, threads caps that.
+    params = [] if threads is None else [cv2.CAP_PROP_N_THREADS, threads]
+    return cv2.VideoCapture(source, cv2.CAP_FFMPEG, params)
+
+
+def scaled_size(width, height, max_width):
+    if not max_width or width <= max_width:
+        return None
+    return max_width, max(1, round(height * max_width / width))
+
+
+class VideoReader:
+    # Reads a video file ahead of the consumer on its own thread, into a fixed set of frame arrays that are
+    # handed out in turn. A frame stays valid until the next call to read, so a consumer keeping frames
+    # must copy them. Frames skipped by step are only grabbed, without the colour conversion of retrieve.
+    def __init__(self, source, start_frame=0, step=1, max_width=None, buffer_frames=4, threads=None):
+        self.cap = open_video(source, threads)
+        if not self.cap.isOpened():
+            raise IOError(f"Cannot open video file: {source}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.size = scaled_size(self.width, self.height, max_width)
+        self.step = step
+        self.start_frame = start_frame
+        if start_frame > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+            if int(self.cap.get(cv2.CAP_PROP_POS_FRAMES)) != start_frame:
+                self.cap.release()
+                raise IOError(f"Cannot seek {source} to frame {start_frame}")
+
+        # One array is being filled, one is held by the consumer and the rest wait in the ready queue.
+        self.ready = FrameQueue(maxsize=buffer_frames, drop_oldest=False)
+        self.free = FrameQueue(maxsize=buffer_frames + 2, drop_oldest=False)
+        for _ in range(buffer_frames + 2):
+            self.free.put(None)
+        self.decoded = None
+        self.held = None
+        self.error = None
+        self.thread = threading.Thread(target=self.read_loop, daemon=True)
+        self.thread.start()
+
+    def read_loop(self):
+        frame_index = self.start_frame
+        try:
+            while True:
+                img = self.free.get()
+                with METRICS.time("capture"):
+                    if not self.cap.grab():
+                        break
+                    if self.size is None:
+                        success, img = self.cap.retrieve(img)
+                    else:
+                        success, self.decoded = self.cap.retrieve(self.decoded)
+                        if success:
+                            img = cv2.resize(self.decoded, self.size, dst=img, interpolation=cv2.INTER_LINEAR)
+                    if not success:
+                        break
+                self.ready.put((frame_index, img))
+                frame_index += self.step
+                for _ in range(self.step - 1):
+                    if not self.cap.grab():
+                        return
+        except Closed:
+            return
+        except Exception as error:
+            self.error = error
+        finally:
+            self.cap.release()
+            try:
+                self.ready.put(END)
+            except Closed:
+                pass
+
+    def read(self):
+        # Returns (frame_index, image) or None at the end of the video.
+        if self.held is not None:
+            try:
+                self.free.put(self.held)
+            except Closed:
+                return None
+            self.held = None
+        try:
+            item = self.ready.get()
+        except Closed:
+            return None
+        if item is END:
+            self.ready.close()
+            if self.error is not None:
+                raise self.error
+            return None
+        self.held = item[1]
+        return item
+
+    def __iter__(self):
+        while True:
+            item = self.read()
+            if item is None:
+                return
+            yield item
+
+    def close(self):
+        self.ready.close()
+        self.free.close()
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def measure_read(video_file, step=1, max_width=None, read_ahead=True, detector=None):
+    # Frames per second delivered to the consumer, with pose detection on each frame if a detector is given.
+    start_time = time.perf_counter()
+    frames = 0
+    if read_ahead:
+        with VideoReader(video_file, step=step, max_width=max_width) as reader:
+            for _, img in reader:
+                if detector is not None:
+                    detector.find_arm_angles(img)
+                frames += 1
+    else:
+        cap = cv2.VideoCapture(video_file)
+        frame_index = 0
+        while True:
+            success, img = cap.read()
+            if not success:
+                break
+            if frame_index % step == 0:
+                size = scaled_size(img.shape[1], img.shape[0], max_width)
+                if size is not None:
+                    img = cv2.resize(img, size, interpolation=cv2.INTER_LINEAR)
+                if detector is not None:
+                    detector.find_arm_angles(img)
+                frames += 1
+            frame_index += 1
+        cap.release()
+    return frames / (time.perf_counter() - start_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare frame rates of plain reads and the read-ahead reader.")
+    parser.add_argument("video")
+    parser.add_argument("--step", type=int, default=1, help="deliver every Nth frame")
+    parser.add_argument("--max-width", type=int, default=None, help="downscale frames wider than this")
+    parser.add_argument("--detect", action="store_true", help="run pose detection on every delivered frame")
+    args = parser.parse_args()
+
+    detector = None
+    if args.detect:
+        import pose_detector as pd
+        detector = pd.PoseDetector()
+        detector.warm_up()
+    # The baseline is the old loop: every frame read and converted at full size on the consumer's thread.
+    plain = measure_read(args.video, 1, None, False, detector)
+    ahead = measure_read(args.video, args.step, args.max_width, True, detector)
+    print(f"cap.read, every frame:       {plain:8.1f} frames/s")
+    print(f"VideoReader, step {args.step}, width {args.max_width or 'full'}: {ahead:8.1f} frames/s "
+          f"({ahead * args.step:.1f} video frames/s)")
+
+
+if __name__ == "__main__":
+    main()